@@ -1,18 +1,30 @@
 import os
+import time
+from contextvars import ContextVar
+from pathlib import Path
 
 import httpx
-import uvicorn
 import yaml
-from fastapi import FastAPI, HTTPException, Response
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import toml
 
+from voicecontrol_common import profiler, registration, tracing
+from voicecontrol_common.metrics import Counter, Histogram, instrument
+from voicecontrol_common.serving import serve, uvicorn_options
+from voicecontrol_common.tracing import REQUEST_ID_HEADER, current_request_id, record_span
+
+import static
+from balancer import Balancer
+from transport import Transport, unix_socket
+
 def logger_info(message:str):
     "Log message in a server."
     url = toml.load("log_config.toml")["url"]+"/log"
-    httpx.request(method="POST", url=url, json={"message":message})
+    httpx.request(method="POST", url=url, json={"message":message, "request_id":current_request_id()})
     
 logger_info("aggregator starting")
 
@@ -28,11 +40,44 @@ BROWSER_HOST = config_data["browser_service"]["host"]
 BROWSER_PORT = config_data["browser_service"]["port"]
 AGGREGATOR_HOST = config_data["aggregator_service"]["host"]
 AGGREGATOR_PORT = config_data["aggregator_service"]["port"]
-AGGREGATOR_RELOAD = config_data["aggregator_service"].get("reload", False)
+# Older config.yaml files have no transcriber entry, it used to run next to the aggregator
+TRANSCRIBER_CONFIG = config_data.get("transcriber_service") or {"host": AGGREGATOR_HOST, "port": 8005}
 
-# Define the URLs for the hardware and browser services
+# Define the URLs for the hardware and browser services, used when the registry knows no replica
 HARDWARE_URL = f"http://{HARDWARE_HOST}:{HARDWARE_PORT}"
 BROWSER_URL = f"http://{BROWSER_HOST}:{BROWSER_PORT}"
+TRANSCRIBER_URL = f"http://{TRANSCRIBER_CONFIG['host']}:{TRANSCRIBER_CONFIG['port']}"
+
+# Services on this host can be reached through their Unix socket (`endpoint` in config.yaml)
+TRANSPORT = Transport({
+    HARDWARE_URL: unix_socket(config_data["hardware_service"]),
+    BROWSER_URL: unix_socket(config_data["browser_service"]),
+    TRANSCRIBER_URL: unix_socket(TRANSCRIBER_CONFIG),
+})
+
+# Replicas of each service announce themselves to the registry, if one is running
+REGISTRY_URL = os.getenv("REGISTRY_URL")
+if REGISTRY_URL is None and "registry_service" in config_data:
+    REGISTRY_URL = f"http://{config_data['registry_service']['host']}:{config_data['registry_service']['port']}"
+# Only the stateless transcriber is balanced across replicas. The browser windows and the
+# machine whose screen and stats are read belong to one instance, called at its config.yaml URL.
+BALANCER = Balancer(REGISTRY_URL, {"transcriber": TRANSCRIBER_URL})
+PINNED_URLS = {"hardware": HARDWARE_URL, "browser": BROWSER_URL}
+
+# The UI, served from here so that its API calls are same-origin and need no CORS preflight
+UI_DIR = Path(os.getenv("UI_DIR", "../UI"))
+UI_ASSETS = static.load_assets(UI_DIR, {
+    "index.html": {
+        '<meta name="voicecontrol-same-origin" content="false" />':
+        '<meta name="voicecontrol-same-origin" content="true" />',
+    },
+})
+
+# Transcription takes seconds, far longer than the other backend calls
+TRANSCRIBE_TIMEOUT = 120
+# Passed on to and back from the transcriber by the /transcribe proxy
+TRANSCRIBE_REQUEST_HEADERS = ("content-type", "x-kws", "x-transcription-cache")
+TRANSCRIBE_RESPONSE_HEADERS = ("retry-after", "server-timing", "x-transcription-cache", "x-kws")
 
 
 class SearchQuery(BaseModel):
@@ -48,8 +93,149 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # Read by the UI when the transcriber behind /transcribe is overloaded
+)
+instrument(app)
+tracing.instrument(app, "aggregator")
+registration.instrument(app, "aggregator", AGGREGATOR_PORT)
+profiler.instrument(app)
+
+UPSTREAM_SECONDS = Histogram(
+    "aggregator_upstream_seconds",
+    "Time spent waiting on the hardware/browser services.",
+    ("service", "path"),
+)
+UPSTREAM_ERRORS = Counter(
+    "aggregator_upstream_errors_total",
+    "Backend calls that failed before a response was received.",
+    ("service", "path"),
 )
 
+# Time spent waiting on the hardware/browser services during the current request
+BACKEND_TIMINGS: ContextVar[list[float] | None] = ContextVar("backend_timings", default=None)
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Report total and backend time of each request in the `Server-Timing` header."""
+    timings: list[float] = []
+    BACKEND_TIMINGS.set(timings)
+    start = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - start
+    timing = f"backend;dur={sum(timings) * 1000:.2f}, total;dur={total * 1000:.2f}"
+    if "Server-Timing" in response.headers:  # Passed on from the transcriber by /transcribe
+        timing = f"{response.headers['Server-Timing']}, {timing}"
+    response.headers["Server-Timing"] = timing
+    return response
+
+
+def call_backend(method: str, service: str, path: str, **kwargs) -> httpx.Response:
+    """Send a request to a backend service, passing on the request ID.
+
+    Browser and hardware calls go to the configured instance. Transcriber calls go to its least
+    busy replica, and a replica that refuses the connection never saw the request, so it is sent
+    to the next one.
+    """
+    request_id = current_request_id()
+    if request_id:
+        kwargs["headers"] = {**kwargs.get("headers", {}), REQUEST_ID_HEADER: request_id}
+    if service in PINNED_URLS:
+        return send_to_replica(method, service, PINNED_URLS[service], path, **kwargs)
+    tried: list[str] = []
+    base = BALANCER.pick(service)
+    while True:
+        try:
+            with BALANCER.track(base):
+                return send_to_replica(method, service, base, path, **kwargs)
+        except httpx.ConnectError:
+            BALANCER.mark_failed(base)
+            tried.append(base)
+            base = BALANCER.pick(service, exclude=tried)
+            if base is None:
+                raise
+
+
+def send_to_replica(method: str, service: str, base: str, path: str, **kwargs) -> httpx.Response:
+    """Send one request to one replica and record how long it took."""
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        return TRANSPORT.request(method, base, path, **kwargs)
+    except httpx.HTTPError:
+        UPSTREAM_ERRORS.inc(service=service, path=path)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_SECONDS.observe(elapsed, service=service, path=path)
+        record_span(f"upstream {service} {method} {path}", started_at, elapsed)
+        timings = BACKEND_TIMINGS.get()
+        if timings is not None:
+            timings.append(elapsed)
+
+
+@app.get("/healthz")
+def healthz() -> JSONResponse:
+    """Liveness probe: the aggregator is up and answering requests."""
+    return JSONResponse(content={"status": "ok", "checks": {}})
+
+
+@app.get("/readyz")
+def readyz() -> JSONResponse:
+    """Readiness probe: the aggregator has its config loaded and can proxy requests."""
+    checks = {"config_loaded": bool(HARDWARE_URL and BROWSER_URL)}
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "not ready", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
+@app.get("/instances/{service}")
+def instances(service: str) -> list[dict]:
+    """Live replicas of a service with their load, so the UI can balance its own calls."""
+    return BALANCER.snapshot(service)
+
+
+@app.get("/")
+def ui(request: Request) -> Response:
+    """The UI (UI/index.html), which then calls this origin only."""
+    if "index.html" not in UI_ASSETS:
+        raise HTTPException(status_code=404, detail=f"No UI found in {UI_DIR.resolve()}")
+    return static.respond(UI_ASSETS["index.html"], request, static.INDEX_CACHE_CONTROL)
+
+
+@app.get("/ui/{name}")
+def ui_asset(name: str, request: Request) -> Response:
+    """Other static files of the UI directory."""
+    if name not in UI_ASSETS:
+        raise HTTPException(status_code=404, detail=f"No such file: {name}")
+    return static.respond(UI_ASSETS[name], request, static.ASSET_CACHE_CONTROL)
+
+
+@app.post("/transcribe")
+async def transcribe(request: Request) -> Response:
+    """
+    Proxy to /transcribe on the least busy transcriber replica, for the UI served from here.
+    The recording and the transcriber's answer, including a 429/503 with Retry-After, are passed on as they are.
+    """
+    body = await request.body()
+    headers = {name: request.headers[name] for name in TRANSCRIBE_REQUEST_HEADERS if name in request.headers}
+    try:
+        resp = await run_in_threadpool(
+            call_backend, "POST", "transcriber", "/transcribe",
+            content=body, headers=headers, timeout=TRANSCRIBE_TIMEOUT,
+        )
+    except httpx.HTTPError as e:
+        await run_in_threadpool(logger_info, f"exception {e} encountered")
+        raise HTTPException(status_code=502, detail=f"Transcriber unreachable: {e}")
+    return Response(
+        content=resp.content,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type"),
+        headers={name: resp.headers[name] for name in TRANSCRIBE_RESPONSE_HEADERS if name in resp.headers},
+    )
+
 
 @app.post("/capture")
 def capture() -> Response:
@@ -58,7 +244,7 @@ def capture() -> Response:
     Returns the PNG image from the hardware service directly.
     """
     try:
-        resp = httpx.get(f"{HARDWARE_URL}/capture")
+        resp = call_backend("GET", "hardware", "/capture")
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         logger_info("capture request sent")
@@ -78,7 +264,7 @@ def screenshot() -> Response:
     Returns the PNG screenshot directly.
     """
     try:
-        resp = httpx.get(f"{HARDWARE_URL}/screenshot")
+        resp = call_backend("GET", "hardware", "/screenshot")
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         logger_info("screenshot request sent")
@@ -97,7 +283,7 @@ def cpu() -> JSONResponse:
     Proxy to /cpu on the hardware service.
     """
     try:
-        resp = httpx.get(f"{HARDWARE_URL}/cpu")
+        resp = call_backend("GET", "hardware", "/cpu")
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         logger_info("cpu info request sent")
@@ -113,7 +299,7 @@ def disk() -> JSONResponse:
     Proxy to /disk on the hardware service.
     """
     try:
-        resp = httpx.get(f"{HARDWARE_URL}/disk")
+        resp = call_backend("GET", "hardware", "/disk")
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         logger_info("disk info request sent")
@@ -129,7 +315,7 @@ def ram() -> JSONResponse:
     Proxy to /ram on the hardware service.
     """
     try:
-        resp = httpx.get(f"{HARDWARE_URL}/ram")
+        resp = call_backend("GET", "hardware", "/ram")
         if resp.status_code != 200:
             raise HTTPException(status_code=resp.status_code, detail=resp.text)
         logger_info("ram info request sent")
@@ -145,9 +331,9 @@ def all_hardware_info() -> JSONResponse:
     Call the urls /ram, /disk, /cpu on the hardware service.
     """
     try:
-        resp_ram = httpx.get(f"{HARDWARE_URL}/ram")
-        resp_disk = httpx.get(f"{HARDWARE_URL}/disk")
-        resp_cpu = httpx.get(f"{HARDWARE_URL}/cpu")
+        resp_ram = call_backend("GET", "hardware", "/ram")
+        resp_disk = call_backend("GET", "hardware", "/disk")
+        resp_cpu = call_backend("GET", "hardware", "/cpu")
         if resp_ram.status_code != 200:
             raise HTTPException(status_code=resp_ram.status_code, detail=resp_ram.text)
         if resp_disk.status_code != 200:
@@ -173,7 +359,7 @@ def new_window_and_search(query: SearchQuery) -> dict:
     Proxy to /browser/new_window_and_search on the browser service.
     """
     try:
-        resp = httpx.post(f"{BROWSER_URL}/browser/new_window_and_search", json=query.dict())
+        resp = call_backend("POST", "browser", "/browser/new_window_and_search", json=query.dict())
         logger_info("new window and search request sent")
         return resp.json()  # returns a dict
     except Exception as e:
@@ -187,7 +373,7 @@ def open_new_window() -> dict:
     Proxy to /browser/open_new_window on the browser service.
     """
     try:
-        resp = httpx.post(f"{BROWSER_URL}/browser/open_new_window")
+        resp = call_backend("POST", "browser", "/browser/open_new_window")
         logger_info("open window request sent")
         return resp.json()  # returns a dict
     except Exception as e:
@@ -201,7 +387,7 @@ def search(query: SearchQuery) -> dict:
     Proxy to /browser/search on the browser service.
     """
     try:
-        resp = httpx.post(f"{BROWSER_URL}/browser/search", json=query.dict())
+        resp = call_backend("POST", "browser", "/browser/search", json=query.dict())
         logger_info("search request sent")
         return resp.json()  # returns a dict
     except Exception as e:
@@ -215,7 +401,7 @@ def close_current_window() -> dict:
     Proxy to /browser/close_current_window on the browser service.
     """
     try:
-        resp = httpx.post(f"{BROWSER_URL}/browser/close_current_window")
+        resp = call_backend("POST", "browser", "/browser/close_current_window")
         logger_info("close window request sent")
         return resp.json()  # returns a dict
     except Exception as e:
@@ -229,7 +415,7 @@ def close_browser() -> dict:
     Proxy to /browser/close_browser on the browser service.
     """
     try:
-        resp = httpx.post(f"{BROWSER_URL}/browser/close_browser")
+        resp = call_backend("POST", "browser", "/browser/close_browser")
         logger_info("close browser request sent")
         return resp.json()  # returns a dict
     except Exception as e:
@@ -239,9 +425,9 @@ def close_browser() -> dict:
 
 logger_info("starting node...")
 if __name__ == "__main__":
-    uvicorn.run(
+    serve(
         "aggregator:app",
         host=AGGREGATOR_HOST,
         port=AGGREGATOR_PORT,
-        reload=AGGREGATOR_RELOAD,
+        **uvicorn_options(),
     )
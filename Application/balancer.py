@@ -0,0 +1,105 @@
+"""Route backend calls to the least busy live replica of each service.
+
+Replicas come from the service registry (see registry/), refreshed every couple of
+seconds by a background thread, so choosing a replica never waits on the registry. A call goes to the replica with the fewest outstanding requests: the larger of
+our own in-flight calls to it (exact, but only ours) and the count it last reported to the
+registry (everyone's, but a few seconds old). Replicas that refused a connection are
+skipped for a while. Without a registry, or while it lists no replica of a service, calls
+go to the service's URL from config.yaml.
+"""
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import httpx
+
+
+class Balancer:
+    """Least-outstanding-requests choice among the registered replicas of each service."""
+
+    def __init__(
+        self,
+        registry_url: str | None,
+        fallbacks: dict[str, str],
+        refresh_seconds: float = 2,
+        cooldown_seconds: float = 10,
+    ) -> None:
+        self.registry_url = registry_url
+        self.fallbacks = fallbacks
+        self.refresh_seconds = refresh_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._replicas: dict[str, list[dict]] = {}
+        self._outstanding: dict[str, int] = {}
+        self._failed_until: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._client = httpx.Client(timeout=1)
+        if registry_url is not None:
+            threading.Thread(target=self._refresh_forever, name="balancer-refresh", daemon=True).start()
+
+    def _refresh_forever(self) -> None:
+        while True:
+            for service in self.fallbacks:
+                self.refresh(service)
+            time.sleep(self.refresh_seconds)
+
+    def refresh(self, service: str) -> None:
+        """Fetch the live replicas of `service` from the registry."""
+        try:
+            resp = self._client.get(f"{self.registry_url}/instances", params={"service": service})
+            resp.raise_for_status()
+            replicas = resp.json()
+        except (httpx.HTTPError, ValueError):
+            return  # Registry unreachable: keep routing with what we know
+        with self._lock:
+            self._replicas[service] = replicas
+
+    def replicas(self, service: str) -> list[dict]:
+        """Live replicas of `service` according to the registry, as last refreshed."""
+        with self._lock:
+            return self._replicas.get(service, [])
+
+    def load(self, replica: dict) -> int:
+        return max(self._outstanding.get(replica["url"], 0), replica.get("outstanding", 0))
+
+    def pick(self, service: str, exclude: list[str] | tuple[str, ...] = ()) -> str | None:
+        """Base URL of the replica to call, or None if every candidate is in `exclude`."""
+        candidates = [r for r in self.replicas(service) if r["url"] not in exclude]
+        if not candidates:
+            fallback = self.fallbacks.get(service)
+            return fallback if fallback not in exclude else None
+        now = time.monotonic()
+        # If every replica failed recently, try them anyway rather than failing the request outright
+        healthy = [r for r in candidates if self._failed_until.get(r["url"], 0) <= now] or candidates
+        with self._lock:
+            return min(healthy, key=lambda r: (self.load(r), random.random()))["url"]
+
+    @contextmanager
+    def track(self, url: str) -> Iterator[None]:
+        """Count a call to `url` as outstanding while the `with` block runs."""
+        with self._lock:
+            self._outstanding[url] = self._outstanding.get(url, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._outstanding[url] -= 1
+
+    def mark_failed(self, url: str) -> None:
+        """Skip `url` for `cooldown_seconds` (it refused a connection)."""
+        self._failed_until[url] = time.monotonic() + self.cooldown_seconds
+
+    def snapshot(self, service: str) -> list[dict]:
+        """Replicas of `service` with their current load, for clients balancing on their own."""
+        replicas = self.replicas(service)
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": replica["url"],
+                    "outstanding": self.load(replica),
+                    "healthy": self._failed_until.get(replica["url"], 0) <= now,
+                }
+                for replica in replicas
+            ]
@@ -0,0 +1,72 @@
+"""The UI's static files, served by the aggregator so that the UI and the API share one origin.
+
+Files are read and gzip-compressed once at startup, never per request. Responses carry an
+ETag so that browsers revalidate with a 304 instead of downloading the file again.
+index.html is always revalidated, so a new UI shows up on the next load. Other files may
+be cached for an hour.
+"""
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import NamedTuple
+
+from fastapi import Request, Response
+
+SUFFIXES = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".png", ".ico", ".webmanifest"}
+COMPRESSED_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/manifest+json")
+INDEX_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=3600"
+
+
+class Asset(NamedTuple):
+    body: bytes
+    gzipped: bytes | None  # None when compressing does not pay off
+    media_type: str
+    etag: str
+
+
+def load_asset(path: Path, replacements: dict[str, str] | None = None) -> Asset:
+    """Read `path`, apply the text `replacements` and compress it."""
+    body = path.read_bytes()
+    for old, new in (replacements or {}).items():
+        body = body.replace(old.encode(), new.encode())
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    gzipped = None
+    if media_type.startswith(COMPRESSED_TYPES):
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gzipped) >= len(body):
+            gzipped = None
+    # Weak: the gzipped and the plain response are the same file
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:16]}"'
+    return Asset(body, gzipped, media_type, etag)
+
+
+def load_assets(directory: Path, replacements: dict[str, dict[str, str]] | None = None) -> dict[str, Asset]:
+    """Every servable file directly in `directory`, by name. Missing directories give {}."""
+    if not directory.is_dir():
+        return {}
+    return {
+        path.name: load_asset(path, (replacements or {}).get(path.name))
+        for path in sorted(directory.iterdir())
+        if path.is_file() and path.suffix in SUFFIXES
+    }
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def respond(asset: Asset, request: Request, cache_control: str) -> Response:
+    """`asset` as a response to `request`: a 304 if the client has it, gzipped if it accepts gzip."""
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if asset.etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    if asset.gzipped is not None and accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=asset.gzipped, media_type=asset.media_type, headers=headers)
+    return Response(content=asset.body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,58 @@
+"""Choosing the replica of a service to call: least outstanding requests, exclusions, cooldown."""
+import pytest
+
+import balancer
+from balancer import Balancer
+
+FALLBACK = "http://config-host:8005"
+
+
+def with_replicas(monkeypatch: pytest.MonkeyPatch, replicas: list[dict]) -> Balancer:
+    """A balancer without a registry that sees `replicas` for the transcriber."""
+    chooser = Balancer(None, {"transcriber": FALLBACK}, cooldown_seconds=10)
+    monkeypatch.setattr(chooser, "replicas", lambda service: replicas if service == "transcriber" else [])
+    return chooser
+
+
+def test_without_replicas_uses_the_configured_url(monkeypatch: pytest.MonkeyPatch) -> None:
+    chooser = with_replicas(monkeypatch, [])
+    assert chooser.pick("transcriber") == FALLBACK
+    assert chooser.pick("transcriber", exclude=[FALLBACK]) is None
+    assert chooser.pick("unknown") is None
+
+
+def test_picks_the_replica_with_the_fewest_outstanding_requests(monkeypatch: pytest.MonkeyPatch) -> None:
+    chooser = with_replicas(monkeypatch, [{"url": "http://a", "outstanding": 3}, {"url": "http://b", "outstanding": 1}])
+    assert chooser.pick("transcriber") == "http://b"
+
+
+def test_counts_our_own_calls_in_flight(monkeypatch: pytest.MonkeyPatch) -> None:
+    chooser = with_replicas(monkeypatch, [{"url": "http://a", "outstanding": 0}, {"url": "http://b", "outstanding": 1}])
+    with chooser.track("http://a"), chooser.track("http://a"):
+        assert chooser.pick("transcriber") == "http://b"
+    assert chooser.pick("transcriber") == "http://a"
+
+
+def test_skips_excluded_replicas(monkeypatch: pytest.MonkeyPatch) -> None:
+    chooser = with_replicas(monkeypatch, [{"url": "http://a", "outstanding": 0}, {"url": "http://b", "outstanding": 5}])
+    assert chooser.pick("transcriber", exclude=["http://a"]) == "http://b"
+    assert chooser.pick("transcriber", exclude=["http://a", "http://b"]) == FALLBACK
+    assert chooser.pick("transcriber", exclude=["http://a", "http://b", FALLBACK]) is None
+
+
+def test_skips_a_failed_replica_until_its_cooldown_ends(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(balancer.time, "monotonic", lambda: now[0])
+    chooser = with_replicas(monkeypatch, [{"url": "http://a", "outstanding": 0}, {"url": "http://b", "outstanding": 5}])
+    chooser.mark_failed("http://a")
+    assert chooser.pick("transcriber") == "http://b"
+    assert [replica["healthy"] for replica in chooser.snapshot("transcriber")] == [False, True]
+    now[0] += 10
+    assert chooser.pick("transcriber") == "http://a"
+
+
+def test_tries_failed_replicas_rather_than_none(monkeypatch: pytest.MonkeyPatch) -> None:
+    chooser = with_replicas(monkeypatch, [{"url": "http://a", "outstanding": 2}, {"url": "http://b", "outstanding": 1}])
+    chooser.mark_failed("http://a")
+    chooser.mark_failed("http://b")
+    assert chooser.pick("transcriber") == "http://b"
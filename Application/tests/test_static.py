@@ -0,0 +1,92 @@
+"""Serving the UI: gzip negotiation, ETags and 304 revalidation."""
+import gzip
+from pathlib import Path
+
+import pytest
+from starlette.requests import Request
+
+import static
+
+
+def request(headers: dict[str, str]) -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+@pytest.fixture
+def page(tmp_path: Path) -> static.Asset:
+    path = tmp_path / "index.html"
+    path.write_text("<html>" + "<p>voice control</p>" * 100 + "</html>")
+    return static.load_asset(path)
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "accepted"),
+    [
+        ("gzip", True),
+        ("gzip, deflate, br", True),
+        ("br;q=1.0, GZIP;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("gzip; q=0.000", False),
+        ("deflate, br", False),
+        ("", False),
+    ],
+)
+def test_accepts_gzip(accept_encoding: str, accepted: bool) -> None:
+    assert static.accepts_gzip(accept_encoding) is accepted
+
+
+def test_load_asset_applies_replacements_and_compresses(tmp_path: Path) -> None:
+    path = tmp_path / "index.html"
+    path.write_text('<meta name="same-origin" content="false" />' * 20)
+    asset = static.load_asset(path, {'content="false"': 'content="true"'})
+    assert b'content="false"' not in asset.body
+    assert asset.media_type == "text/html"
+    assert gzip.decompress(asset.gzipped) == asset.body
+
+
+def test_does_not_keep_a_gzip_that_is_not_smaller(tmp_path: Path) -> None:
+    path = tmp_path / "tiny.js"
+    path.write_text("x")
+    assert static.load_asset(path).gzipped is None
+
+
+def test_etag_follows_the_content(tmp_path: Path) -> None:
+    path = tmp_path / "app.js"
+    path.write_text("one")
+    first = static.load_asset(path)
+    assert static.load_asset(path).etag == first.etag
+    path.write_text("two")
+    assert static.load_asset(path).etag != first.etag
+
+
+def test_serves_gzip_only_to_clients_that_accept_it(page: static.Asset) -> None:
+    zipped = static.respond(page, request({"Accept-Encoding": "gzip"}), static.INDEX_CACHE_CONTROL)
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert zipped.body == page.gzipped
+    assert zipped.headers["etag"] == page.etag
+    assert zipped.headers["cache-control"] == "no-cache"
+    assert zipped.headers["vary"] == "Accept-Encoding"
+
+    plain = static.respond(page, request({}), static.INDEX_CACHE_CONTROL)
+    assert "content-encoding" not in plain.headers
+    assert plain.body == page.body
+
+
+def test_answers_304_when_the_client_has_the_file(page: static.Asset) -> None:
+    headers = {"If-None-Match": f'W/"stale", {page.etag}', "Accept-Encoding": "gzip"}
+    response = static.respond(page, request(headers), static.ASSET_CACHE_CONTROL)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == page.etag
+
+    stale = static.respond(page, request({"If-None-Match": 'W/"stale"'}), static.ASSET_CACHE_CONTROL)
+    assert stale.status_code == 200
+
+
+def test_load_assets_skips_unknown_files_and_missing_directories(tmp_path: Path) -> None:
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "notes.txt").write_text("not served")
+    assert list(static.load_assets(tmp_path)) == ["index.html"]
+    assert static.load_assets(tmp_path / "missing") == {}
@@ -0,0 +1,51 @@
+"""HTTP clients for the backend services, over a Unix domain socket when one runs on this host.
+
+config.yaml may give a service an `endpoint: unix:/path/to/service.sock` next to its host
+and port; the orchestrator adds one for every service it runs on this host. Calls to that
+service's URL then go through the socket for as long as it exists, skipping the TCP/IP
+stack, and connections are kept alive either way. A socket that refuses the connection,
+e.g. left behind by a service restarted by hand, is bypassed for TCP.
+"""
+import os
+import threading
+
+import httpx
+
+
+def unix_socket(entry: dict) -> str | None:
+    """The socket path of a `unix:` endpoint in a config.yaml service entry, if it has one."""
+    endpoint = str(entry.get("endpoint") or "")
+    if not endpoint.startswith("unix:") or os.name == "nt":
+        return None
+    return endpoint.removeprefix("unix:")
+
+
+class Transport:
+    """Send requests to base URLs, through the Unix socket mapped to the URL when there is one."""
+
+    def __init__(self, sockets: dict[str, str | None], timeout: float = 5) -> None:
+        self.sockets = {base: path for base, path in sockets.items() if path}
+        self.timeout = timeout
+        self.tcp = httpx.Client(timeout=timeout)
+        self._unix: dict[str, httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def client(self, base: str) -> httpx.Client:
+        """The client for `base`: its Unix socket's if the socket file exists, else the TCP one."""
+        path = self.sockets.get(base)
+        if path is None or not os.path.exists(path):
+            return self.tcp
+        with self._lock:
+            if path not in self._unix:
+                self._unix[path] = httpx.Client(transport=httpx.HTTPTransport(uds=path), timeout=self.timeout)
+            return self._unix[path]
+
+    def request(self, method: str, base: str, path: str, **kwargs: object) -> httpx.Response:
+        """Send `method base+path`, like `httpx.request()`."""
+        client = self.client(base)
+        try:
+            return client.request(method, f"{base}{path}", **kwargs)
+        except httpx.ConnectError:
+            if client is self.tcp:
+                raise
+            return self.tcp.request(method, f"{base}{path}", **kwargs)
@@ -1,10 +1,12 @@
 import asyncio
+import os
 import shutil
 import uuid
 from collections.abc import Awaitable, Callable
 from threading import Lock
 
 import cv2
+import numpy as np
 import psutil
 import pyautogui
 from fastapi import FastAPI, HTTPException, Request, Response
@@ -13,16 +15,51 @@ from starlette.responses import Response as StarletteResponse
 import httpx
 import toml
 
+from voicecontrol_common import registration, tracing
+from voicecontrol_common.metrics import Histogram, instrument
+from voicecontrol_common.tracing import current_request_id, span
+
+
+class FakeCamera:
+    """Stand-in for cv2.VideoCapture that serves a synthetic frame.
+
+    Enabled with FAKE_CAMERA=1 for benchmarks and machines without a camera.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480) -> None:
+        gradient = np.linspace(0, 255, width, dtype=np.uint8)
+        self.frame = np.dstack([np.tile(gradient, (height, 1))] * 3)
+        self.opened = True
+
+    def isOpened(self) -> bool:  # noqa: N802 - mirrors cv2.VideoCapture
+        return self.opened
+
+    def read(self) -> tuple[bool, np.ndarray]:
+        return self.opened, self.frame.copy()
+
+    def release(self) -> None:
+        self.opened = False
+
 
 app = FastAPI()
+instrument(app)
+tracing.instrument(app, "hardware")
+registration.instrument(app, "hardware", 8003)
 
-camera: cv2.VideoCapture | None = None
+camera: cv2.VideoCapture | FakeCamera | None = None
 camera_lock: Lock = Lock()
 
+# Probed/scraped every few seconds, so keep them out of the logs
+HEALTH_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+CAMERA_GRAB_SECONDS = Histogram("hardware_camera_grab_seconds", "Time to grab a frame from the camera.")
+CAMERA_ENCODE_SECONDS = Histogram("hardware_camera_encode_seconds", "Time to encode a captured frame as PNG.")
+SCREENSHOT_SECONDS = Histogram("hardware_screenshot_seconds", "Time to take and save a screenshot.")
+
 def logger_info(message:str):
     "Log message in a server."
     url = toml.load("log_config.toml")["url"]+"/log"
-    httpx.request(method="POST", url=url, json={"message":message})
+    httpx.request(method="POST", url=url, json={"message":message, "request_id":current_request_id()})
 
 @app.middleware("http")
 async def add_cors_header(
@@ -34,7 +71,8 @@ async def add_cors_header(
     """
     response: StarletteResponse = await call_next(request)
     response.headers["Access-Control-Allow-Origin"] = "*"
-    logger_info("adding cors headers")
+    if request.url.path not in HEALTH_PATHS:
+        logger_info("adding cors headers")
     return response
 
 
@@ -44,7 +82,7 @@ async def startup_event() -> None:
     If the camera cannot be opened or warmed up, raise an exception.
     """
     global camera
-    camera = cv2.VideoCapture(0)
+    camera = FakeCamera() if os.getenv("FAKE_CAMERA") == "1" else cv2.VideoCapture(0)
     if not camera.isOpened():
         logger_info("Could not open camera at startup.")
         raise Exception("Error: Could not open camera at startup.")
@@ -70,6 +108,33 @@ def shutdown_event() -> None:
         camera.release()
 
 
+def camera_checks() -> dict[str, bool]:
+    """Return whether the camera opened at startup is still usable."""
+    return {"camera_open": camera is not None and camera.isOpened()}
+
+
+@app.get("/healthz")
+def healthz() -> JSONResponse:
+    """Liveness probe: the service answers and the camera is still open."""
+    checks = camera_checks()
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "unhealthy", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
+@app.get("/readyz")
+def readyz() -> JSONResponse:
+    """Readiness probe: the camera has been opened and warmed up."""
+    checks = camera_checks()
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "not ready", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
 @app.get("/capture")
 async def capture() -> Response:
     """Capture an image using the warmed-up camera and return it as a PNG image."""
@@ -80,7 +145,7 @@ async def capture() -> Response:
         raise HTTPException(status_code=500, detail="Camera not available.")
 
     # Lock the camera access to avoid race conditions
-    with camera_lock:
+    with camera_lock, CAMERA_GRAB_SECONDS.time(), span("camera grab"):
         for _ in range(10):
             ret, frame = camera.read()
         ret, frame = camera.read()
@@ -90,7 +155,8 @@ async def capture() -> Response:
         raise HTTPException(status_code=500, detail="Failed to capture image.")
 
     # Encode the captured frame as a PNG image in memory
-    success, encoded_image = cv2.imencode(".png", frame)
+    with CAMERA_ENCODE_SECONDS.time(), span("camera encode"):
+        success, encoded_image = cv2.imencode(".png", frame)
     if not success:
         logger_info("could not encode image")
         raise HTTPException(status_code=500, detail="Could not encode image.")
@@ -103,8 +169,9 @@ async def capture() -> Response:
 def screenshot() -> FileResponse:
     """Take a screenshot of the current screen and return it as a PNG image file."""
     filename = f"./images/screenshot_{uuid.uuid4().hex}.png"
-    image = pyautogui.screenshot()
-    image.save(filename)
+    with SCREENSHOT_SECONDS.time(), span("screenshot"):
+        image = pyautogui.screenshot()
+        image.save(filename)
     logger_info("screenshot taken")
     return FileResponse(path=filename, media_type="image/png", filename="screenshot.png")
 
@@ -181,6 +248,7 @@ def cpuinfo() -> JSONResponse:
 # 6. Run the Application
 ###############################################################################
 if __name__ == "__main__":
-    import uvicorn
+    from voicecontrol_common.serving import serve, uvicorn_options
 
-    uvicorn.run(app, host="0.0.0.0", port=8003)
+    # Single process: there is only one camera to open
+    serve("__main__:app", host="0.0.0.0", port=8003, **uvicorn_options(workers=1))
@@ -0,0 +1,128 @@
+# command_decoding.py
+"""Whisper decoding benchmark: command mode against the original open-vocabulary settings.
+
+Loads the transcriber's model in-process, decodes every recording of the corpus with
+both decoding modes and reports latency, the speedup of command mode and how many
+transcriptions still contain the expected command phrase. Only Whisper is timed, audio
+is decoded once up front.
+
+Run from the transcriber directory, so its environment (whisper, PyAV) is used:
+    cd transcriber && uv run ../benchmarks/command_decoding.py --repeats 5
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import toml
+import yaml
+
+TRANSCRIBER_DIR = Path(__file__).resolve().parent.parent / "transcriber"
+sys.path.insert(0, str(TRANSCRIBER_DIR))
+
+import decoding  # noqa: E402
+from audio import decode  # noqa: E402
+from backends import BACKENDS, InferenceBackend  # noqa: E402
+from e2e_latency import CORPUS_DIR, RESULTS_DIR, git_revision, load_corpus, percentile  # noqa: E402
+from model_tiers import MODEL_TIERS, ModelRegistry  # noqa: E402
+
+
+def normalise(text: str) -> str:
+    """Lowercase and drop punctuation, so "Open browser." matches "open browser"."""
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", text.lower()).split())
+
+
+def command_list() -> list[tuple[list[str], str]]:
+    """Flatten commands.yaml the same way the transcriber does."""
+    yaml_commands = yaml.safe_load((TRANSCRIBER_DIR / "commands.yaml").read_text()) or []
+    return [
+        (queries, cmd)
+        for category_dict in yaml_commands
+        for command_dict in category_dict.values()
+        for cmd, queries in command_dict.items()
+    ]
+
+
+def run_mode(model: InferenceBackend, corpus: list[dict], options: dict, repeats: int) -> dict:
+    """Decode the corpus `repeats` times with one set of options."""
+    latencies, correct, outputs = [], 0, {}
+    for _ in range(repeats):
+        for entry in corpus:
+            start = time.perf_counter()
+            text = model.transcribe(entry["samples"], options).text
+            latencies.append(time.perf_counter() - start)
+            correct += normalise(entry["text"]) in normalise(text)
+            outputs[entry["file"]] = text
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "correct": correct,
+        "decoded": len(latencies),
+        "transcriptions": outputs,
+    }
+
+
+def main() -> None:
+    config = toml.load(TRANSCRIBER_DIR / "config.toml")
+    parser = argparse.ArgumentParser(description="Compare command-mode decoding against open decoding")
+    parser.add_argument("--model", default=config["model"].get("name", "base.en"), choices=MODEL_TIERS)
+    parser.add_argument("--backend", default=config["model"].get("backend", "torch"), choices=tuple(BACKENDS))
+    parser.add_argument("--device", default=config["model"].get("device", "cpu"))
+    parser.add_argument("--quantize", action=argparse.BooleanOptionalAction, default=config["model"].get("quantize"),
+                        help="int8 dynamic quantization (CPU only)")
+    parser.add_argument("--repeats", type=int, default=3, help="how many times the corpus is decoded per mode")
+    parser.add_argument("--max-tokens", type=int, default=config["decoding"].get("max_tokens", 64))
+    parser.add_argument("--output", type=Path, default=None, help="where to write the JSON results")
+    args = parser.parse_args()
+
+    corpus = load_corpus(synthetic=False)
+    if not corpus:
+        sys.exit(f"No recordings found, add files to {CORPUS_DIR} and list them in the manifest")
+    for entry in corpus:
+        entry["samples"] = decode(entry.pop("audio"), None)
+
+    registry = ModelRegistry(backend=args.backend, device=args.device, quantized=bool(args.quantize))
+    model = registry.get(args.model)
+    modes = {
+        "open": decoding.decoding_options("open", "", 0, word_timestamps=True),
+        "command": decoding.decoding_options(
+            "command", decoding.command_prompt(command_list()), args.max_tokens, word_timestamps=False,
+        ),
+    }
+
+    # One untimed pass per mode, the first decode pays for kernel setup and caches
+    for options in modes.values():
+        model.transcribe(corpus[0]["samples"], options)
+
+    results = {name: run_mode(model, corpus, options, args.repeats) for name, options in modes.items()}
+    speedup = results["open"]["p50_ms"] / results["command"]["p50_ms"] if results["command"]["p50_ms"] else 0.0
+
+    print(f"\n📊 {len(corpus)} recordings x {args.repeats} repeats, model {args.model}"
+          f"{' (int8)' if model.quantized else ''} on {args.backend}/{args.device}")
+    print(f"{'Mode':<8} | {'p50 ms':>9} | {'p95 ms':>9} | {'mean ms':>9} | correct")
+    print("-" * 55)
+    for name, stats in results.items():
+        print(f"{name:<8} | {stats['p50_ms']:>9.2f} | {stats['p95_ms']:>9.2f} | {stats['mean_ms']:>9.2f} | "
+              f"{stats['correct']}/{stats['decoded']}")
+    print(f"\n⚡ Command mode p50 speedup: {speedup:.2f}x")
+
+    output = args.output or RESULTS_DIR / f"decoding_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"model": args.model, "backend": args.backend, "device": args.device,
+                     "quantized": model.quantized, "repeats": args.repeats, "max_tokens": args.max_tokens,
+                     "corpus": [entry["file"] for entry in corpus]},
+        "speedup_p50": round(speedup, 3),
+        "modes": results,
+    }, indent=2))
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# e2e_latency.py
+"""End-to-end latency benchmark: voice command -> transcriber -> aggregator -> backends.
+
+Starts the services with stand-in backends (fake camera, local HTML fixture instead of
+Bing), replays the canned audio corpus at the requested concurrency and reports
+p50/p95/p99 latency per stage plus throughput. Results are written as JSON so runs can
+be compared with `--baseline`.
+
+Run from the repository root:
+    uv run benchmarks/e2e_latency.py --concurrency 4 --repeats 5
+"""
+import argparse
+import http.server
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import wave
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+FIXTURE = Path(__file__).parent / "fixtures" / "search.html"
+RESULTS_DIR = Path(__file__).parent / "results"
+FIXTURE_PORT = 8099
+STAGES = ["decode", "kws", "transcribe", "match", "dispatch", "backend", "total"]
+
+
+def serve_fixture(port: int) -> http.server.ThreadingHTTPServer:
+    """Serve the search results fixture for every path, in a background thread."""
+    body = FIXTURE.read_bytes()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def synthetic_wav(seconds: float, seed: int) -> bytes:
+    """Return a 16 kHz mono WAV with a few tones and noise, standing in for a recording."""
+    rng = random.Random(seed)  # noqa: S311 - test audio, not cryptography
+    freqs = [rng.uniform(150, 900) for _ in range(3)]
+    samples = array("h", (
+        int(32767 * (0.2 * sum(math.sin(2 * math.pi * f * i / 16000) for f in freqs) / 3 + 0.01 * rng.gauss(0, 1)))
+        for i in range(int(16000 * seconds))
+    ))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def load_corpus(*, synthetic: bool) -> list[dict]:
+    """Load the manifest and the audio of each entry.
+
+    Entries whose file is missing are skipped, unless `synthetic` is set, in which case
+    they get generated audio so the pipeline can still be timed end to end.
+    """
+    manifest = yaml.safe_load((CORPUS_DIR / "manifest.yaml").read_text()) or []
+    corpus = []
+    for i, entry in enumerate(manifest):
+        path = CORPUS_DIR / entry["file"]
+        if path.exists() and not synthetic:
+            audio, name = path.read_bytes(), path.name
+        elif synthetic:
+            audio, name = synthetic_wav(2.0, seed=i), f"{path.stem}.wav"
+        else:
+            print(f"⚠️  {path} not found, skipping (use --synthetic to generate audio)")
+            continue
+        corpus.append({**entry, "audio": audio, "name": name, "synthetic": synthetic})
+    return corpus
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """Parse `a;dur=1.2, b;dur=3` into seconds per metric."""
+    timings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "dur" and value:
+                timings[name] = float(value) / 1000
+    return timings
+
+
+def replay(client: httpx.Client, entry: dict, transcriber_url: str, aggregator_url: str) -> dict:
+    """Send one recording through the transcriber and dispatch its commands to the aggregator."""
+    sample = {}
+    start = time.perf_counter()
+    resp = client.post(
+        f"{transcriber_url}/transcribe",
+        files={"recording": (entry["name"], entry["audio"])},
+        # Generated tones are not speech, keyword spotting would (rightly) reject them
+        headers={"X-KWS": "bypass"} if entry["synthetic"] else None,
+    )
+    resp.raise_for_status()
+    sample.update(parse_server_timing(resp.headers.get("server-timing", "")))
+
+    commands = resp.json()["response"]["commands"]
+    sample["matched"] = bool(commands)
+    if not commands:
+        commands = entry.get("expected", [])
+
+    sample["dispatch"] = sample["backend"] = 0.0
+    for command in commands:
+        body = {"query": command["additional"]} if command["command"] in ("search", "new_window_and_search") else None
+        dispatch_start = time.perf_counter()
+        result = client.post(f"{aggregator_url}/{command['command']}", json=body)
+        elapsed = time.perf_counter() - dispatch_start
+        backend = parse_server_timing(result.headers.get("server-timing", "")).get("backend", 0.0)
+        sample["backend"] += backend
+        sample["dispatch"] += elapsed - backend
+    sample["total"] = time.perf_counter() - start
+    return sample
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def summarise(samples: list[dict], wall: float) -> dict:
+    """Reduce raw samples to per-stage percentiles (in ms) and throughput."""
+    stages = {}
+    for stage in STAGES:
+        values = [s[stage] for s in samples if stage in s]
+        if values:
+            stages[stage] = {
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            }
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if "error" in s),
+        "matched": sum(1 for s in samples if s.get("matched")),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 3) if wall else 0.0,
+        "stages": stages,
+    }
+
+
+def print_summary(summary: dict, baseline: dict | None) -> None:
+    """Pretty-print the summary, with the change against a baseline run if given."""
+    print(f"\n📊 {summary['requests']} requests, {summary['errors']} errors, {summary['matched']} matched, "
+          f"{summary['throughput_rps']} req/s")
+    print(f"{'Stage':<12} | {'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9}")
+    print("-" * 50)
+    for stage, stats in summary["stages"].items():
+        row = f"{stage:<12} | {stats['p50_ms']:>9.2f} | {stats['p95_ms']:>9.2f} | {stats['p99_ms']:>9.2f}"
+        if baseline and stage in baseline["stages"]:
+            old = baseline["stages"][stage]["p50_ms"]
+            if old:
+                row += f" | p50 {(stats['p50_ms'] - old) / old * 100:+.1f}%"
+        print(row)
+
+
+def start_stack() -> None:
+    """Start every service with stand-in backends through the orchestrator."""
+    os.environ["FAKE_CAMERA"] = "1"
+    os.environ["BROWSER_SEARCH_URL"] = f"http://127.0.0.1:{FIXTURE_PORT}/search?q="
+    os.chdir(ROOT)
+
+    # Imported here: the orchestrator needs the repository root as working directory and its
+    # own dependencies, which the service environments running the other benchmarks lack
+    import control  # noqa: PLC0415
+    from scheduler import print_timeline, start_services  # noqa: PLC0415
+
+    control.local_ip = control.get_local_ip()
+    control.update_config()
+    control.update_log_configs_with_logger_url()
+    print_timeline(start_services(control.SERVICES, control.prepare_service, control.launch_service, control.local_ip))
+
+
+def git_revision() -> str:
+    """Return the current commit, so results can be traced back to the code they measured."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607 - git from PATH, like a developer runs it
+            capture_output=True, text=True, cwd=ROOT, check=False,
+        )
+        return result.stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+def main() -> None:
+    """Replay the corpus through the running (or freshly started) services and report the latencies."""
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark")
+    parser.add_argument("--concurrency", type=int, default=1, help="recordings replayed in parallel")
+    parser.add_argument("--repeats", type=int, default=3, help="how many times the corpus is replayed")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes over the corpus before measuring")
+    parser.add_argument("--synthetic", action="store_true", help="generate audio instead of reading the corpus")
+    parser.add_argument("--no-start", action="store_true", help="benchmark services that are already running")
+    parser.add_argument("--transcriber", default=None, help="transcriber URL (default: local IP, port 8005)")
+    parser.add_argument("--aggregator", default=None, help="aggregator URL (default: from config.yaml)")
+    parser.add_argument("--output", type=Path, default=None, help="where to write the JSON results")
+    parser.add_argument("--baseline", type=Path, default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    corpus = load_corpus(synthetic=args.synthetic)
+    if not corpus:
+        sys.exit("No recordings to replay, add files to benchmarks/corpus or pass --synthetic")
+
+    fixture = serve_fixture(FIXTURE_PORT)
+    if not args.no_start:
+        start_stack()
+
+    config = yaml.safe_load((ROOT / "config.yaml").read_text())
+    aggregator = config["aggregator_service"]
+    aggregator_url = args.aggregator or f"http://{aggregator['host']}:{aggregator['port']}"
+    transcriber_url = args.transcriber or f"http://{aggregator['host']}:8005"
+
+    samples = []
+    try:
+        with httpx.Client(timeout=120) as client, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for entry in corpus * args.warmup:
+                replay(client, entry, transcriber_url, aggregator_url)
+
+            def timed(entry: dict) -> dict:
+                try:
+                    return replay(client, entry, transcriber_url, aggregator_url)
+                except (httpx.HTTPError, ValueError, KeyError) as e:  # Failed call, or not the expected JSON
+                    return {"error": str(e)}
+
+            start = time.perf_counter()
+            samples = list(pool.map(timed, corpus * args.repeats))
+            wall = time.perf_counter() - start
+    finally:
+        fixture.shutdown()
+        if not args.no_start:
+            import control  # noqa: PLC0415 - see start_stack()
+
+            control.stop_all_services()
+
+    summary = summarise(samples, wall)
+    baseline = json.loads(args.baseline.read_text())["summary"] if args.baseline else None
+    print_summary(summary, baseline)
+
+    output = args.output or RESULTS_DIR / f"e2e_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "concurrency": args.concurrency,
+            "repeats": args.repeats,
+            "synthetic": args.synthetic,
+            "corpus": [entry["file"] for entry in corpus],
+        },
+        "summary": summary,
+        "samples": samples,
+    }, indent=2))
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
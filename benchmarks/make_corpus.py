@@ -0,0 +1,112 @@
+# make_corpus.py
+"""Generate the spoken recordings listed in corpus/manifest.yaml.
+
+Speaks the `text` of every manifest entry with eSpeak NG and writes it to the entry's
+`file` as Opus in WebM, the format the UI's MediaRecorder uploads, with a little silence
+before and after like a push-to-talk recording, so the benchmarks decode and match real
+speech instead of tones. The voice is robotic: record your own over the generated files
+for realistic accuracy numbers.
+
+eSpeak NG comes from the espeakng-loader wheel (library and voice data, no system
+install), PyAV from the transcriber's environment:
+    cd transcriber && uv run --with espeakng-loader ../benchmarks/make_corpus.py
+"""
+import argparse
+import ctypes
+import sys
+from pathlib import Path
+
+import av
+import espeakng_loader
+import numpy as np
+import yaml
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+SAMPLE_RATE = 48000  # Opus only encodes 8/12/16/24/48 kHz, browsers record at 48 kHz
+BITRATE = 32000
+PADDING_SECONDS = 0.3
+
+# espeak_AUDIO_OUTPUT, espeak_PARAMETER, espeak_POSITION_TYPE and flags from speak_lib.h
+AUDIO_OUTPUT_SYNCHRONOUS = 2
+ESPEAK_RATE = 1
+POS_CHARACTER = 1
+ESPEAK_CHARS_UTF8 = 1
+SYNTH_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_short), ctypes.c_int, ctypes.c_void_p)
+
+
+class Speaker:
+    """eSpeak NG, speaking text into 16-bit mono samples."""
+
+    def __init__(self, voice: str, words_per_minute: int) -> None:
+        self.lib = ctypes.CDLL(espeakng_loader.get_library_path())
+        self.lib.espeak_Initialize.argtypes = (ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_int)
+        self.lib.espeak_SetSynthCallback.argtypes = (SYNTH_CALLBACK,)
+        self.lib.espeak_SetVoiceByName.argtypes = (ctypes.c_char_p,)
+        self.lib.espeak_Synth.argtypes = (
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint, ctypes.c_int, ctypes.c_uint, ctypes.c_uint,
+            ctypes.c_void_p, ctypes.c_void_p,
+        )
+        # The path is the directory that contains espeak-ng-data
+        data_parent = str(Path(espeakng_loader.get_data_path()).parent).encode()
+        self.sample_rate = self.lib.espeak_Initialize(AUDIO_OUTPUT_SYNCHRONOUS, 0, data_parent, 0)
+        if self.sample_rate <= 0:
+            sys.exit("eSpeak NG failed to initialise")
+        if self.lib.espeak_SetVoiceByName(voice.encode()) != 0:
+            sys.exit(f"eSpeak NG has no voice {voice!r}")
+        self.lib.espeak_SetParameter(ESPEAK_RATE, words_per_minute, 0)
+        self._chunks: list[np.ndarray] = []
+        # Keep a reference, eSpeak only holds the raw function pointer
+        self._callback = SYNTH_CALLBACK(self._collect)
+        self.lib.espeak_SetSynthCallback(self._callback)
+
+    def _collect(self, wav: ctypes.POINTER(ctypes.c_short), count: int, _events: int) -> int:
+        if wav and count > 0:
+            self._chunks.append(np.ctypeslib.as_array(wav, shape=(count,)).copy())
+        return 0  # 0 = continue synthesis
+
+    def speak(self, text: str) -> np.ndarray:
+        """Return `text` spoken, as int16 samples at `self.sample_rate`."""
+        self._chunks = []
+        data = text.encode()
+        self.lib.espeak_Synth(data, len(data) + 1, 0, POS_CHARACTER, 0, ESPEAK_CHARS_UTF8, None, None)
+        self.lib.espeak_Synchronize()
+        return np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.int16)
+
+
+def write_webm(path: Path, samples: np.ndarray, sample_rate: int) -> None:
+    """Encode int16 mono `samples` as Opus in WebM, resampled to 48 kHz."""
+    padding = np.zeros(int(sample_rate * PADDING_SECONDS), dtype=np.int16)
+    frame = av.AudioFrame.from_ndarray(np.concatenate([padding, samples, padding])[np.newaxis, :],
+                                       format="s16", layout="mono")
+    frame.sample_rate = sample_rate
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    with av.open(str(path), "w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=SAMPLE_RATE, layout="mono")
+        stream.bit_rate = BITRATE
+        for resampled in [*resampler.resample(frame), *resampler.resample(None)]:
+            container.mux(stream.encode(resampled))
+        container.mux(stream.encode(None))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speak the corpus manifest into WebM recordings")
+    parser.add_argument("--voice", default="en-us", help="eSpeak NG voice")
+    parser.add_argument("--wpm", type=int, default=150, help="speaking rate in words per minute")
+    parser.add_argument("--force", action="store_true", help="overwrite recordings that already exist")
+    args = parser.parse_args()
+
+    manifest = yaml.safe_load((CORPUS_DIR / "manifest.yaml").read_text()) or []
+    speaker = Speaker(args.voice, args.wpm)
+    for entry in manifest:
+        path = CORPUS_DIR / entry["file"]
+        if path.exists() and not args.force:
+            print(f"⏭️  {path.name} exists, skipping (use --force to regenerate)")
+            continue
+        samples = speaker.speak(entry["text"])
+        write_webm(path, samples, speaker.sample_rate)
+        seconds = len(samples) / speaker.sample_rate + 2 * PADDING_SECONDS
+        print(f"🗣️  {path.name}: {entry['text']!r}, {seconds:.1f} s, {path.stat().st_size / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
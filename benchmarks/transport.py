@@ -0,0 +1,226 @@
+# transport.py
+"""TCP against Unix domain socket transport between the aggregator and a co-located backend.
+
+Starts a stand-in hardware service (a small JSON answer on /cpu and an incompressible
+"screenshot" on /screenshot) that listens on a TCP port and a Unix socket, the way
+serving.serve() runs the real services, and a proxy that forwards to it like the
+aggregator does, once over TCP and once over the socket (transport.Transport). The
+client calls the proxy over TCP, as the UI does, and reports proxy latency and image
+throughput per transport, plus the same calls made directly to the backend.
+
+Run from the Application directory, so its environment (FastAPI, uvicorn) is used:
+    cd Application && uv run ../benchmarks/transport.py --requests 2000 --image-mb 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import yaml
+from fastapi import FastAPI, Response
+from voicecontrol_common.serving import serve, uvicorn_options
+
+APPLICATION_DIR = Path(__file__).resolve().parent.parent / "Application"
+sys.path.insert(0, str(APPLICATION_DIR))
+
+# e2e_latency adds the repository root to the path, for server_profile. The aggregator's
+# transport module comes first on the path, before this script of the same name.
+from e2e_latency import RESULTS_DIR, ROOT, git_revision, percentile  # noqa: E402
+from transport import Transport  # noqa: E402
+
+import server_profile  # noqa: E402
+
+TRANSPORTS = ("tcp", "unix")
+
+
+def free_port() -> int:
+    """Return a TCP port on the loopback interface that nothing listens on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_backend(port: int, image_bytes: int) -> None:
+    """Run a stand-in hardware service, listening on `port` and on $SERVICE_SOCKET."""
+    image = os.urandom(image_bytes)  # Compressed PNG data is about as random as this
+    app = FastAPI()
+
+    @app.get("/cpu")
+    def cpu() -> dict:
+        return {"cpu_percent": 12.5, "cpu_count": os.cpu_count()}
+
+    @app.get("/screenshot")
+    def screenshot() -> Response:
+        return Response(content=image, media_type="image/png")
+
+    serve(app, host="127.0.0.1", port=port, **uvicorn_options(workers=1, reload=False, access_log=False))
+
+
+def run_proxy(port: int, backend_port: int, unix_socket: str) -> None:
+    """Run an aggregator stand-in: /<transport>/<path> forwards to the backend over that transport."""
+    base = f"http://127.0.0.1:{backend_port}"
+    transports = {"tcp": Transport({}), "unix": Transport({base: unix_socket})}
+    app = FastAPI()
+
+    @app.post("/{kind}/{path}")
+    def proxy(kind: str, path: str) -> Response:
+        resp = transports[kind].request("GET", base, f"/{path}")
+        return Response(content=resp.content, media_type=resp.headers.get("content-type"))
+
+    serve(app, host="127.0.0.1", port=port, **uvicorn_options(workers=1, reload=False, access_log=False))
+
+
+def start(role: str, args: list[str], env: dict[str, str]) -> subprocess.Popen:
+    """Run this script in `role` (backend or proxy) as a child process."""
+    return subprocess.Popen(  # noqa: S603 - this script, with arguments we built
+        [sys.executable, __file__, "--role", role, *args], cwd=APPLICATION_DIR, env=env,
+    )
+
+
+def wait_until_up(client: httpx.Client, method: str, url: str, timeout: float = 30) -> None:
+    """Poll `url` until it answers 200 OK, or exit after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if client.request(method, url).status_code == httpx.codes.OK:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    sys.exit(f"{url} did not come up within {timeout:.0f}s")
+
+
+def measure(client: httpx.Client, method: str, url: str, count: int, warmup: int) -> dict:
+    """Latency percentiles and throughput of `count` sequential requests (after `warmup` untimed ones)."""
+    for _ in range(warmup):
+        client.request(method, url).raise_for_status()
+    latencies, size = [], 0
+    start = time.perf_counter()
+    for _ in range(count):
+        request_start = time.perf_counter()
+        resp = client.request(method, url)
+        latencies.append(time.perf_counter() - request_start)
+        resp.raise_for_status()
+        size += len(resp.content)
+    wall = time.perf_counter() - start
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "requests_per_second": round(count / wall, 1),
+        "mb_per_second": round(size / wall / 2**20, 1),
+    }
+
+
+def resolve_profile(name: str | None) -> tuple[str | None, dict]:
+    """Return the server profile `name` of config.yaml (default: the selected one) and its uvicorn options."""
+    config = yaml.safe_load((ROOT / "config.yaml").read_text()) or {}
+    profile_name = name or config.get("server_profile")
+    profile = (config.get("server_profiles") or {}).get(profile_name) or {}
+    return profile_name, server_profile.resolve(profile, single_process=True)
+
+
+def run_all(args: argparse.Namespace, options: dict) -> dict[str, dict]:
+    """Start the backend and the proxy with `options`, and measure every path over both transports."""
+    backend_port, proxy_port = free_port(), free_port()
+    unix_socket = str(Path(tempfile.mkdtemp(prefix="vc-bench-")) / "backend.sock")
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("UVICORN_", "SERVICE_SOCKET"))}
+    env |= server_profile.environment(options)
+    processes = [
+        start("backend", ["--port", str(backend_port), "--image-mb", str(args.image_mb)],
+              env | {"SERVICE_SOCKET": f"unix:{unix_socket}"}),
+        start("proxy", ["--port", str(proxy_port), "--backend-port", str(backend_port), "--socket", unix_socket], env),
+    ]
+    backend = f"http://127.0.0.1:{backend_port}"
+    proxy = f"http://127.0.0.1:{proxy_port}"
+    clients = {
+        "tcp": httpx.Client(timeout=30),
+        "unix": httpx.Client(transport=httpx.HTTPTransport(uds=unix_socket), timeout=30),
+    }
+    results: dict[str, dict] = {}
+    try:
+        wait_until_up(clients["unix"], "GET", f"{backend}/cpu")
+        wait_until_up(clients["tcp"], "POST", f"{proxy}/unix/cpu")
+        for kind in TRANSPORTS:
+            results[f"proxy {kind}"] = {
+                "latency": measure(clients["tcp"], "POST", f"{proxy}/{kind}/cpu", args.requests, args.warmup),
+                "image": measure(clients["tcp"], "POST", f"{proxy}/{kind}/screenshot", args.images, args.warmup // 10),
+            }
+        for kind in TRANSPORTS:
+            results[f"direct {kind}"] = {
+                "latency": measure(clients[kind], "GET", f"{backend}/cpu", args.requests, args.warmup),
+                "image": measure(clients[kind], "GET", f"{backend}/screenshot", args.images, args.warmup // 10),
+            }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+    return results
+
+
+def print_results(args: argparse.Namespace, profile_name: str | None, options: dict, results: dict[str, dict]) -> None:
+    """Print a table of the results and how the Unix socket compares to TCP."""
+    print(f"\n📊 {args.requests} /cpu and {args.images} x {args.image_mb:g} MB /screenshot requests per transport, "
+          f"server profile {profile_name} ({server_profile.describe(options)})")
+    print(f"{'Path':<12} | {'p50 ms':>8} | {'p95 ms':>8} | {'req/s':>8} | {'image p50 ms':>12} | {'image MB/s':>10}")
+    print("-" * 74)
+    for name, stats in results.items():
+        latency, image = stats["latency"], stats["image"]
+        print(f"{name:<12} | {latency['p50_ms']:>8.3f} | {latency['p95_ms']:>8.3f} | "
+              f"{latency['requests_per_second']:>8.1f} | {image['p50_ms']:>12.2f} | {image['mb_per_second']:>10.1f}")
+    for path in ("proxy", "direct"):
+        tcp, unix = results[f"{path} tcp"], results[f"{path} unix"]
+        latency = unix["latency"]["p50_ms"] / tcp["latency"]["p50_ms"]
+        throughput = unix["image"]["mb_per_second"] / tcp["image"]["mb_per_second"]
+        print(f"\n⚡ {path}, UDS relative to TCP: p50 latency {latency:.2f}x, image throughput {throughput:.2f}x")
+
+
+def main() -> None:
+    """Run the benchmark, or one of its servers when started with --role."""
+    parser = argparse.ArgumentParser(description="Compare TCP and Unix socket transport to a co-located backend")
+    parser.add_argument("--requests", type=int, default=1000, help="timed /cpu requests per transport")
+    parser.add_argument("--images", type=int, default=100, help="timed /screenshot requests per transport")
+    parser.add_argument("--image-mb", type=float, default=2.0, help="size of the screenshot in MB")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests before each measurement")
+    parser.add_argument("--profile", default=None, help="server profile of config.yaml (default: the selected one)")
+    parser.add_argument("--output", type=Path, default=None, help="where to write the JSON results")
+    parser.add_argument("--role", choices=("backend", "proxy"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--backend-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "backend":
+        run_backend(args.port, int(args.image_mb * 2**20))
+        return
+    if args.role == "proxy":
+        run_proxy(args.port, args.backend_port, args.socket)
+        return
+    if os.name == "nt":
+        sys.exit("Unix domain sockets are not used on Windows")
+
+    profile_name, options = resolve_profile(args.profile)
+    results = run_all(args, options)
+    print_results(args, profile_name, options, results)
+
+    output = args.output or RESULTS_DIR / f"transport_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {"requests": args.requests, "images": args.images, "image_mb": args.image_mb,
+                     "profile": profile_name, "server": options, "cpus": os.cpu_count()},
+        "results": results,
+    }, indent=2))
+    print(f"\n💾 Results written to {output}")
+
+if __name__ == "__main__":
+    main()
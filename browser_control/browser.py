@@ -1,9 +1,22 @@
+import asyncio
+import os
+import time
+
+import psutil
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+from playwright.async_api import Error as PlaywrightError
 from models import SearchQuery
 import httpx
 import toml
+
+from voicecontrol_common import registration, tracing
+from voicecontrol_common.metrics import Counter, Gauge, Histogram, instrument
+from voicecontrol_common.tracing import current_request_id, span
+
+
 class BrowserWindowLimitReachedError(Exception):
     """Exception raised when the browser window limit is reached."""
 
@@ -17,19 +30,157 @@ APP.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(APP)
+tracing.instrument(APP, "browser")
+registration.instrument(APP, "browser", 8001)
 
 
 PLAYWRIGHT: Playwright | None = None
 BROWSER: Browser | None = None
 CONTEXT: BrowserContext | None = None
 
-SEARCH_URL = "https://www.bing.com/search?q="
-MAX_WINDOWS = 5
+# Load config
+config = toml.load("config.toml")
+
+HEADLESS = config["browser"].get("headless", True)
+# BROWSER_SEARCH_URL lets benchmarks point searches at a local fixture instead of Bing
+SEARCH_URL = os.getenv("BROWSER_SEARCH_URL", config["browser"].get("search_url", "https://www.bing.com/search?q="))
+MAX_WINDOWS = config["browser"].get("max_windows", 5)
+
+GOVERNOR_ENABLED = config["governor"].get("enabled", True)
+GOVERNOR_INTERVAL = config["governor"].get("interval", 30)
+CONTEXT_RSS_LIMIT = config["governor"].get("context_rss_mb", 1024) * 1024 * 1024
+BROWSER_RSS_LIMIT = config["governor"].get("browser_rss_mb", 2048) * 1024 * 1024
+GOVERNOR_MAX_BACKOFF = config["governor"].get("max_backoff", 600)
+
+# Serialises page access against the governor, so a recycle never happens mid-navigation.
+BROWSER_LOCK = asyncio.Lock()
+GOVERNOR_TASK: asyncio.Task | None = None
+NAVIGATION_SECONDS = Histogram("browser_navigation_seconds", "Time for Playwright to navigate to a page.")
+RESULTS_SECONDS = Histogram("browser_results_seconds", "Time to read the search results from a page.")
+BROWSER_RESTARTS = Counter("browser_restarts_total", "Recycles performed by the memory governor.", ("kind",))
+BROWSER_RSS_BYTES = Gauge("browser_rss_bytes", "RSS of the browser process tree at the last governor check.")
+GOVERNOR_STATS = {
+    "context_restarts": 0,
+    "browser_restarts": 0,
+    "last_restart": None,
+    "last_rss_bytes": 0,
+    "backoff_seconds": 0,
+}
 
 def logger_info(message:str):
     "Log message in a server."
     url = toml.load("log_config.toml")["url"]+"/log"
-    httpx.request(method="POST", url=url, json={"message":message})
+    httpx.request(method="POST", url=url, json={"message":message, "request_id":current_request_id()})
+
+
+def browser_rss() -> int:
+    """Return the summed RSS in bytes of the browser process tree.
+
+    Playwright spawns its node driver as our child and the browser below it, so every
+    descendant except the driver itself is counted.
+    """
+    total = 0
+    for child in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            if child.name().startswith("node"):
+                continue
+            total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    return total
+
+
+async def launch_browser() -> None:
+    """Launch Firefox and open a fresh browser context."""
+    global BROWSER, CONTEXT
+    BROWSER = await PLAYWRIGHT.firefox.launch(headless=HEADLESS)
+    CONTEXT = await BROWSER.new_context()
+
+
+async def recycle(relaunch: bool) -> list[str]:
+    """Throw away the context (and the browser if `relaunch`) and reopen the same pages.
+
+    A page whose URL fails to load again is left blank rather than failing the recycle.
+    Returns the URLs that failed, for the caller to log once BROWSER_LOCK is released.
+
+    Must be called with BROWSER_LOCK held.
+    """
+    global CONTEXT
+    urls = []
+    if CONTEXT is not None:
+        urls = [page.url for page in CONTEXT.pages]
+        try:
+            await CONTEXT.close()
+        except Exception:
+            # The browser may already be gone, in which case the context is too
+            pass
+
+    if relaunch:
+        if BROWSER is not None and BROWSER.is_connected():
+            await BROWSER.close()
+        await launch_browser()
+        GOVERNOR_STATS["browser_restarts"] += 1
+        BROWSER_RESTARTS.inc(kind="browser")
+    else:
+        CONTEXT = await BROWSER.new_context()
+        GOVERNOR_STATS["context_restarts"] += 1
+        BROWSER_RESTARTS.inc(kind="context")
+    GOVERNOR_STATS["last_restart"] = time.time()
+
+    # Rebuild the page pool so callers keep seeing the windows they opened
+    failed = []
+    for url in urls:
+        page = await CONTEXT.new_page()
+        if url and url != "about:blank":
+            try:
+                await page.goto(url)
+            except PlaywrightError:
+                failed.append(url)
+                await page.goto("about:blank")
+    return failed
+
+
+async def governor() -> None:
+    """Periodically check browser memory and recycle when a threshold is crossed.
+
+    Memory that a context recycle does not give back is held by the browser itself, so if
+    RSS is still above the context limit at the next check the browser is relaunched
+    instead. While RSS stays high, recycles back off exponentially up to `max_backoff`
+    seconds, so the user's pages are not reloaded every interval forever.
+    """
+    escalate = False  # The last recycle was a context recycle
+    backoff = 0
+    next_recycle = 0.0
+    while True:
+        await asyncio.sleep(GOVERNOR_INTERVAL)
+        try:
+            rss = await asyncio.to_thread(browser_rss)
+            GOVERNOR_STATS["last_rss_bytes"] = rss
+            BROWSER_RSS_BYTES.set(rss)
+            connected = BROWSER is not None and BROWSER.is_connected()
+            if rss < CONTEXT_RSS_LIMIT and connected:
+                escalate, backoff, next_recycle = False, 0, 0.0
+                GOVERNOR_STATS["backoff_seconds"] = 0
+                continue
+            if connected and time.monotonic() < next_recycle:
+                continue
+            relaunch = rss >= BROWSER_RSS_LIMIT or not connected or escalate
+            async with BROWSER_LOCK:
+                failed = await recycle(relaunch)
+            # Logged off the event loop and after the lock, so page requests never wait on the log server
+            await asyncio.to_thread(
+                logger_info, f"browser rss {rss // (1024 * 1024)}MB, recycled {'browser' if relaunch else 'context'}"
+            )
+            for url in failed:
+                await asyncio.to_thread(logger_info, f"could not reopen {url} after recycling, left it blank")
+            escalate = not relaunch
+            backoff = min(max(backoff * 2, GOVERNOR_INTERVAL), GOVERNOR_MAX_BACKOFF)
+            next_recycle = time.monotonic() + backoff
+            GOVERNOR_STATS["backoff_seconds"] = backoff
+        except Exception as e:
+            await asyncio.to_thread(logger_info, f"governor check failed: {e}")
+
 
 @APP.on_event("startup")
 async def startup() -> None:
@@ -38,23 +189,72 @@ async def startup() -> None:
     1. Launch async Playwright.
     2. Launch a Firefox browser (change to chromium or webkit if desired).
     3. Create a new browser context.
+    4. Start the memory governor.
     """
-    global PLAYWRIGHT, BROWSER, CONTEXT
+    global PLAYWRIGHT, GOVERNOR_TASK
     logger_info("starting browser")
     PLAYWRIGHT = await async_playwright().start()
-    # NOTE: set `headless=False` to see the browser window, or True to run in the background
-    BROWSER = await PLAYWRIGHT.firefox.launch(headless=False)
-    CONTEXT = await BROWSER.new_context()
+    # NOTE: set `headless = false` in config.toml to see the browser window
+    await launch_browser()
+    if GOVERNOR_ENABLED:
+        GOVERNOR_TASK = asyncio.create_task(governor())
 
 
 @APP.on_event("shutdown")
 async def shutdown() -> None:
-    """On application shutdown, close Playwright properly."""
+    """On application shutdown, stop the governor and close Playwright properly."""
+    if GOVERNOR_TASK:
+        GOVERNOR_TASK.cancel()
     if PLAYWRIGHT:
         logger_info("shutting down playwright")
         await PLAYWRIGHT.stop()
 
 
+def health_checks() -> dict[str, bool]:
+    """Return the state of the resources the browser service cannot work without."""
+    return {
+        "playwright_running": PLAYWRIGHT is not None,
+        "browser_connected": BROWSER is not None and BROWSER.is_connected(),
+    }
+
+
+@APP.get("/healthz")
+async def healthz() -> JSONResponse:
+    """Liveness probe: Playwright is running and Firefox is still connected."""
+    checks = health_checks()
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "unhealthy", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
+@APP.get("/readyz")
+async def readyz() -> JSONResponse:
+    """Readiness probe: healthy, and a browser context is open to serve pages."""
+    checks = {**health_checks(), "context_alive": CONTEXT is not None}
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "not ready", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
+@APP.get("/browser/status")
+async def status() -> dict:
+    """Report browser mode, memory usage and how often the governor has recycled it."""
+    rss = await asyncio.to_thread(browser_rss)
+    return {
+        "headless": HEADLESS,
+        "connected": BROWSER is not None and BROWSER.is_connected(),
+        "pages": len(CONTEXT.pages) if CONTEXT is not None else 0,
+        "rss_mb": round(rss / (1024 * 1024), 2),
+        "context_rss_limit_mb": CONTEXT_RSS_LIMIT // (1024 * 1024),
+        "browser_rss_limit_mb": BROWSER_RSS_LIMIT // (1024 * 1024),
+        **GOVERNOR_STATS,
+    }
+
+
 @APP.post("/browser/new_window_and_search")
 async def new_window_and_search(query: SearchQuery) -> dict:
     """Open a new window and perform a search."""
@@ -62,16 +262,11 @@ async def new_window_and_search(query: SearchQuery) -> dict:
     return await search(query)
 
 
-@APP.post("/browser/open_new_window")
-async def open_new_window() -> dict:
-    """Open a new window in the existing browser context.
+async def new_page() -> dict:
+    """Open a new page in the current context, respecting MAX_WINDOWS.
 
-    Limited to 5 pages by default.
+    Must be called with BROWSER_LOCK held.
     """
-    logger_info("opening new window")
-    if CONTEXT is None:
-        return {"response": "Browser context is not initialized."}
-
     try:
         if len(CONTEXT.pages) >= MAX_WINDOWS:
 
@@ -92,6 +287,20 @@ async def open_new_window() -> dict:
         return {"response": str(e)}
 
 
+@APP.post("/browser/open_new_window")
+async def open_new_window() -> dict:
+    """Open a new window in the existing browser context.
+
+    Limited to 5 pages by default.
+    """
+    logger_info("opening new window")
+    if CONTEXT is None:
+        return {"response": "Browser context is not initialized."}
+
+    async with BROWSER_LOCK:
+        return await new_page()
+
+
 @APP.post("/browser/search")
 async def search(query: SearchQuery) -> dict:
     """Perform a search on the most recently opened page.
@@ -107,14 +316,17 @@ async def search(query: SearchQuery) -> dict:
     if CONTEXT is None:
         return {"response": "Browser context is not initialized."}
 
-    if len(CONTEXT.pages) == 0:
-        # If no pages exist, open a new window automatically
-        await open_new_window()
-
-    # Get the last page in the context
-    page: Page = CONTEXT.pages[-1]
-    await page.goto(SEARCH_URL + query.query)
-    results = await page.locator("h2 a").all_text_contents()
+    async with BROWSER_LOCK:
+        if len(CONTEXT.pages) == 0:
+            # If no pages exist, open a new window automatically
+            await new_page()
+
+        # Get the last page in the context
+        page: Page = CONTEXT.pages[-1]
+        with NAVIGATION_SECONDS.time(), span("navigate"):
+            await page.goto(SEARCH_URL + query.query)
+        with RESULTS_SECONDS.time(), span("read results"):
+            results = await page.locator("h2 a").all_text_contents()
     return {"response": f"Searching for {query.query}. Top results are : {results[:5]}"}
 
 
@@ -125,10 +337,11 @@ async def close_current_window() -> dict:
     if CONTEXT is None:
         return {"response": "Browser context is not initialized."}
 
-    if len(CONTEXT.pages) == 0:
-        return {"response": "No open windows to close."}
+    async with BROWSER_LOCK:
+        if len(CONTEXT.pages) == 0:
+            return {"response": "No open windows to close."}
 
-    await CONTEXT.pages[-1].close()
+        await CONTEXT.pages[-1].close()
     return {"response": "Closed the current window."}
 
 
@@ -143,7 +356,15 @@ async def close_browser() -> dict:
         logger_info("the browser is not even initialized")
         return {"response": "Browser context is not initialized."}
 
-    for page in CONTEXT.pages:
-        await page.close()
+    async with BROWSER_LOCK:
+        for page in CONTEXT.pages:
+            await page.close()
     logger_info("closing browser")
     return {"response": "Closed all browser windows."}
+
+
+if __name__ == "__main__":
+    from voicecontrol_common.serving import serve, uvicorn_options
+
+    # Single process: there is one Playwright browser, driven from the plain asyncio loop
+    serve("__main__:APP", host="0.0.0.0", port=8001, **uvicorn_options(workers=1, loop="asyncio"))
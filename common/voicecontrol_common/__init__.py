@@ -0,0 +1 @@
+"""Modules every service uses: metrics, tracing, profiler, serving and registration."""
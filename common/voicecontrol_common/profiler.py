@@ -0,0 +1,70 @@
+"""Opt-in sampling profiler, switched on at runtime for a fixed window.
+
+While no profile is running nothing is installed, so leaving it compiled in costs
+nothing. While one is running a background thread snapshots every thread's stack at
+`interval` and counts identical stacks; the result is returned in the collapsed-stack
+format (`frame;frame;frame count` per line) that flamegraph.pl and speedscope read
+directly.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+MAX_SECONDS = 120
+MIN_INTERVAL = 0.001
+
+_running = threading.Lock()
+
+
+def _frame_name(frame) -> str:  # noqa: ANN001
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample(seconds: float, interval: float) -> Counter:
+    """Sample the stacks of all other threads for `seconds`, every `interval` seconds."""
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():  # noqa: SLF001 - no public equivalent
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapse(stacks: Counter) -> str:
+    """Render counted stacks in the collapsed format, most frequent first."""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+def instrument(app: FastAPI) -> None:
+    """Add POST /admin/profile?seconds=N&interval=S, returning a collapsed-stack profile."""
+
+    @app.post("/admin/profile", include_in_schema=False)
+    async def profile(seconds: float = 10, interval: float = 0.005) -> PlainTextResponse:
+        if not 0 < seconds <= MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_SECONDS}]")
+        interval = max(interval, MIN_INTERVAL)
+        if not _running.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A profile is already running.")
+        try:
+            # Sample from a worker thread, the event loop thread is then captured like any other
+            stacks = await asyncio.to_thread(sample, seconds, interval)
+        finally:
+            _running.release()
+        return PlainTextResponse(collapse(stacks))
@@ -0,0 +1,105 @@
+"""Registration of this service instance with the service registry.
+
+When `REGISTRY_URL` is set (the orchestrator sets it for every service it starts),
+`instrument(app, service, port)` registers the instance as `ADVERTISE_URL` (default:
+http://<this host's IP>:<port>) once its /readyz answers, sends a heartbeat with the
+number of requests in flight every few seconds, and deregisters on shutdown.
+Registration is best effort: a registry that is down never affects the service, the
+instance simply registers again once it is back.
+"""
+import contextlib
+import os
+import socket
+import threading
+
+import httpx
+from fastapi import FastAPI
+
+REGISTRY_URL = os.getenv("REGISTRY_URL")
+ADVERTISE_URL = os.getenv("ADVERTISE_URL")
+HEARTBEAT_SECONDS = 5
+
+# Probed/scraped every few seconds, they are not load
+UNCOUNTED_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+_stop = threading.Event()
+
+
+def local_url(port: int) -> str:
+    """http://<the IP other machines reach us on>:<port>."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            ip = s.getsockname()[0]
+    except OSError:
+        ip = "127.0.0.1"
+    return f"http://{ip}:{port}"
+
+
+class InFlightMiddleware:
+    """Plain ASGI middleware counting the requests being handled."""
+
+    in_flight = 0  # Of the whole process, only changed from the event loop
+
+    def __init__(self, app) -> None:  # noqa: ANN001
+        """Wrap the ASGI `app`."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:  # noqa: ANN001
+        """Handle the request with the wrapped app, counting it unless it is a probe."""
+        if scope["type"] != "http" or scope["path"] in UNCOUNTED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        InFlightMiddleware.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            InFlightMiddleware.in_flight -= 1
+
+
+def _heartbeat_forever(service: str, port: int) -> None:
+    url = ADVERTISE_URL or local_url(port)
+    instance_id = None
+    with httpx.Client(timeout=2) as client:
+        while True:
+            try:
+                if client.get(f"http://127.0.0.1:{port}/readyz").status_code != httpx.codes.OK:
+                    pass  # Not ready (yet, or any more): stop heartbeating and let the registry expire us
+                elif instance_id is None:
+                    resp = client.post(f"{REGISTRY_URL}/register", json={
+                        "service": service, "url": url, "outstanding": InFlightMiddleware.in_flight,
+                    })
+                    resp.raise_for_status()
+                    instance_id = resp.json()["id"]
+                else:
+                    resp = client.post(
+                        f"{REGISTRY_URL}/heartbeat/{instance_id}",
+                        json={"outstanding": InFlightMiddleware.in_flight},
+                    )
+                    if resp.status_code == httpx.codes.NOT_FOUND:  # Expired or the registry restarted
+                        instance_id = None
+                        continue
+            except (httpx.HTTPError, ValueError, KeyError):
+                pass
+            if _stop.wait(HEARTBEAT_SECONDS):
+                break
+        if instance_id is not None:
+            with contextlib.suppress(httpx.HTTPError):
+                client.delete(f"{REGISTRY_URL}/instances/{instance_id}")
+
+
+def instrument(app: FastAPI, service: str, port: int) -> None:
+    """Register `app` as an instance of `service` while it is running, if a registry is configured."""
+    if not REGISTRY_URL:
+        return
+    app.add_middleware(InFlightMiddleware)
+    worker = threading.Thread(target=_heartbeat_forever, args=(service, port), name="registration", daemon=True)
+
+    @app.on_event("startup")
+    def start_heartbeats() -> None:
+        worker.start()
+
+    @app.on_event("shutdown")
+    def deregister() -> None:
+        _stop.set()
+        worker.join(timeout=3)
@@ -0,0 +1,102 @@
+"""Uvicorn settings passed down by the orchestrator.
+
+The orchestrator resolves the server profile of config.yaml for every service and exports
+it as the `UVICORN_*` environment variables the uvicorn CLI understands. Services started
+with `uvicorn.run()` read them here; without them, uvicorn's defaults apply.
+
+Services run on the same host as their clients also listen on a Unix domain socket, which
+spares local calls the TCP/IP stack (see `serve()`).
+"""
+import os
+import socket
+from pathlib import Path
+
+INTEGERS = ("workers", "timeout_keep_alive", "backlog")
+STRINGS = ("loop", "http")
+BOOLEANS = ("access_log", "reload")
+
+
+def uvicorn_options(**overrides: object) -> dict:
+    """Keyword arguments for `uvicorn.run()` from the environment, with `overrides` on top."""
+    options = {}
+    for key in (*INTEGERS, *STRINGS, *BOOLEANS):
+        value = os.environ.get(f"UVICORN_{key.upper()}")
+        if value is None:
+            continue
+        if key in INTEGERS:
+            options[key] = int(value)
+        elif key in BOOLEANS:
+            options[key] = value.lower() in ("1", "true", "yes")
+        else:
+            options[key] = value
+    return options | overrides
+
+
+def unix_socket_path() -> str | None:
+    """Path of the Unix domain socket to listen on besides the TCP port, if any.
+
+    The orchestrator sets `SERVICE_SOCKET` (a path, or a `unix:` endpoint) for services it runs
+    on the same host as their clients. Windows' event loops cannot serve Unix sockets.
+    """
+    value = os.environ.get("SERVICE_SOCKET")
+    if not value or os.name == "nt":
+        return None
+    return value.removeprefix("unix:")
+
+
+def bind_unix_socket(path: str) -> socket.socket:
+    """Listen on `path`, replacing a socket file left behind by a previous run."""
+    Path(path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o600)  # Same user only, like the orchestrator that started us
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_tcp_socket(host: str, port: int) -> socket.socket:
+    """Listen on `host`:`port`.
+
+    Unlike uvicorn's `Config.bind_socket()`, the socket is created with `IPPROTO_TCP`: asyncio
+    only disables Nagle's algorithm on connections accepted from such sockets, and without
+    that every small response waits ~40 ms for the client's delayed ACK.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(app: object, host: str, port: int, **options: object) -> None:
+    """`uvicorn.run()`, also accepting connections on the Unix socket from `unix_socket_path()`."""
+    import uvicorn
+    from uvicorn.supervisors import ChangeReload, Multiprocess
+
+    config = uvicorn.Config(app, host=host, port=port, **options)
+    server = uvicorn.Server(config)
+    sockets = [bind_tcp_socket(host, port)]
+    path = unix_socket_path()
+    if path is not None:
+        sockets.append(bind_unix_socket(path))
+        inode = os.stat(path).st_ino
+    try:
+        if config.should_reload:
+            ChangeReload(config, target=server.run, sockets=sockets).run()
+        elif config.workers > 1:
+            try:
+                supervisor = Multiprocess(config, target=server.run, sockets=sockets)
+            except TypeError:  # Newer uvicorn versions create the worker servers themselves
+                supervisor = Multiprocess(config, sockets=sockets)
+            supervisor.run()
+        else:
+            server.run(sockets=sockets)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Unless a new instance (e.g. a promoted standby) has already replaced the socket
+        if path is not None and os.path.exists(path) and os.stat(path).st_ino == inode:
+            os.unlink(path)
@@ -0,0 +1,151 @@
+"""Request correlation IDs and timed spans, reported to the logging server.
+
+`instrument(app)` makes sure every request has an ID (taken from the X-Request-ID header
+or newly created), echoes it back and records a span for the whole request. Spans are
+sent to the logging server in batches from a background thread, so tracing never blocks
+a request.
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+import toml
+from fastapi import FastAPI
+
+from voicecontrol_common.metrics import Counter
+
+LOGGER = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REQUEST_ID: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Incoming IDs end up in log lines, only accept something that looks like an ID
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+# Probed/scraped every few seconds, tracing them would drown the real requests
+UNTRACED_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+# While the logging server is down spans pile up; past this many the oldest are dropped
+_MAX_QUEUED_SPANS = 10_000
+_SPANS: deque[dict] = deque(maxlen=_MAX_QUEUED_SPANS)
+_PENDING = threading.Event()
+_FLUSH_INTERVAL = 0.5
+DROPPED_SPANS = Counter(
+    "tracing_spans_dropped_total", "Spans dropped because the queue to the logging server was full.",
+)
+_SERVICE = "unknown"
+_worker: threading.Thread | None = None
+
+
+def current_request_id() -> str | None:
+    """Return the ID of the request being handled, if any."""
+    return REQUEST_ID.get()
+
+
+def record_span(name: str, start: float, duration: float) -> None:
+    """Queue a finished span (`start` is a time.time() timestamp, `duration` in seconds)."""
+    request_id = REQUEST_ID.get()
+    if request_id is None:
+        return
+    if len(_SPANS) == _MAX_QUEUED_SPANS:
+        DROPPED_SPANS.inc()
+    _SPANS.append({
+        "request_id": request_id,
+        "service": _SERVICE,
+        "name": name,
+        "start": start,
+        "duration_ms": duration * 1000,
+    })
+    _PENDING.set()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Record the `with` block as a span of the current request."""
+    start = time.time()
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, start, time.perf_counter() - begin)
+
+
+def _take_all() -> list[dict]:
+    batch = []
+    while True:
+        try:
+            batch.append(_SPANS.popleft())
+        except IndexError:
+            return batch
+
+
+def _flush_forever() -> None:
+    url = None
+    last_error = None
+    with httpx.Client(timeout=2) as client:
+        while True:
+            _PENDING.wait()
+            time.sleep(_FLUSH_INTERVAL)
+            _PENDING.clear()
+            batch = _take_all()
+            # Tracing is best effort: whatever goes wrong, drop the batch and keep the thread alive
+            try:
+                if url is None:
+                    url = toml.load("log_config.toml")["url"] + "/spans"
+                client.post(url, json={"spans": batch})
+                last_error = None
+            except Exception as e:  # noqa: BLE001
+                error = f"{type(e).__name__}: {e}"
+                if error != last_error:  # Once per outage, not every half second
+                    LOGGER.warning("Dropped %d spans, cannot send them to the logging server: %s", len(batch), error)
+                last_error = error
+
+
+class TracingMiddleware:
+    """Plain ASGI middleware assigning a request ID and recording a span per request."""
+
+    def __init__(self, app) -> None:  # noqa: ANN001
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:  # noqa: ANN001
+        if scope["type"] != "http" or scope["path"] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode()
+        incoming = next((value.decode() for key, value in scope["headers"] if key == header), None)
+        request_id = incoming if incoming and VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        token = REQUEST_ID.set(request_id)
+
+        async def send_wrapper(message) -> None:  # noqa: ANN001
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (header, request_id.encode())]
+            await send(message)
+
+        start = time.time()
+        begin = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            record_span(name, start, time.perf_counter() - begin)
+            REQUEST_ID.reset(token)
+
+
+def instrument(app: FastAPI, service: str) -> None:
+    """Trace every request of `app`, reporting spans under the given service name."""
+    global _SERVICE, _worker
+    _SERVICE = service
+    app.add_middleware(TracingMiddleware)
+    if _worker is None:
+        _worker = threading.Thread(target=_flush_forever, name="span-flusher", daemon=True)
+        _worker.start()
@@ -1,8 +1,10 @@
 # control.py
+import argparse
 import os
 import socket
 import subprocess
 import sys
+import tempfile
 import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
@@ -10,8 +12,30 @@ from pathlib import Path
 import psutil
 import yaml
 
+import daemon
+import dep_cache
+import output
+import resources
+import server_profile
+from scheduler import print_timeline, start_services
+from standby import WarmStandby
+from supervisor import Supervisor
+
 # Add a mapping from service -> path -> commands -> port -> config_key
 SERVICES = {
+    "registry": {
+        "path": "registry",
+        "commands": [
+            "uv sync",
+            "uv run registry.py",
+        ],
+        "port": 8010,
+        "depends_on": [],
+        "health": "/readyz",
+        "single_process": True,  # Instances are kept in memory
+        "keep_host": True,  # One registry for all machines, only filled in when missing
+        "config_key": "registry_service",
+    },
     "logger": {
         "path": "logging_server",
         "commands": [
@@ -19,6 +43,9 @@ SERVICES = {
             "uv run logger.py",
         ],
         "port": 8080,
+        "depends_on": [],
+        "health": "/readyz",
+        "single_process": True,  # Traces are kept in memory
         "config_key": "logger_service",
     },
     "browser": {
@@ -26,9 +53,12 @@ SERVICES = {
         "commands": [
             "uv sync",
             "uv run playwright install firefox",
-            "uv run uvicorn browser:APP --loop asyncio --host 0.0.0.0 --port 8001",
+            "uv run browser.py",
         ],
         "port": 8001,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "single_process": True,  # One Playwright browser
         "config_key": "browser_service",
     },
     "hardware": {
@@ -38,6 +68,9 @@ SERVICES = {
             "uv run hardware.py",
         ],
         "port": 8003,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "single_process": True,  # One camera
         "config_key": "hardware_service",
     },
     "transcriber": {
@@ -47,7 +80,11 @@ SERVICES = {
             "uv run transcriber.py",
         ],
         "port": 8005,
-        "config_key": None,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "standby": True,  # Keep a spare with the model loaded for fast restarts
+        "single_process": True,  # The inference pool already uses every core
+        "config_key": "transcriber_service",
     },
     "aggregator": {
         "path": "Application",
@@ -56,6 +93,9 @@ SERVICES = {
             "uv run aggregator.py",
         ],
         "port": 8000,
+        "depends_on": ["logger", "registry", "browser", "hardware"],
+        "health": "/readyz",
+        "single_process": True,  # Metrics, balancer load and the registry heartbeat are per process
         "config_key": "aggregator_service",
     },
 }
@@ -70,8 +110,12 @@ LOG_CONFIG_PATHS = {
 }
 
 processes = {}
+standbys: dict[str, WarmStandby] = {}
+outputs: dict[str, output.OutputBuffer] = {}  # Captured stdout/stderr per service, kept across restarts
 executor = ThreadPoolExecutor(max_workers=4)
 local_ip = ""
+supervisor: Supervisor | None = None
+force_sync = False  # Set by --force-sync to ignore the dependency fingerprint cache
 
 
 def get_local_ip() -> str:
@@ -106,9 +150,17 @@ def update_config() -> None:
         if key:  # Only update if there's a config_key defined
             if key not in config:
                 config[key] = {}
-            config[key]["host"] = local_ip
+            if service.get("keep_host"):
+                config[key].setdefault("host", local_ip)
+            else:
+                config[key]["host"] = local_ip
             # Keep existing port if present, else set to default
             config[key].setdefault("port", service["port"])
+            # Clients on this host reach the service through its Unix socket instead of TCP
+            if os.name != "nt" and config[key]["host"] == local_ip:
+                config[key].setdefault("endpoint", f"unix:{socket_path(service_key)}")
+            else:
+                config[key].pop("endpoint", None)
 
     # Write back to config.yaml
     with open(config_path, "w") as f:
@@ -152,6 +204,109 @@ def update_log_configs_with_logger_url() -> None:
                 fp.writelines(new_lines)
 
 
+OUTPUT_TAIL = 3  # Lines of output per service shown by "List Running Services"
+
+LONG_RUNNING = ["uvicorn", "browser.py", "hardware.py", "transcriber.py", "aggregator.py", "logger.py", "registry.py"]
+
+
+def is_long_running(cmd: str) -> bool:
+    """Return True if the command starts the service itself rather than a setup step."""
+    return any(x in cmd for x in LONG_RUNNING)
+
+
+def prepare_service(service_name: str) -> None:
+    """Run the blocking setup commands of a service (e.g. 'uv sync') in its directory.
+
+    A command is skipped when the service's dependency fingerprint (pyproject.toml, uv.lock,
+    installed browsers, ...) matches the one recorded after its last successful run,
+    unless --force-sync was given.
+    """
+    service = SERVICES[service_name]
+    for cmd in service["commands"]:
+        if is_long_running(cmd):
+            continue
+        key = f"{service_name}:{cmd}"
+        if not force_sync and dep_cache.is_fresh(key, dep_cache.fingerprint(service["path"], cmd)):
+            print(f"⏭️  {service_name}: '{cmd}' is up to date, skipping")
+            continue
+        subprocess.run(cmd, shell=True, check=True, cwd=service["path"])
+        dep_cache.store(key, dep_cache.fingerprint(service["path"], cmd))
+
+
+def registry_url() -> str:
+    """URL of the service registry, from config.yaml (it may run on another machine)."""
+    config_path = Path("config.yaml")
+    config = (yaml.safe_load(config_path.read_text()) or {}) if config_path.exists() else {}
+    registry = config.get("registry_service") or {}
+    return f"http://{registry.get('host', local_ip)}:{registry.get('port', SERVICES['registry']['port'])}"
+
+
+def socket_path(service_name: str) -> Path:
+    """Default Unix socket of a service run on this host. Kept short: socket paths are limited to ~100 bytes."""
+    return Path(tempfile.gettempdir()) / f"voicecontrol-{os.getuid()}" / f"{service_name}.sock"
+
+
+def service_socket(service_name: str) -> str | None:
+    """Unix socket a service listens on besides its port: the `unix:` endpoint of its config.yaml
+    entry, or the default one for services without an entry. None on Windows.
+    """
+    if os.name == "nt":
+        return None
+    key = SERVICES[service_name]["config_key"]
+    if key is None:
+        return str(socket_path(service_name))
+    config_path = Path("config.yaml")
+    config = (yaml.safe_load(config_path.read_text()) or {}) if config_path.exists() else {}
+    endpoint = str((config.get(key) or {}).get("endpoint") or "")
+    return endpoint.removeprefix("unix:") if endpoint.startswith("unix:") else None
+
+
+def service_env(service_name: str) -> dict[str, str]:
+    """Environment of a service process: ours, the uvicorn settings of the server profile,
+    where to register the service so that clients can find it and the Unix socket to listen on.
+    """
+    service = SERVICES[service_name]
+    cpus = (resources.load().get(service_name) or {}).get("cpus")
+    cores = len(resources.parse_cpus(cpus)) if cpus is not None else None
+    options = server_profile.resolve(server_profile.load(), service.get("single_process", False), cores)
+    env = os.environ | server_profile.environment(options) | {
+        "REGISTRY_URL": registry_url(),
+        "ADVERTISE_URL": f"http://{local_ip}:{service['port']}",
+    }
+    unix_socket = service_socket(service_name)
+    if unix_socket:
+        env["SERVICE_SOCKET"] = unix_socket
+    return env
+
+
+def service_output(service_name: str) -> output.OutputBuffer:
+    """The buffer capturing a service's output, created on first use."""
+    if service_name not in outputs:
+        outputs[service_name] = output.OutputBuffer(service_name, output.load_settings())
+    return outputs[service_name]
+
+
+def launch_service(service_name: str) -> None:
+    """Start the long-running command of a service via Popen (in the background)."""
+    service = SERVICES[service_name]
+    for cmd in service["commands"]:
+        if is_long_running(cmd):
+            if promote_standby(service_name, cmd):
+                continue
+            process = subprocess.Popen(
+                policy_command(service_name, cmd),
+                shell=True,
+                cwd=service["path"],
+                env=service_env(service_name),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            service_output(service_name).follow(process.stdout, process.pid)
+            processes[service_name] = process.pid
+            if os.name == "nt":
+                apply_resource_policy(service_name, process.pid)
+
+
 def run_service(service_name: str) -> None:
     """Run the service by executing each command in the service's 'commands' list.
 
@@ -159,46 +314,96 @@ def run_service(service_name: str) -> None:
     it will be started via Popen (in the background).
     Otherwise, it will be run via subprocess.run() (blocking).
     """
+    prepare_service(service_name)
+    launch_service(service_name)
+
+
+def stop_service(service_name: str) -> bool:
+    """Stops the service with SIGTERM (SIGKILL if it does not exit in time), children included."""
+    # Forget the PID first, so the supervisor does not restart the service as it exits
+    pid = processes.pop(service_name, None)
+    if pid is None:
+        return False
+    try:
+        daemon.terminate_tree(pid)
+        return True
+    except Exception:
+        return False
+
+
+def promote_standby(service_name: str, cmd: str) -> bool:
+    """Hand the service over to its warm standby, if it has one, and spawn a new spare.
+
+    Returns True if a standby was promoted, i.e. the service is already starting.
+    """
     service = SERVICES[service_name]
-    original_dir = os.getcwd()
+    if not service.get("standby"):
+        return False
+    if service_name not in standbys:
+        env, captured = service_env(service_name), service_output(service_name)
+        # The spare loads its model right away, keep it off the interactive services' cores too
+        standbys[service_name] = WarmStandby(policy_command(service_name, cmd), service["path"], env, captured)
+    standby = standbys[service_name]
+    pid = standby.promote()
+    if pid is not None:
+        processes[service_name] = pid
+    standby.spawn()
+    if standby.alive() and os.name == "nt":
+        apply_resource_policy(service_name, standby.process.pid)
+    return pid is not None
+
+
+def policy_command(service_name: str, cmd: str) -> str:
+    """`cmd`, started so that the service applies the resource policy of config.yaml to itself before it runs."""
+    if not resources.load().get(service_name):
+        return cmd
+    return resources.launch_command(service_name, cmd)
+
+
+def apply_resource_policy(service_name: str, pid: int) -> None:
+    """Apply the CPU affinity, priority and cgroup limits of config.yaml to a running service's processes.
+
+    Only needed on Windows, elsewhere policy_command() has the service apply them itself.
+    """
+    policy = resources.load().get(service_name)
+    if not policy:
+        return
+    for problem in resources.apply(service_name, pid, policy):
+        print(f"⚠️  {service_name}: {problem}")
+
+
+def stop_standbys() -> None:
+    """Kill all warm standby processes."""
+    for standby in standbys.values():
+        standby.stop()
+
 
+def is_running(service_name: str) -> bool:
+    """Return True if the process we started for the service still exists and is not a zombie."""
+    pid = processes.get(service_name)
+    if pid is None:
+        return False
     try:
-        os.chdir(service["path"])
-        for cmd in service["commands"]:
-            # Check if this command should be run in the background
-            if any(x in cmd for x in ["uvicorn", "hardware.py", "transcriber.py", "aggregator.py", "logger.py"]):
-                process = subprocess.Popen(
-                    cmd,
-                    shell=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-                processes[service_name] = process.pid
-            else:
-                # Blocking command, e.g. 'uv sync'
-                subprocess.run(cmd, shell=True, check=True)
-    finally:
-        os.chdir(original_dir)
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
 
 
-def stop_service(service_name: str) -> bool:
-    """Stops the service by killing its subprocess and any children."""
-    if service_name in processes:
-        try:
-            pid = processes[service_name]
-            parent = psutil.Process(pid)
-            for child in parent.children(recursive=True):
-                child.kill()
-            parent.kill()
-            del processes[service_name]
-            return True
-        except Exception:
-            return False
-    return False
-
-
-def get_service_status() -> dict[str, dict[str, bool | str | int]]:
-    """Return a dict with running status, host, port, and PID for each service."""
+def restart_service(service_name: str) -> None:
+    """Stop a service (if it is still around) and start it again."""
+    stop_service(service_name)
+    run_service(service_name)
+
+
+def start_supervisor() -> None:
+    """Start the watchdog that restarts services we launched when they stop being healthy."""
+    global supervisor
+    supervisor = Supervisor(SERVICES, restart_service, local_ip, watched=lambda: list(processes), alive=is_running)
+    supervisor.start()
+
+
+def get_service_status() -> dict[str, dict[str, bool | str | int | float]]:
+    """Return a dict with running status, host, port, PID, CPU and memory use for each service."""
     status = {}
     for service_name, data in SERVICES.items():
         pid = processes.get(service_name)
@@ -209,31 +414,57 @@ def get_service_status() -> dict[str, dict[str, bool | str | int]]:
                 running = True
             except psutil.NoSuchProcess:
                 del processes[service_name]
+        cpu_percent, rss_mb = resources.usage(pid) if running else (0.0, 0.0)
         status[service_name] = {
             "running": running,
             "host": local_ip,
             "port": data["port"],
             "pid": pid,
+            "cpu_percent": cpu_percent,  # Of one core, summed over the service's processes
+            "rss_mb": rss_mb,
         }
     return status
 
 
-def print_status() -> None:
-    """Pretty-print the status of all services."""
-    status = get_service_status()
+def print_status(status: dict | None = None, history: list | None = None, recent: dict | None = None) -> None:
+    """Pretty-print the status of all services (ours, or the ones reported by a daemon)
+    and the last lines of their output.
+    """
+    status = get_service_status() if status is None else status
+    if recent is None:
+        recent = {name: buffer.tail(OUTPUT_TAIL) for name, buffer in outputs.items()}
     print("\n📡 Service Status:")
-    print(f"{'Service':<12} | {'Status':<8} | {'Endpoint':<25} | PID")
-    print("-" * 50)
+    print(f"{'Service':<12} | {'Status':<8} | {'Endpoint':<25} | {'PID':<8} | {'CPU %':>6} | {'RSS MB':>8}")
+    print("-" * 82)
     for name, info in status.items():
         state = "🟢 RUNNING" if info["running"] else "🔴 STOPPED"
         endpoint = f"http://{info['host']}:{info['port']}"
-        print(f"{name:<12} | {state:<8} | {endpoint:<25} | {info['pid'] or 'N/A'}")
+        print(f"{name:<12} | {state:<8} | {endpoint:<25} | {info['pid'] or 'N/A':<8} | "
+              f"{info.get('cpu_percent', 0):>6.1f} | {info.get('rss_mb', 0):>8.1f}")
+    for name, lines in recent.items():
+        if name in status and lines:
+            print(f"\n📜 {name} output:")
+            for line in lines:
+                print(f"   {line}")
+    print_restart_history(history)
+
+
+def print_restart_history(history: list | None = None) -> None:
+    """Pretty-print the restarts performed by the supervisor."""
+    if history is None:
+        history = supervisor.history if supervisor is not None else []
+    if not history:
+        return
+    print("\n♻️  Restart History:")
+    for record in history:
+        print(f"{record['time']} | {record['service']:<12} | attempt {record['attempt']} | "
+              f"{record['reason']} | {record['result']}")
 
 
 def show_menu() -> None:
     """Display the menu of control options."""
     print("\n🔧 Control Panel 🔧")
-    print("1. Validate (Start) All Services Sequentially")
+    print("1. Validate (Start) All Services")
     print("2. Stop All Services")
     print("3. List Running Services")
     # Start service options
@@ -270,6 +501,7 @@ def handle_choice(choice: str) -> None:
         # Exiting
         elif choice_int == (4 + len(SERVICES) * 2):
             print("👋 Exiting...")
+            stop_standbys()
             sys.exit(0)
         else:
             print("❌ Invalid choice")
@@ -278,25 +510,13 @@ def handle_choice(choice: str) -> None:
 
 
 def start_all_services() -> None:
-    """Start all services *one by one*, in a specific order,
+    """Start all services, each as soon as its dependencies are ready,
     ensuring logger runs first.
     """
-    print("\n🚀 Starting all services in sequence...")
+    print("\n🚀 Starting all services...")
     update_log_configs_with_logger_url()
-    # 1) Start logger first
-    print("Starting Logger service first...")
-    run_service("logger")
-    print("Waiting a few seconds for the logger to fully start...")
-    time.sleep(5)
-
-    # 2) Then start the rest in your desired order
-    service_order = ["browser", "hardware", "transcriber", "aggregator"]
-    for svc in service_order:
-        print(f"Starting {svc.capitalize()} service...")
-        run_service(svc)
-        print("Waiting a few seconds for the service to fully start...")
-        time.sleep(5)
-
+    timeline = start_services(SERVICES, prepare_service, launch_service, local_ip)
+    print_timeline(timeline)
     print("✅ All services have been started. Use option 3 to check status.")
 
 
@@ -305,6 +525,7 @@ def stop_all_services() -> None:
     print("\n🛑 Stopping all services...")
     for svc in list(processes.keys()):
         stop_service(svc)
+    stop_standbys()
     print("✅ All services have been stopped. Use option 3 to check status.")
 
 
@@ -324,6 +545,9 @@ def main() -> None:
     # 1) Update config.yaml with local IP
     update_config()
 
+    # 2) Watch the services we start and restart them if they become unhealthy
+    start_supervisor()
+
     while True:
         show_menu()
         try:
@@ -337,7 +561,58 @@ def main() -> None:
         input("\nPress Enter to continue...")
 
 
+def run_command(command: str, service: str | None, port: int, lines: int = 0) -> None:
+    """Drive a running `initialisation.py --daemon` through its control API."""
+    try:
+        if command == "status":
+            body = daemon.request("GET", f"/status?lines={lines}", port)
+            services = body["services"]
+            if service:
+                services = {service: services[service]}
+            print_status(services, body["restarts"], body.get("output", {}))
+            return
+        body = daemon.request("POST", f"/{command}/{service}" if service else f"/{command}", port)
+    except ConnectionError as e:
+        sys.exit(f"❌ {e}")
+    if "error" in body:
+        sys.exit(f"❌ {body['error']}")
+    print(f"✅ {command} {body['service']}: done")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line options of the orchestrator."""
+    parser = argparse.ArgumentParser(
+        description="Voice Control service orchestrator. Without a command, opens the interactive menu; "
+        "with one, controls a running `initialisation.py --daemon`.",
+    )
+    parser.add_argument(
+        "--force-sync",
+        action="store_true",
+        help="run 'uv sync' and 'playwright install' even if the dependency fingerprints are unchanged",
+    )
+    parser.add_argument(
+        "--control-port",
+        type=int,
+        default=daemon.CONTROL_PORT,
+        help=f"port of the daemon's control API (default: {daemon.CONTROL_PORT})",
+    )
+    commands = parser.add_subparsers(dest="command")
+    status = commands.add_parser("status", help="show the services of the daemon")
+    status.add_argument("service", nargs="?", choices=list(SERVICES), help="only show this service")
+    status.add_argument("-n", "--lines", type=int, default=0, help="also show the last LINES lines of output")
+    for command in ("start", "stop"):
+        sub = commands.add_parser(command, help=f"{command} one service, or all of them")
+        sub.add_argument("service", nargs="?", choices=list(SERVICES))
+    commands.add_parser("restart", help="restart one service").add_argument("service", choices=list(SERVICES))
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.command:
+        run_command(args.command, getattr(args, "service", None), args.control_port, getattr(args, "lines", 0))
+        sys.exit(0)
+    force_sync = args.force_sync
     try:
         main()
     except KeyboardInterrupt:
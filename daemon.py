@@ -0,0 +1,177 @@
+# daemon.py
+"""Daemon mode for the orchestrators: block on signals and expose a local control API.
+
+Instead of keeping the process alive with a busy loop, the orchestrator sleeps in
+`wait_for_signals` until SIGTERM/SIGINT arrives, waking up only when a child process
+exits. Meanwhile `ControlAPI` answers start/stop/restart/status requests on a local
+HTTP port, which is what `control.py status|start|stop|restart` talks to.
+"""
+import contextlib
+import json
+import os
+import signal
+import socket
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import psutil
+
+CONTROL_HOST = "127.0.0.1"  # Never exposed beyond this machine
+CONTROL_PORT = 8090
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+def wait_for_signals(on_child_exit: Callable[[], None]) -> int:
+    """Block until SIGINT or SIGTERM and return it, calling `on_child_exit` on every SIGCHLD.
+
+    Must be called from the main thread. Signals are delivered through a socket pair
+    (`signal.set_wakeup_fd`), so the process sleeps in `recv` and uses no CPU while idle.
+    """
+    receiver, sender = socket.socketpair()
+    sender.setblocking(False)  # noqa: FBT003 - socket API
+    signal.set_wakeup_fd(sender.fileno())
+    watched = [*STOP_SIGNALS]
+    if hasattr(signal, "SIGCHLD"):  # Not on Windows
+        watched.append(signal.SIGCHLD)
+    previous = {signum: signal.signal(signum, lambda *_: None) for signum in watched}
+    try:
+        while True:
+            for signum in receiver.recv(64):
+                if signum in STOP_SIGNALS:
+                    return signum
+                on_child_exit()
+    finally:
+        signal.set_wakeup_fd(-1)
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        receiver.close()
+        sender.close()
+
+
+def reap(pids: list[int]) -> list[int]:
+    """Collect the exit status of whichever of our child processes `pids` have exited.
+
+    Only the given PIDs are waited for: `waitpid(-1)` would also steal the exit status of
+    the `subprocess.run` calls the orchestrator is making from other threads.
+    """
+    exited = []
+    for pid in pids:
+        try:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:  # Not our child (e.g. a promoted standby) or already reaped
+            continue
+        if done:
+            exited.append(pid)
+    return exited
+
+
+def terminate_tree(pid: int, timeout: float = 10) -> None:
+    """Ask a process and its children to exit (SIGTERM), killing whatever is left after `timeout`."""
+    try:
+        parent = psutil.Process(pid)
+        family = [*parent.children(recursive=True), parent]
+    except psutil.NoSuchProcess:
+        return
+    for process in family:
+        with contextlib.suppress(psutil.NoSuchProcess):
+            process.terminate()
+    _, alive = psutil.wait_procs(family, timeout=timeout)
+    for process in alive:
+        with contextlib.suppress(psutil.NoSuchProcess):
+            process.kill()
+
+
+class ControlAPI(ThreadingHTTPServer):
+    """Local HTTP API driving the orchestrator.
+
+    GET  /status[?lines=N]    -> actions["status"](N), N lines of output per service
+    POST /start[/<service>]   -> actions["start"](service or None for all)
+    POST /stop[/<service>]    -> actions["stop"](service or None for all)
+    POST /restart/<service>   -> actions["restart"](service)
+
+    Every action returns a JSON-serialisable value; unknown services get a 404.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, actions: dict[str, Callable], services: list[str], port: int = CONTROL_PORT) -> None:
+        """Listen on `port` of the loopback interface, for the given `services` only."""
+        self.actions = actions
+        self.services = services
+        super().__init__((CONTROL_HOST, port), ControlHandler)
+
+    def start(self) -> None:
+        """Serve requests from a background thread."""
+        threading.Thread(target=self.serve_forever, name="control-api", daemon=True).start()
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """One request to the control API, answered in JSON."""
+
+    server: ControlAPI
+
+    def _reply(self, status: int, body: object) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        """GET /status?lines=N: the status of every service."""
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/status":
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            lines = int(parse_qs(url.query).get("lines", ["0"])[0])
+        except ValueError:
+            self._reply(400, {"error": "lines must be an integer"})
+            return
+        self._reply(200, self.server.actions["status"](lines))
+
+    def do_POST(self) -> None:
+        """POST /<action>[/<service>]: start, stop or restart one service or all of them."""
+        action, _, service = self.path.strip("/").partition("/")
+        if action not in ("start", "stop", "restart"):
+            self._reply(404, {"error": f"unknown action {action!r}"})
+            return
+        if service and service not in self.server.services:
+            self._reply(404, {"error": f"unknown service {service!r}"})
+            return
+        if action == "restart" and not service:
+            self._reply(400, {"error": "restart needs a service name"})
+            return
+        try:
+            result = self.server.actions[action](service or None)
+        except Exception as e:  # noqa: BLE001 - whatever went wrong is reported to the caller
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"ok": True, "action": action, "service": service or "all", "result": result})
+
+    def log_message(self, *args: object) -> None:
+        """Stay quiet, the orchestrator's terminal is for service output."""
+
+
+def request(method: str, path: str, port: int = CONTROL_PORT, timeout: float = 600) -> dict:
+    """Call the control API of a running orchestrator (used by `control.py <command>`).
+
+    Raises:
+        ConnectionError: If no orchestrator is listening on `port`.
+
+    """
+    req = urllib.request.Request(f"http://{CONTROL_HOST}:{port}{path}", method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:  # noqa: S310 - always http://127.0.0.1
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}") | {"status": e.code}
+    except (urllib.error.URLError, OSError) as e:
+        msg = f"No orchestrator is listening on {CONTROL_HOST}:{port} ({e})"
+        raise ConnectionError(msg) from e
@@ -0,0 +1,76 @@
+# dep_cache.py
+"""Fingerprint cache that lets the orchestrator skip `uv sync` / `playwright install` when nothing changed."""
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+CACHE_PATH = Path(".voicecontrol/dep_cache.json")
+
+# Files whose content decides whether a service's environment is up to date
+DEPENDENCY_FILES = ["pyproject.toml", "uv.lock", ".python-version"]
+# Every service installs the shared modules by path, their dependencies are the services' too
+SHARED_DEPENDENCY_FILES = [Path(__file__).resolve().parent / "common" / "pyproject.toml"]
+
+_lock = threading.Lock()
+
+
+def playwright_browsers_dir() -> Path:
+    """Return the directory Playwright installs its browser binaries into."""
+    if os.getenv("PLAYWRIGHT_BROWSERS_PATH"):
+        return Path(os.environ["PLAYWRIGHT_BROWSERS_PATH"])
+    if os.name == "nt":
+        return Path(os.getenv("LOCALAPPDATA", Path.home() / "AppData" / "Local")) / "ms-playwright"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "ms-playwright"
+    return Path.home() / ".cache" / "ms-playwright"
+
+
+def fingerprint(service_path: str, cmd: str) -> str:
+    """Hash everything that can make `cmd` do something different in `service_path`.
+
+    That is the command itself, the service's dependency files and those of the shared
+    modules, whether its virtual environment exists and, for Playwright installs, which
+    browser builds are installed.
+    """
+    digest = hashlib.sha256(cmd.encode())
+    base = Path(service_path)
+    files = [(name, base / name) for name in DEPENDENCY_FILES]
+    files += [(str(path), path) for path in SHARED_DEPENDENCY_FILES]
+    for name, path in files:
+        digest.update(name.encode())
+        digest.update(path.read_bytes() if path.exists() else b"<missing>")
+
+    digest.update(b"venv" if (base / ".venv" / "pyvenv.cfg").exists() else b"<no venv>")
+
+    if "playwright install" in cmd:
+        browsers = playwright_browsers_dir()
+        installed = sorted(p.name for p in browsers.iterdir() if p.is_dir()) if browsers.exists() else []
+        digest.update("\n".join(installed).encode())
+    return digest.hexdigest()
+
+
+def _load() -> dict[str, str]:
+    if not CACHE_PATH.exists():
+        return {}
+    try:
+        return json.loads(CACHE_PATH.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def is_fresh(key: str, current: str) -> bool:
+    """Return True if `current` matches the fingerprint stored for `key` by a previous run."""
+    with _lock:
+        return _load().get(key) == current
+
+
+def store(key: str, current: str) -> None:
+    """Remember `current` as the fingerprint of a successful run of `key`."""
+    with _lock:
+        cache = _load()
+        cache[key] = current
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        CACHE_PATH.write_text(json.dumps(cache, indent=2))
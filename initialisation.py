@@ -1,8 +1,11 @@
 # control.py
+import argparse
 import os
+import signal
 import socket
 import subprocess
 import sys
+import tempfile
 import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
@@ -10,7 +13,29 @@ from pathlib import Path
 import psutil
 import yaml
 
+import daemon
+import dep_cache
+import output
+import resources
+import server_profile
+from scheduler import is_ready, print_timeline, start_services
+from standby import WarmStandby
+from supervisor import Supervisor
+
 SERVICES = {
+    "registry": {
+        "path": "registry",
+        "commands": [
+            "uv sync",
+            "uv run registry.py",
+        ],
+        "port": 8010,
+        "depends_on": [],
+        "health": "/readyz",
+        "single_process": True,  # Instances are kept in memory
+        "keep_host": True,  # One registry for all machines, only filled in when missing
+        "config_key": "registry_service",
+    },
     "logger": {
         "path": "logging_server",
         "commands": [
@@ -18,6 +43,9 @@ SERVICES = {
             "uv run logger.py",
         ],
         "port": 8080,
+        "depends_on": [],
+        "health": "/readyz",
+        "single_process": True,  # Traces are kept in memory
         "config_key": "logger_service",
     },
     "browser": {
@@ -25,9 +53,12 @@ SERVICES = {
         "commands": [
             "uv sync",
             "uv run playwright install firefox",
-            "uv run uvicorn browser:APP --loop asyncio --host 0.0.0.0 --port 8001",
+            "uv run browser.py",
         ],
         "port": 8001,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "single_process": True,  # One Playwright browser
         "config_key": "browser_service",
     },
     "hardware": {
@@ -37,6 +68,9 @@ SERVICES = {
             "uv run hardware.py",
         ],
         "port": 8003,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "single_process": True,  # One camera
         "config_key": "hardware_service",
     },
     "transcriber": {
@@ -46,7 +80,11 @@ SERVICES = {
             "uv run transcriber.py",
         ],
         "port": 8005,
-        "config_key": None,
+        "depends_on": ["logger"],
+        "health": "/readyz",
+        "standby": True,  # Keep a spare with the model loaded for fast restarts
+        "single_process": True,  # The inference pool already uses every core
+        "config_key": "transcriber_service",
     },
     "aggregator": {
         "path": "Application",
@@ -55,6 +93,9 @@ SERVICES = {
             "uv run aggregator.py",
         ],
         "port": 8000,
+        "depends_on": ["logger", "registry", "browser", "hardware"],
+        "health": "/readyz",
+        "single_process": True,  # Metrics, balancer load and the registry heartbeat are per process
         "config_key": "aggregator_service",
     },
 }
@@ -69,8 +110,13 @@ LOG_CONFIG_PATHS = {
 }
 
 processes = {}
+standbys: dict[str, WarmStandby] = {}
+outputs: dict[str, output.OutputBuffer] = {}  # Captured stdout/stderr per service, kept across restarts
 executor = ThreadPoolExecutor(max_workers=4)
 local_ip = ""
+supervisor: Supervisor | None = None
+force_sync = False  # Set by --force-sync to ignore the dependency fingerprint cache
+headless = False  # Set by --daemon to run services in the background instead of terminal windows
 
 
 def get_local_ip() -> str:
@@ -106,7 +152,15 @@ def update_config() -> None:
             # If the config key doesn't exist at all, we might initialize it.
             if cfg_key not in config:
                 config[cfg_key] = {"port": svc_data["port"]}
-            config[cfg_key]["host"] = local_ip
+            if svc_data.get("keep_host"):
+                config[cfg_key].setdefault("host", local_ip)
+            else:
+                config[cfg_key]["host"] = local_ip
+            # Clients on this host reach the service through its Unix socket instead of TCP
+            if os.name != "nt" and config[cfg_key]["host"] == local_ip:
+                config[cfg_key].setdefault("endpoint", f"unix:{socket_path(service_name)}")
+            else:
+                config[cfg_key].pop("endpoint", None)
 
     with open(config_path, "w") as f:
         yaml.dump(config, f)
@@ -147,65 +201,292 @@ def update_log_configs_with_logger_url() -> None:
             with open(path_obj, "w") as fp:
                 fp.writelines(new_lines)
 
-def run_service(service_name: str) -> None:
-    """Run the service by executing each command in the service's 'commands' list
-    inside a new terminal window (foreground) if it matches the usual 'long-running'
-    commands (logger.py, uvicorn, hardware.py, etc.). Otherwise, run synchronously.
+LONG_RUNNING = ["logger.py", "uvicorn", "browser.py", "hardware.py", "transcriber.py", "aggregator.py", "registry.py"]
+
+
+def is_long_running(cmd: str) -> bool:
+    """Return True if the command starts the service itself rather than a setup step."""
+    return any(x in cmd for x in LONG_RUNNING)
+
+
+def prepare_service(service_name: str) -> None:
+    """Run the short/one-shot commands of a service (e.g. 'uv sync') in its directory.
+
+    A command is skipped when the service's dependency fingerprint (pyproject.toml, uv.lock,
+    installed browsers, ...) matches the one recorded after its last successful run,
+    unless --force-sync was given.
+    """
+    service = SERVICES[service_name]
+    for cmd in service["commands"]:
+        if is_long_running(cmd):
+            continue
+        key = f"{service_name}:{cmd}"
+        if not force_sync and dep_cache.is_fresh(key, dep_cache.fingerprint(service["path"], cmd)):
+            print(f"⏭️  {service_name}: '{cmd}' is up to date, skipping")
+            continue
+        subprocess.run(cmd, shell=True, check=True, cwd=service["path"])
+        dep_cache.store(key, dep_cache.fingerprint(service["path"], cmd))
+
+
+def registry_url() -> str:
+    """URL of the service registry, from config.yaml (it may run on another machine)."""
+    config_path = Path("config.yaml")
+    config = (yaml.safe_load(config_path.read_text()) or {}) if config_path.exists() else {}
+    registry = config.get("registry_service") or {}
+    return f"http://{registry.get('host', local_ip)}:{registry.get('port', SERVICES['registry']['port'])}"
+
+
+def socket_path(service_name: str) -> Path:
+    """Default Unix socket of a service run on this host. Kept short: socket paths are limited to ~100 bytes."""
+    return Path(tempfile.gettempdir()) / f"voicecontrol-{os.getuid()}" / f"{service_name}.sock"
+
+
+def service_socket(service_name: str) -> str | None:
+    """Unix socket a service listens on besides its port: the `unix:` endpoint of its config.yaml
+    entry, or the default one for services without an entry. None on Windows.
+    """
+    if os.name == "nt":
+        return None
+    key = SERVICES[service_name]["config_key"]
+    if key is None:
+        return str(socket_path(service_name))
+    config_path = Path("config.yaml")
+    config = (yaml.safe_load(config_path.read_text()) or {}) if config_path.exists() else {}
+    endpoint = str((config.get(key) or {}).get("endpoint") or "")
+    return endpoint.removeprefix("unix:") if endpoint.startswith("unix:") else None
+
+
+def service_env(service_name: str) -> dict[str, str]:
+    """Environment of a service process: ours, the uvicorn settings of the server profile,
+    where to register the service so that clients can find it and the Unix socket to listen on.
+    """
+    service = SERVICES[service_name]
+    cpus = (resources.load().get(service_name) or {}).get("cpus")
+    cores = len(resources.parse_cpus(cpus)) if cpus is not None else None
+    options = server_profile.resolve(server_profile.load(), service.get("single_process", False), cores)
+    env = os.environ | server_profile.environment(options) | {
+        "REGISTRY_URL": registry_url(),
+        "ADVERTISE_URL": f"http://{local_ip}:{service['port']}",
+    }
+    unix_socket = service_socket(service_name)
+    if unix_socket:
+        env["SERVICE_SOCKET"] = unix_socket
+    return env
+
+
+def service_output(service_name: str) -> output.OutputBuffer:
+    """The buffer capturing a service's output, created on first use."""
+    if service_name not in outputs:
+        outputs[service_name] = output.OutputBuffer(service_name, output.load_settings())
+    return outputs[service_name]
+
+
+def launch_service(service_name: str) -> None:
+    """Start the long-running commands of a service inside a new terminal window (foreground),
+    or in the background when running as a daemon.
 
     Adjust the new-terminal logic for Windows (start cmd), macOS (osascript),
     or Linux (gnome-terminal) as needed.
     """
     service = SERVICES[service_name]
-    original_dir = os.getcwd()
+    cwd = service["path"]
+    env = service_env(service_name)
+    for cmd in service["commands"]:
+        if not is_long_running(cmd):
+            continue
+        # The warm standby runs headless, it has to be reachable through its stdin
+        if promote_standby(service_name, cmd):
+            continue
+        if headless:
+            process = subprocess.Popen(
+                policy_command(service_name, cmd),
+                shell=True,
+                cwd=cwd,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            service_output(service_name).follow(process.stdout, process.pid)
+        elif os.name == "nt":  # Windows
+            process = subprocess.Popen(f"start cmd /k {cmd}", shell=True, cwd=cwd, env=env)
+        elif sys.platform == "darwin":  # macOS
+            # Using osascript to open Terminal and run the command. Terminal does not inherit
+            # our environment, so what service_env() adds to it is passed on the command line.
+            profile = " ".join(f"{key}={value}" for key, value in env.items() if os.environ.get(key) != value)
+            process = subprocess.Popen(
+                f'osascript -e \'tell application "Terminal" to do script "cd {os.path.abspath(cwd)} && {profile} {cmd}"\'',
+                shell=True,
+            )
+        else:  # Linux (gnome-terminal). Adjust if using a different terminal
+            process = subprocess.Popen(f"gnome-terminal -- {cmd}", shell=True, cwd=cwd, env=env)
+
+        processes[service_name] = process.pid
+        if headless and os.name == "nt":  # A terminal window runs the service outside of our process tree
+            apply_resource_policy(service_name, process.pid)
+
 
+def run_service(service_name: str) -> None:
+    """Run the service by executing each command in the service's 'commands' list
+    inside a new terminal window (foreground) if it matches the usual 'long-running'
+    commands (logger.py, uvicorn, hardware.py, etc.). Otherwise, run synchronously.
+    """
+    prepare_service(service_name)
+    launch_service(service_name)
+
+
+def listening_pid(port: int) -> int | None:
+    """The process listening on TCP `port` on this host; the parent one when uvicorn workers share the socket."""
     try:
-        os.chdir(service["path"])
-        for cmd in service["commands"]:
-            # List of known "long-running" commands we want in a new terminal:
-            if any(x in cmd for x in ["logger.py", "uvicorn", "hardware.py", "transcriber.py", "aggregator.py"]):
-                if os.name == "nt":  # Windows
-                    process = subprocess.Popen(f"start cmd /k {cmd}", shell=True)
-                elif sys.platform == "darwin":  # macOS
-                    # Using osascript to open Terminal and run the command
-                    process = subprocess.Popen(
-                        f'osascript -e \'tell application "Terminal" to do script "{cmd}"\'',
-                        shell=True,
-                    )
-                else:  # Linux (gnome-terminal). Adjust if using a different terminal
-                    process = subprocess.Popen(f"gnome-terminal -- {cmd}", shell=True)
-
-                processes[service_name] = process.pid
-            else:
-                # For short/one-shot commands (e.g., 'uv sync'):
-                subprocess.run(cmd, shell=True, check=True)
+        connections = psutil.net_connections(kind="tcp")
+    except psutil.AccessDenied:  # macOS shows other processes' sockets to root only
+        return None
+    pids = {
+        conn.pid for conn in connections
+        if conn.pid and conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port
+    }
+    for pid in pids:
+        try:
+            if psutil.Process(pid).ppid() not in pids:
+                return pid
+        except psutil.NoSuchProcess:
+            continue
+    return None
+
 
-    finally:
-        os.chdir(original_dir)
+def service_pid(service_name: str) -> int | None:
+    """The PID of the service's process, if it runs.
+
+    In a terminal window, the PID we started is the launcher's (gnome-terminal, osascript,
+    cmd), which is gone by now, so the service is looked up by the port it listens on.
+    """
+    pid = processes.get(service_name)
+    if headless or pid is None:
+        return pid
+    return listening_pid(SERVICES[service_name]["port"])
 
 
 def stop_service(service_name: str) -> bool:
-    """Stop the service by killing its subprocess and any children."""
-    if service_name in processes:
-        try:
-            pid = processes[service_name]
-            parent = psutil.Process(pid)
-            for child in parent.children(recursive=True):
-                child.kill()
-            parent.kill()
-            del processes[service_name]
-            return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-        except Exception as e:
-            print(f"Error stopping {service_name}: {e}")
+    """Stop the service with SIGTERM (SIGKILL if it does not exit in time), children included."""
+    pid = service_pid(service_name)
+    # Forget the PID first, so the supervisor does not restart the service as it exits
+    if processes.pop(service_name, None) is None or pid is None:
+        return False
+    try:
+        daemon.terminate_tree(pid)
+        return True
+    except psutil.AccessDenied:
+        pass
+    except Exception as e:
+        print(f"Error stopping {service_name}: {e}")
     return False
 
 
-def get_service_status() -> dict[str, dict[str, bool | str | int]]:
-    """Return a dict with running status, host, port, and PID for each service."""
+def promote_standby(service_name: str, cmd: str) -> bool:
+    """Hand the service over to its warm standby, if it has one, and spawn a new spare.
+
+    Returns True if a standby was promoted, i.e. the service is already starting.
+    """
+    service = SERVICES[service_name]
+    if not service.get("standby"):
+        return False
+    if service_name not in standbys:
+        env, captured = service_env(service_name), service_output(service_name)
+        # The spare loads its model right away, keep it off the interactive services' cores too
+        standbys[service_name] = WarmStandby(policy_command(service_name, cmd), service["path"], env, captured)
+    standby = standbys[service_name]
+    pid = standby.promote()
+    if pid is not None:
+        processes[service_name] = pid
+    standby.spawn()
+    if standby.alive() and os.name == "nt":
+        apply_resource_policy(service_name, standby.process.pid)
+    return pid is not None
+
+
+def policy_command(service_name: str, cmd: str) -> str:
+    """`cmd`, started so that the service applies the resource policy of config.yaml to itself before it runs."""
+    if not resources.load().get(service_name):
+        return cmd
+    return resources.launch_command(service_name, cmd)
+
+
+def apply_resource_policy(service_name: str, pid: int) -> None:
+    """Apply the CPU affinity, priority and cgroup limits of config.yaml to a running service's processes.
+
+    Only needed on Windows, elsewhere policy_command() has the service apply them itself.
+    """
+    policy = resources.load().get(service_name)
+    if not policy:
+        return
+    for problem in resources.apply(service_name, pid, policy):
+        print(f"⚠️  {service_name}: {problem}")
+
+
+def stop_standbys() -> None:
+    """Kill all warm standby processes."""
+    for standby in standbys.values():
+        standby.stop()
+
+
+def is_running(service_name: str) -> bool:
+    """Return True if the process we started for the service still exists and is not a zombie."""
+    pid = processes.get(service_name)
+    if pid is None:
+        return False
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def restart_service(service_name: str) -> None:
+    """Stop a service (if it is still around) and start it again."""
+    stop_service(service_name)
+    port = SERVICES[service_name]["port"]
+    if not headless and is_ready(local_ip, port, None):
+        # Its process could not be found, a second copy would only fail to bind the port
+        raise RuntimeError(f"the process on port {port} could not be stopped, restart it in its terminal window")
+    run_service(service_name)
+
+
+def start_supervisor() -> None:
+    """Start the watchdog that restarts services we launched when they stop being healthy."""
+    global supervisor
+    # Terminal windows detach from the service, only headless processes can be watched directly
+    alive = is_running if headless else None
+    supervisor = Supervisor(SERVICES, restart_service, local_ip, watched=lambda: list(processes), alive=alive)
+    supervisor.start()
+
+
+def on_child_exit() -> None:
+    """Reap services that exited and let the supervisor restart them without waiting for its next round."""
+    if daemon.reap(list(processes.values())) and supervisor is not None:
+        supervisor.wake()
+
+
+def start_control_api(port: int) -> daemon.ControlAPI:
+    """Serve start/stop/restart/status on 127.0.0.1:`port` for `control.py <command>`."""
+    actions = {
+        "status": lambda lines: {
+            "services": get_service_status(),
+            "restarts": supervisor.history if supervisor else [],
+            "output": {name: buffer.tail(lines) for name, buffer in outputs.items()},
+        },
+        "start": lambda name: run_service(name) if name else start_all_services(),
+        "stop": lambda name: stop_service(name) if name else stop_all_services(),
+        "restart": restart_service,
+    }
+    api = daemon.ControlAPI(actions, list(SERVICES), port)
+    api.start()
+    print(f"🎛️  Control API listening on {daemon.CONTROL_HOST}:{port}")
+    return api
+
+
+def get_service_status() -> dict[str, dict[str, bool | str | int | float]]:
+    """Return a dict with running status, host, port, PID, CPU and memory use for each service."""
     status = {}
     for service_name, data in SERVICES.items():
-        pid = processes.get(service_name)
+        pid = service_pid(service_name)
         running = False
         if pid:
             try:
@@ -213,11 +494,14 @@ def get_service_status() -> dict[str, dict[str, bool | str | int]]:
                 running = True
             except psutil.NoSuchProcess:
                 del processes[service_name]
+        cpu_percent, rss_mb = resources.usage(pid) if running else (0.0, 0.0)
         status[service_name] = {
             "running": running,
             "host": local_ip,
             "port": data["port"],
             "pid": pid,
+            "cpu_percent": cpu_percent,  # Of one core, summed over the service's processes
+            "rss_mb": rss_mb,
         }
     return status
 
@@ -226,19 +510,31 @@ def print_status() -> None:
     """Pretty-print the status of all services."""
     status = get_service_status()
     print("\n📡 Service Status:")
-    print(f"{'Service':<12} | {'Status':<8} | {'Endpoint':<25} | PID")
-    print("-" * 60)
+    print(f"{'Service':<12} | {'Status':<8} | {'Endpoint':<25} | {'PID':<8} | {'CPU %':>6} | {'RSS MB':>8}")
+    print("-" * 82)
     for name, info in status.items():
         state = "🟢 RUNNING" if info["running"] else "🔴 STOPPED"
         endpoint = f"http://{info['host']}:{info['port']}"
         pid_str = str(info["pid"]) if info["pid"] else "N/A"
-        print(f"{name:<12} | {state:<8} | {endpoint:<25} | {pid_str}")
+        print(f"{name:<12} | {state:<8} | {endpoint:<25} | {pid_str:<8} | "
+              f"{info['cpu_percent']:>6.1f} | {info['rss_mb']:>8.1f}")
+    print_restart_history()
+
+
+def print_restart_history() -> None:
+    """Pretty-print the restarts performed by the supervisor."""
+    if supervisor is None or not supervisor.history:
+        return
+    print("\n♻️  Restart History:")
+    for record in supervisor.history:
+        print(f"{record['time']} | {record['service']:<12} | attempt {record['attempt']} | "
+              f"{record['reason']} | {record['result']}")
 
 
 def show_menu() -> None:
     """Display the menu of control options."""
     print("\n🔧 Control Panel 🔧")
-    print("1. Validate (Start) All Services Sequentially")
+    print("1. Validate (Start) All Services")
     print("2. Stop All Services")
     print("3. List Running Services")
     # Start service options
@@ -277,6 +573,7 @@ def handle_choice(choice: str) -> None:
         # Exiting
         elif choice_int == (4 + len(SERVICES) * 2):
             print("👋 Exiting...")
+            stop_standbys()
             sys.exit(0)
         else:
             print("❌ Invalid choice")
@@ -285,26 +582,18 @@ def handle_choice(choice: str) -> None:
 
 
 def start_all_services() -> None:
-    """Start all services *one by one* in a specific order:
-    1) logger (first)
-    2) browser
-    3) hardware
-    4) transcriber
-    5) aggregator
-
-    and wait ~10 seconds between each to let them spin up.
+    """Start all services following the dependency graph in SERVICES:
+    1) `uv sync` (and other setup steps) for every service, in parallel
+    2) logger first, since everything depends on it
+    3) browser, hardware and transcriber together
+    4) aggregator once browser and hardware are ready
+
+    Each service is considered started once its port is open and its health
+    endpoint answers, instead of waiting a fixed time.
     """
-    print("\n🚀 Starting all services in sequence...")
-
-    # Define the order you want:
-    service_order = ["logger", "browser", "hardware", "transcriber", "aggregator"]
-
-    for svc in service_order:
-        print(f"Starting {svc.capitalize()} service...")
-        run_service(svc)
-        print("Waiting 10 seconds to let the service fully start...\n")
-        time.sleep(10)
-
+    print("\n🚀 Starting all services...")
+    timeline = start_services(SERVICES, prepare_service, launch_service, local_ip)
+    print_timeline(timeline)
     print("✅ All services have been started. Use option 3 to check status.")
 
 
@@ -313,6 +602,7 @@ def stop_all_services() -> None:
     print("\n🛑 Stopping all services...")
     for svc in list(processes.keys()):
         stop_service(svc)
+    stop_standbys()
     print("✅ All services have been stopped. Use option 3 to check status.")
 
 
@@ -324,11 +614,12 @@ def start_service(service_name: str) -> None:
     print("Use option 3 to check status.")
 
 
-def main(choice: str) -> None:
-    """Main entry that performs the action corresponding to the numeric choice.
+def main(choice: str, control_port: int | None = None) -> None:
+    """Main entry that performs the action corresponding to the numeric choice,
+    then sleeps until SIGINT/SIGTERM and stops the services.
 
     Examples:
-      - main("1") => start all services sequentially
+      - main("1") => start all services
       - main("2") => stop all services
       - main("3") => print status
 
@@ -337,22 +628,53 @@ def main(choice: str) -> None:
     local_ip = get_local_ip()
     update_config()  # Update the config.yaml with our local IP
     update_log_configs_with_logger_url() # update log files
-    try:
-        handle_choice(choice)
-        while True:
-            pass
-    except KeyboardInterrupt:
-        print("\n👋 Exiting...")
+    start_supervisor()  # restart services that stop answering /healthz
+    if control_port is not None:
+        start_control_api(control_port)
+    handle_choice(choice)
+    # Block on signals instead of spinning: wakes up only when a child exits or we are asked to stop
+    signum = daemon.wait_for_signals(on_child_exit)
+    print(f"\n👋 Received {signal.Signals(signum).name}, exiting...")
+    supervisor.stop()
+    stop_all_services()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line options of the orchestrator."""
+    parser = argparse.ArgumentParser(description="Voice Control service orchestrator")
+    parser.add_argument(
+        "--force-sync",
+        action="store_true",
+        help="run 'uv sync' and 'playwright install' even if the dependency fingerprints are unchanged",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run the services in the background and serve a local control API (see `control.py status`)",
+    )
+    parser.add_argument(
+        "--control-port",
+        type=int,
+        default=daemon.CONTROL_PORT,
+        help=f"port of the control API in daemon mode (default: {daemon.CONTROL_PORT})",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
     """
     By default, this will:
       1) Update config.yaml with your local IP
-      2) Start ALL services sequentially (logger first, then others)
-      3) Keep the script alive until you Ctrl+C, upon which all services are stopped.
+      2) Start ALL services (logger first, then others as their dependencies become ready)
+      3) Keep the script alive until you Ctrl+C (or SIGTERM), upon which all services are stopped.
+
+    With --daemon the services run in the background and can be driven with
+    `control.py status|start|stop|restart` through the control API.
     """
+    args = parse_args()
+    force_sync = args.force_sync
+    headless = args.daemon
     try:
-        main("1")  # Automatically "Validate (Start) All Services Sequentially"
+        main("1", args.control_port if args.daemon else None)  # Automatically "Validate (Start) All Services"
     except KeyboardInterrupt:
         stop_all_services()
@@ -1,21 +1,51 @@
 import sys
+import time
+from collections import OrderedDict
+from threading import Lock
 
 import toml
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from loguru import logger
 from pydantic import BaseModel
 
+from voicecontrol_common.metrics import Counter, instrument
+
 # request model
 
 
 class LogRequest(BaseModel):
     message: str
+    request_id: str | None = None
+
+
+class Span(BaseModel):
+    request_id: str
+    service: str
+    name: str
+    start: float  # Unix timestamp in seconds
+    duration_ms: float
+
+
+class SpanBatch(BaseModel):
+    spans: list[Span]
+
+
+# Probed/scraped every few seconds or sent in bulk, so keep them out of the logs
+QUIET_PATHS = {"/healthz", "/readyz", "/metrics", "/spans"}
+
+MESSAGES_LOGGED = Counter("logger_messages_total", "Log messages received from the services.")
 
 
 # Load config
 config = toml.load("config.toml")
 
+# Spans and log lines per request ID, oldest requests are dropped first
+TRACES: OrderedDict[str, dict[str, list]] = OrderedDict()
+TRACES_LOCK = Lock()
+MAX_TRACES = config.get("trace", {}).get("max_requests", 1000)
+
 # Configure Loguru
 logger.remove()  # Remove default handler
 logger.add(
@@ -36,11 +66,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app)
 
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Middleware to log incoming requests."""
+    if request.url.path in QUIET_PATHS:
+        return await call_next(request)
     logger.info(f"Incoming request: {request.method} {request.url}")
     response = await call_next(request)
     logger.info(f"Response status: {response.status_code}")
@@ -53,13 +86,86 @@ def read_root():
     return {"message": "Hello, FastAPI with Loguru!"}
 
 
+@app.get("/healthz")
+def healthz():
+    """Liveness probe: the logging server answers requests."""
+    return {"status": "ok", "checks": {}}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness probe: the logging server is accepting log messages."""
+    return {"status": "ok", "checks": {}}
+
+
+def trace_for(request_id: str) -> dict[str, list]:
+    """Return the (possibly new) trace of a request, evicting the oldest one if full.
+
+    Must be called with TRACES_LOCK held.
+    """
+    trace = TRACES.get(request_id)
+    if trace is None:
+        trace = TRACES[request_id] = {"spans": [], "logs": []}
+        while len(TRACES) > MAX_TRACES:
+            TRACES.popitem(last=False)
+    return trace
+
+
 @app.post("/log")
 async def log_message(message: LogRequest):
-    logger.info(f"Logged message: {message.message}")
+    MESSAGES_LOGGED.inc()
+    if message.request_id:
+        logger.info(f"[{message.request_id}] Logged message: {message.message}")
+        with TRACES_LOCK:
+            trace_for(message.request_id)["logs"].append({"time": time.time(), "message": message.message})
+    else:
+        logger.info(f"Logged message: {message.message}")
     return {"status": "logged", "message": message.message}
 
 
+@app.post("/spans")
+async def record_spans(batch: SpanBatch):
+    """Collect timed spans reported by the services."""
+    with TRACES_LOCK:
+        for span in batch.spans:
+            trace_for(span.request_id)["spans"].append(span.model_dump())
+    return {"status": "recorded", "count": len(batch.spans)}
+
+
+@app.get("/trace/{request_id}")
+def waterfall(request_id: str):
+    """Return the spans of one request as a waterfall, ordered by start time.
+
+    Offsets are relative to the first span. Services on different machines are compared
+    by wall clock, so small negative gaps can come from clock skew.
+    """
+    with TRACES_LOCK:
+        trace = TRACES.get(request_id)
+        spans = sorted(trace["spans"], key=lambda span: span["start"]) if trace else []
+        logs = list(trace["logs"]) if trace else []
+    if not spans and not logs:
+        return JSONResponse(status_code=404, content={"detail": f"No trace for request {request_id}"})
+
+    origin = min([span["start"] for span in spans] + [log["time"] for log in logs])
+    end = max([span["start"] + span["duration_ms"] / 1000 for span in spans] + [origin])
+    rows = [
+        {
+            "service": span["service"],
+            "name": span["name"],
+            "offset_ms": round((span["start"] - origin) * 1000, 2),
+            "duration_ms": round(span["duration_ms"], 2),
+        }
+        for span in spans
+    ]
+    return {
+        "request_id": request_id,
+        "total_ms": round((end - origin) * 1000, 2),
+        "spans": rows,
+        "logs": [{"offset_ms": round((log["time"] - origin) * 1000, 2), "message": log["message"]} for log in logs],
+    }
+
+
 if __name__ == "__main__":
-    import uvicorn
+    from voicecontrol_common.serving import serve, uvicorn_options
 
-    uvicorn.run("__main__:app", host="0.0.0.0", port=8080, reload=True)
+    serve("__main__:app", host="0.0.0.0", port=8080, **uvicorn_options())
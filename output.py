@@ -0,0 +1,180 @@
+# output.py
+"""Captured output of the services: bounded in-memory ring buffers, optionally rotated to disk.
+
+Every headless service writes its stdout and stderr to a pipe that a reader thread drains
+as fast as the service writes, so a noisy service never blocks on a full pipe whether or
+not anyone looks at its output. The thread keeps the last `buffer_bytes` of output in
+memory, tagged with the PID that wrote them (a service keeps its buffer across restarts),
+and can append the raw output to `<log_dir>/<service>.log`, rotated at `max_bytes` with `backups` old files.
+A log file that cannot be written (full disk, deleted directory) is reopened once, then
+given up with a warning: the output is always kept in memory and the pipe always drained.
+
+Settings come from `service_output` in config.yaml:
+
+    service_output:
+      buffer_bytes: 1048576
+      log_dir: .voicecontrol/logs   # null to keep the output in memory only
+      max_bytes: 10485760
+      backups: 3
+"""
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import IO
+
+import yaml
+
+DEFAULTS = {"buffer_bytes": 2**20, "log_dir": ".voicecontrol/logs", "max_bytes": 10 * 2**20, "backups": 3}
+CHUNK = 64 * 1024
+COALESCE_SECONDS = 0.01
+
+
+def load_settings(config_path: str = "config.yaml") -> dict:
+    """Return the `service_output` settings of config.yaml, with defaults for missing keys."""
+    path = Path(config_path)
+    config = (yaml.safe_load(path.read_text()) or {}) if path.exists() else {}
+    return DEFAULTS | (config.get("service_output") or {})
+
+
+class RotatingFile:
+    """Append-only file that is rotated to `<name>.1` ... `<name>.<backups>` once it reaches `max_bytes`."""
+
+    def __init__(self, path: Path, max_bytes: int, backups: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, "ab", buffering=0)  # noqa: SIM115 - closed by close(), whole chunks are written
+
+    def write(self, data: bytes) -> None:
+        self.file.write(data)
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self) -> None:
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self.file = open(self.path, "ab", buffering=0)  # noqa: SIM115
+
+    def reopen(self) -> None:
+        """Open the file again, e.g. after a failed write or rotation left it broken or closed."""
+        with contextlib.suppress(OSError):
+            self.file.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "ab", buffering=0)  # noqa: SIM115
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class OutputBuffer:
+    """The last `buffer_bytes` of output written by the processes of one service.
+
+    Output is stored as the raw chunks read from the pipe and only split into lines when
+    someone asks for them, so capturing costs one append per read whatever the line rate.
+    """
+
+    def __init__(self, name: str, settings: dict | None = None) -> None:
+        settings = DEFAULTS | (settings or {})
+        self.name = name
+        self.max_bytes = settings["buffer_bytes"]
+        self.chunks: deque[tuple[float, int, bytes]] = deque()
+        self.size = 0
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self.file = None
+        if settings["log_dir"]:
+            path = Path(settings["log_dir"]) / f"{name}.log"
+            try:
+                self.file = RotatingFile(path, settings["max_bytes"], settings["backups"])
+            except OSError as e:
+                self._warn_memory_only(path, e)
+
+    def follow(self, stream: IO[bytes], pid: int) -> None:
+        """Drain `stream` (a child's stdout) into the buffer from a background thread until it closes."""
+        threading.Thread(target=self._drain, args=(stream, pid), name=f"output-{self.name}", daemon=True).start()
+
+    def _drain(self, stream: IO[bytes], pid: int) -> None:
+        fd = stream.fileno()
+        try:
+            while True:
+                try:
+                    chunk = os.read(fd, CHUNK)  # Returns as soon as anything is available
+                except OSError:
+                    break  # Pipe closed under us, e.g. the process was killed
+                if not chunk:
+                    break
+                self._append(pid, chunk)
+                if len(chunk) < CHUNK:
+                    # Let output pile up in the pipe instead of waking up for every line
+                    # a service writes unbuffered. 64 KB of pipe buffer lasts 10 ms at 6 MB/s.
+                    time.sleep(COALESCE_SECONDS)
+        finally:
+            stream.close()
+
+    def _append(self, pid: int, chunk: bytes) -> None:
+        with self._lock:
+            self.chunks.append((time.time(), pid, chunk))
+            self.size += len(chunk)
+            self.total_bytes += len(chunk)
+            while self.size > self.max_bytes and len(self.chunks) > 1:
+                self.size -= len(self.chunks.popleft()[2])
+            if self.file is not None:
+                self._write_file(chunk)
+
+    def _write_file(self, chunk: bytes) -> None:
+        """Append `chunk` to the log file, reopening it once if the write fails, else stop writing it."""
+        try:
+            self.file.write(chunk)
+        except (OSError, ValueError):  # ValueError: a failed rotation left the file closed
+            try:
+                self.file.reopen()
+                self.file.write(chunk)
+            except (OSError, ValueError) as e:
+                with contextlib.suppress(OSError):
+                    self.file.close()
+                self._warn_memory_only(self.file.path, e)
+                self.file = None
+
+    def _warn_memory_only(self, path: Path, error: Exception) -> None:
+        print(f"⚠️  {self.name}: cannot write {path} ({error}), keeping its output in memory only", flush=True)
+
+    def tail(self, n: int = 50) -> list[str]:
+        """The last `n` lines, formatted as "HH:MM:SS [pid] line"."""
+        if n <= 0:
+            return []
+        with self._lock:
+            chunks, newlines = [], 0
+            for chunk in reversed(self.chunks):  # Only as far back as needed for n lines
+                chunks.append(chunk)
+                newlines += chunk[2].count(b"\n")
+                if newlines > n:
+                    break
+        # Join consecutive chunks of the same process, a line may span several reads
+        runs: list[tuple[float, int, bytes]] = []
+        for t, pid, data in reversed(chunks):
+            if runs and runs[-1][1] == pid:
+                runs[-1] = (t, pid, runs[-1][2] + data)
+            else:
+                runs.append((t, pid, data))
+        lines = [
+            f"{time.strftime('%H:%M:%S', time.localtime(t))} [{pid}] {line.rstrip(chr(13))}"
+            for t, pid, data in runs
+            for line in data.decode(errors="replace").removesuffix("\n").split("\n")
+        ]
+        return lines[-n:]
+
+    def close(self) -> None:
+        if self.file is not None:
+            with self._lock:
+                self.file.close()
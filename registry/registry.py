@@ -0,0 +1,151 @@
+"""Service registry: where the running instances of each service can be reached.
+
+Service instances register themselves with their URL and then send a heartbeat every
+few seconds (see voicecontrol_common/registration.py). An instance that misses its
+heartbeats for `ttl` seconds is dropped, so clients only ever see live replicas, on
+this machine or any other. Heartbeats also carry the number of requests the instance
+is handling, which clients use for least-outstanding-requests balancing.
+
+Everything is kept in memory: after a restart the registry is repopulated by the next
+round of heartbeats.
+"""
+import threading
+import time
+
+import toml
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from voicecontrol_common.metrics import Counter, Gauge, instrument
+
+config = toml.load("config.toml")
+TTL = config["registry"].get("ttl_seconds", 15)
+PORT = config["registry"].get("port", 8010)
+
+REGISTRATIONS = Counter("registry_registrations_total", "Instances registered (or re-registered).", ("service",))
+EXPIRED = Counter("registry_expired_total", "Instances dropped after missing their heartbeats.", ("service",))
+INSTANCES = Gauge("registry_instances", "Live instances per service.", ("service",))
+
+
+class Registration(BaseModel):
+    """An instance announcing itself: its service, its base URL and its current load."""
+
+    service: str
+    url: str
+    outstanding: int = 0
+
+
+class Heartbeat(BaseModel):
+    """An instance's periodic sign of life, with the requests it is handling."""
+
+    outstanding: int = 0
+
+
+# Instance ID ("<service>@<url>") -> instance. Workers of one server share a URL, hence an instance.
+INSTANCES_BY_ID: dict[str, dict] = {}
+SERVICES_SEEN: set[str] = set()
+LOCK = threading.Lock()
+
+app = FastAPI()
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+instrument(app)
+
+
+def expire() -> None:
+    """Drop instances that missed their heartbeats. Must be called with LOCK held."""
+    now = time.monotonic()
+    for instance_id, instance in list(INSTANCES_BY_ID.items()):
+        if now - instance["last_seen"] > TTL:
+            del INSTANCES_BY_ID[instance_id]
+            EXPIRED.inc(service=instance["service"])
+    SERVICES_SEEN.update(instance["service"] for instance in INSTANCES_BY_ID.values())
+    for service in SERVICES_SEEN:
+        INSTANCES.set(sum(i["service"] == service for i in INSTANCES_BY_ID.values()), service=service)
+
+
+def public(instance_id: str, instance: dict) -> dict:
+    """Return the fields of an instance that clients see."""
+    return {
+        "id": instance_id,
+        "service": instance["service"],
+        "url": instance["url"],
+        "outstanding": instance["outstanding"],
+        "age_seconds": round(time.monotonic() - instance["registered"], 1),
+    }
+
+
+@app.get("/healthz")
+def healthz() -> dict:
+    """Liveness probe: the registry answers requests."""
+    return {"status": "ok", "checks": {}}
+
+
+@app.get("/readyz")
+def readyz() -> dict:
+    """Readiness probe: the registry accepts registrations."""
+    return {"status": "ok", "checks": {}}
+
+
+@app.post("/register")
+def register(registration: Registration) -> dict:
+    """Add an instance, or refresh it if it is already known."""
+    instance_id = f"{registration.service}@{registration.url.rstrip('/')}"
+    now = time.monotonic()
+    with LOCK:
+        instance = INSTANCES_BY_ID.setdefault(instance_id, {"registered": now})
+        instance.update(
+            service=registration.service,
+            url=registration.url.rstrip("/"),
+            outstanding=registration.outstanding,
+            last_seen=now,
+        )
+        expire()
+    REGISTRATIONS.inc(service=registration.service)
+    return {"id": instance_id, "ttl_seconds": TTL}
+
+
+@app.post("/heartbeat/{instance_id:path}")
+def heartbeat(instance_id: str, beat: Heartbeat) -> JSONResponse:
+    """Keep an instance alive. Unknown (e.g. expired) instances get a 404 and must register again."""
+    with LOCK:
+        instance = INSTANCES_BY_ID.get(instance_id)
+        if instance is None:
+            return JSONResponse(status_code=404, content={"detail": f"Unknown instance {instance_id}"})
+        instance["last_seen"] = time.monotonic()
+        instance["outstanding"] = beat.outstanding
+    return JSONResponse(content={"id": instance_id, "ttl_seconds": TTL})
+
+
+@app.delete("/instances/{instance_id:path}")
+def deregister(instance_id: str) -> dict:
+    """Remove an instance that is shutting down."""
+    with LOCK:
+        removed = INSTANCES_BY_ID.pop(instance_id, None)
+        expire()
+    return {"id": instance_id, "removed": removed is not None}
+
+
+@app.get("/instances")
+def instances(service: str | None = None) -> list[dict]:
+    """Live instances, of one service or of all of them."""
+    with LOCK:
+        expire()
+        return [
+            public(instance_id, instance)
+            for instance_id, instance in INSTANCES_BY_ID.items()
+            if service is None or instance["service"] == service
+        ]
+
+
+if __name__ == "__main__":
+    from voicecontrol_common.serving import serve, uvicorn_options
+
+    # Single process: the instances are kept in memory
+    host = "0.0.0.0"  # noqa: S104 - instances on other machines register here
+    serve("__main__:app", host=host, port=PORT, **uvicorn_options(workers=1))
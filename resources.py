@@ -0,0 +1,182 @@
+# resources.py
+"""Per-service resource policies: CPU affinity, priority and cgroup v2 limits.
+
+`resource_policies` in config.yaml maps a service to its policy:
+
+    transcriber:
+      cpus: "2-"          # cores 2 to the last one, also "0-1,4" or a list of core numbers
+      nice: 10            # lower priority than the interactive services
+      memory_max: 6G      # cgroup v2 memory.max
+      cpu_max: 4          # cgroup v2 cpu.max, in cores
+
+The service's own process applies its policy before it runs the service: the orchestrator
+launches `launch_command()`, i.e. this module, which applies the policy to itself and then
+execs the command, keeping its PID. Everything the service starts inherits the policy,
+there is no window in which a child escapes it. Windows cannot exec in place, so there the
+orchestrator applies the policy to the process tree right after launching it. Whatever the
+platform or our permissions do not allow is skipped with a warning, the service is started
+either way.
+"""
+import os
+import shlex
+import sys
+from pathlib import Path
+
+import psutil
+import yaml
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+CGROUP_NAME = "voicecontrol"
+CPU_PERIOD_US = 100_000
+
+
+def load(config_path: str = "config.yaml") -> dict[str, dict]:
+    """Return the resource policy of every service listed in config.yaml."""
+    path = Path(config_path)
+    if not path.exists():
+        return {}
+    config = yaml.safe_load(path.read_text()) or {}
+    return config.get("resource_policies") or {}
+
+
+def available_cpus() -> list[int]:
+    """The cores this process may run on: its affinity mask (containers, taskset) where there is one."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpus(spec: str | int | list[int]) -> list[int]:
+    """Turn "0-1,4", "2-" (to the last core), 3 or [0, 1] into core numbers we may run on."""
+    available = available_cpus()
+    cores = available[-1] + 1
+    if isinstance(spec, int):
+        spec = [spec]
+    if isinstance(spec, list):
+        wanted = {int(cpu) for cpu in spec}
+    else:
+        wanted = set()
+        for part in str(spec).split(","):
+            first, dash, last = part.strip().partition("-")
+            if not dash:
+                wanted.add(int(first))
+            else:
+                wanted.update(range(int(first or 0), int(last) + 1 if last else cores))
+    return sorted(wanted.intersection(available))
+
+
+def process_tree(pid: int) -> list[psutil.Process]:
+    """The process and all of its descendants, or [] if it has exited."""
+    try:
+        parent = psutil.Process(pid)
+        return [parent, *parent.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return []
+
+
+def set_priority(process: psutil.Process, nice: int) -> None:
+    """Set a Unix nice level, or the closest Windows priority class."""
+    if os.name != "nt":
+        process.nice(nice)
+    elif nice > 0:
+        process.nice(psutil.IDLE_PRIORITY_CLASS if nice >= 15 else psutil.BELOW_NORMAL_PRIORITY_CLASS)
+    elif nice < 0:
+        process.nice(psutil.HIGH_PRIORITY_CLASS if nice <= -15 else psutil.ABOVE_NORMAL_PRIORITY_CLASS)
+
+
+def join_cgroup(service_name: str, pids: list[int], memory_max: str | int | None, cpu_max: float | None) -> None:
+    """Move `pids` into a cgroup v2 group of their own with the given limits.
+
+    Raises:
+        OSError: If cgroup v2 is not available or we may not create groups (usually: not root).
+
+    """
+    if not (CGROUP_ROOT / "cgroup.controllers").exists():
+        raise OSError("cgroup v2 is not mounted")
+    parent = CGROUP_ROOT / CGROUP_NAME
+    parent.mkdir(exist_ok=True)
+    for controller, limit in (("memory", memory_max), ("cpu", cpu_max)):
+        if limit is not None:
+            (parent / "cgroup.subtree_control").write_text(f"+{controller}")
+    group = parent / service_name
+    group.mkdir(exist_ok=True)
+    if memory_max is not None:
+        (group / "memory.max").write_text(str(memory_max))
+    if cpu_max is not None:
+        (group / "cpu.max").write_text(f"{int(float(cpu_max) * CPU_PERIOD_US)} {CPU_PERIOD_US}")
+    for pid in pids:
+        (group / "cgroup.procs").write_text(str(pid))
+
+
+def apply(service_name: str, pid: int, policy: dict) -> list[str]:
+    """Apply `policy` to the process tree of `pid` and return what could not be applied."""
+    tree = process_tree(pid)
+    problems = []
+    if "cpus" in policy:
+        cpus = parse_cpus(policy["cpus"])
+        if not hasattr(psutil.Process, "cpu_affinity"):
+            problems.append("CPU affinity is not supported on this platform")
+        elif not cpus:
+            problems.append(f"none of the cores {policy['cpus']!r} are available, affinity not set")
+        else:
+            try:
+                for process in tree:
+                    process.cpu_affinity(cpus)
+            except (psutil.AccessDenied, OSError) as e:
+                problems.append(f"could not set CPU affinity: {e}")
+            except psutil.NoSuchProcess:
+                pass
+    if "nice" in policy:
+        try:
+            for process in tree:
+                set_priority(process, int(policy["nice"]))
+        except (psutil.AccessDenied, OSError) as e:
+            problems.append(f"could not set priority {policy['nice']}: {e}")
+        except psutil.NoSuchProcess:
+            pass
+    if "memory_max" in policy or "cpu_max" in policy:
+        try:
+            join_cgroup(service_name, [p.pid for p in tree], policy.get("memory_max"), policy.get("cpu_max"))
+        except OSError as e:
+            problems.append(f"cgroup limits not applied: {e}")
+    return problems
+
+
+def launch_command(service_name: str, cmd: str, config_path: str = "config.yaml") -> str:
+    """`cmd` run through this module, which applies the service's policy to its own process first.
+
+    `cmd` is returned unchanged on Windows, where the process cannot exec in place.
+    """
+    if os.name == "nt":
+        return cmd
+    wrapper = [sys.executable, str(Path(__file__).resolve()), str(Path(config_path).resolve()), service_name]
+    return f"exec {shlex.join(wrapper)} -- {cmd}"
+
+
+# Process handles per PID, cpu_percent() measures from the previous call on the same handle
+_handles: dict[int, psutil.Process] = {}
+
+
+def usage(pid: int) -> tuple[float, float]:
+    """CPU percent (since the previous call, 100 = one core) and RSS in MB of a process tree."""
+    cpu, rss = 0.0, 0
+    seen = set()
+    for process in process_tree(pid):
+        handle = _handles.setdefault(process.pid, process)
+        seen.add(process.pid)
+        try:
+            cpu += handle.cpu_percent(None)
+            rss += handle.memory_info().rss
+        except psutil.NoSuchProcess:
+            continue
+    for stale in [p for p in _handles if p not in seen and not psutil.pid_exists(p)]:
+        del _handles[stale]
+    return round(cpu, 1), round(rss / 2**20, 1)
+
+
+if __name__ == "__main__":
+    # resources.py CONFIG SERVICE -- COMMAND...: apply the policy of SERVICE to this process, then become COMMAND
+    config_path, service_name, _, *command = sys.argv[1:]
+    for problem in apply(service_name, os.getpid(), load(config_path).get(service_name) or {}):
+        print(f"⚠️  {service_name}: {problem}", file=sys.stderr, flush=True)
+    os.execvp(command[0], command)
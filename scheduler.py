@@ -0,0 +1,140 @@
+# scheduler.py
+"""Dependency-aware, parallel startup of the services described in SERVICES."""
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+def dependency_order(services: dict[str, dict]) -> list[str]:
+    """Return the service names in an order where every service comes after its dependencies.
+
+    Raises:
+        ValueError: If a service depends on an unknown service or the dependencies form a cycle.
+
+    """
+    order = []
+    remaining = {name: set(data.get("depends_on", [])) for name, data in services.items()}
+    for name, deps in remaining.items():
+        unknown = deps - services.keys()
+        if unknown:
+            raise ValueError(f"Service {name} depends on unknown service(s): {', '.join(sorted(unknown))}")
+
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps - set(order)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between services: {', '.join(sorted(remaining))}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+    return order
+
+
+def is_ready(host: str, port: int, health: str | None) -> bool:
+    """Return True when the port accepts connections and the health path (if any) answers with < 400."""
+    try:
+        with socket.create_connection((host, port), timeout=1):
+            pass
+    except OSError:
+        return False
+
+    if not health:
+        return True
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{health}", timeout=2) as resp:
+            return resp.status < 400
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def wait_until_ready(host: str, port: int, health: str | None, timeout: float, interval: float = 0.25) -> bool:
+    """Poll the readiness probe until it passes or `timeout` seconds have gone by."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_ready(host, port, health):
+            return True
+        time.sleep(interval)
+    return False
+
+
+def start_services(
+    services: dict[str, dict],
+    prepare: Callable[[str], None],
+    launch: Callable[[str], None],
+    host: str,
+    names: list[str] | None = None,
+    timeout: float = 120,
+) -> dict[str, dict[str, float | str]]:
+    """Bring up services as soon as their own setup and their dependencies allow.
+
+    Every service's `prepare` step (e.g. `uv sync`) starts immediately and in parallel.
+    A service is launched once it is prepared and all of its dependencies passed their
+    readiness probe, then it is probed itself. Independent services therefore start at
+    the same time instead of one after another.
+
+    Returns:
+        A timeline per service: seconds since start at which it was prepared, launched
+        and ready, or an `error` describing why it never became ready.
+
+    """
+    names = [name for name in dependency_order(services) if names is None or name in names]
+    if not names:  # Nothing selected, or everything is already running
+        return {"total": {"ready": 0.0}}
+    start = time.monotonic()
+    ready = {name: threading.Event() for name in names}
+    failed: set[str] = set()
+    timeline: dict[str, dict[str, float | str]] = {name: {} for name in names}
+
+    def elapsed() -> float:
+        return round(time.monotonic() - start, 2)
+
+    def bring_up(name: str) -> None:
+        service = services[name]
+        record = timeline[name]
+        try:
+            prepare(name)
+            record["prepared"] = elapsed()
+
+            for dep in service.get("depends_on", []):
+                if dep not in ready:
+                    continue  # Not part of this start, assume it is managed elsewhere
+                if not ready[dep].wait(timeout) or dep in failed:
+                    record["error"] = f"dependency {dep} not ready"
+                    failed.add(name)
+                    return
+
+            launch(name)
+            record["launched"] = elapsed()
+            if wait_until_ready(host, service["port"], service.get("health"), timeout):
+                record["ready"] = elapsed()
+            else:
+                record["error"] = "readiness probe timed out"
+                failed.add(name)
+        except Exception as e:
+            record["error"] = str(e)
+            failed.add(name)
+        finally:
+            ready[name].set()
+
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        for name in names:
+            pool.submit(bring_up, name)
+
+    timeline["total"] = {"ready": elapsed()}
+    return timeline
+
+
+def print_timeline(timeline: dict[str, dict[str, float | str]]) -> None:
+    """Pretty-print the per-service startup timeline returned by `start_services`."""
+    print("\n⏱️  Startup Timeline (seconds since start):")
+    print(f"{'Service':<12} | {'Prepared':>8} | {'Launched':>8} | {'Ready':>8} | Note")
+    print("-" * 60)
+    for name, record in timeline.items():
+        if name == "total":
+            continue
+        cells = [f"{record[key]:>8.2f}" if key in record else f"{'-':>8}" for key in ("prepared", "launched", "ready")]
+        print(f"{name:<12} | {' | '.join(cells)} | {record.get('error', '')}")
+    print(f"All done in {timeline['total']['ready']:.2f}s")
@@ -0,0 +1,76 @@
+# server_profile.py
+"""Uvicorn settings for each service, from the server profile selected in config.yaml.
+
+config.yaml names the active profile (`server_profile`) and defines the profiles
+(`server_profiles`): worker count, event loop, HTTP parser, keep-alive, listen backlog,
+access log and reload. The orchestrator resolves the profile for every service it
+launches and passes it down as the `UVICORN_*` environment variables the uvicorn CLI
+reads; services started with `uvicorn.run()` read the same variables
+(voicecontrol_common/serving.py).
+"""
+import os
+from pathlib import Path
+
+import yaml
+
+OPTIONS = ("workers", "loop", "http", "timeout_keep_alive", "backlog", "access_log", "reload")
+
+
+def load(config_path: str = "config.yaml") -> dict:
+    """Return the profile selected by `server_profile` in config.yaml, or {} if none is selected.
+
+    Raises:
+        ValueError: If the selected profile is not defined under `server_profiles`.
+
+    """
+    path = Path(config_path)
+    if not path.exists():
+        return {}
+    config = yaml.safe_load(path.read_text()) or {}
+    name = config.get("server_profile")
+    if name is None:
+        return {}
+    profiles = config.get("server_profiles") or {}
+    if name not in profiles:
+        raise ValueError(f"Unknown server profile {name!r}, expected one of {list(profiles)}.")
+    return profiles[name] or {}
+
+
+def available_cores() -> int:
+    """How many cores this process may run on: its affinity mask (containers, taskset) where there is one."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def resolve(profile: dict, single_process: bool = False, cores: int | None = None) -> dict:
+    """Uvicorn options of `profile` for one service.
+
+    `workers: auto` means one worker per CPU core the service may use (`cores`, by default
+    the ones we may run on), capped by `max_workers`. Services that own a resource which
+    cannot be shared between processes always get a single worker.
+    """
+    options = {key: profile[key] for key in OPTIONS if key in profile}
+    workers = options.get("workers", 1)
+    if workers == "auto":
+        cores = cores or available_cores()
+        workers = min(cores, profile.get("max_workers", cores))
+    if single_process or options.get("reload"):  # uvicorn cannot reload a multi-worker server
+        workers = 1
+    options["workers"] = int(workers)
+    if options.get("loop") == "uvloop" and os.name == "nt":
+        options["loop"] = "asyncio"  # uvloop has no Windows build
+    return options
+
+
+def environment(options: dict) -> dict[str, str]:
+    """The `UVICORN_*` environment variables that apply `options`."""
+    return {
+        f"UVICORN_{key.upper()}": str(value).lower() if isinstance(value, bool) else str(value)
+        for key, value in options.items()
+    }
+
+
+def describe(options: dict) -> str:
+    """One-line summary of the options, for the startup output."""
+    return ", ".join(f"{key}={value}" for key, value in options.items())
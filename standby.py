@@ -0,0 +1,73 @@
+# standby.py
+"""Warm standby processes: a spare copy of a service that has already done its slow startup."""
+import subprocess
+
+import psutil
+
+from output import OutputBuffer
+
+
+class WarmStandby:
+    """Keep one spare process of a service running with `--standby`.
+
+    In standby mode the service does all of its expensive initialisation (for the
+    transcriber: loading the Whisper model) and then waits for a line on stdin before
+    binding its port. Promoting the spare therefore only costs the time to start
+    serving, and a new spare is spawned straight away to take its place.
+    """
+
+    def __init__(
+        self, cmd: str, cwd: str, env: dict[str, str] | None = None, output: OutputBuffer | None = None,
+    ) -> None:
+        self.cmd = f"{cmd} --standby"
+        self.cwd = cwd
+        self.env = env
+        self.output = output  # Where the spare's output goes, it is the service's output once promoted
+        self.process: subprocess.Popen | None = None
+
+    def alive(self) -> bool:
+        """Return True if a spare process is running."""
+        return self.process is not None and self.process.poll() is None
+
+    def spawn(self) -> None:
+        """Start a new spare in the background unless one is already running."""
+        if self.alive():
+            return
+        self.process = subprocess.Popen(
+            self.cmd,
+            shell=True,
+            cwd=self.cwd,
+            env=self.env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL if self.output is None else subprocess.PIPE,
+            stderr=subprocess.DEVNULL if self.output is None else subprocess.STDOUT,
+        )
+        if self.output is not None:
+            self.output.follow(self.process.stdout, self.process.pid)
+
+    def promote(self) -> int | None:
+        """Tell the spare to start serving and return its PID, or None if there is no spare."""
+        if not self.alive():
+            return None
+        process = self.process
+        self.process = None
+        try:
+            process.stdin.write(b"serve\n")
+            process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+        return process.pid
+
+    def stop(self) -> None:
+        """Kill the spare and everything it started."""
+        if not self.alive():
+            self.process = None
+            return
+        try:
+            parent = psutil.Process(self.process.pid)
+            for child in parent.children(recursive=True):
+                child.kill()
+            parent.kill()
+        except psutil.NoSuchProcess:
+            pass
+        self.process = None
@@ -0,0 +1,114 @@
+# supervisor.py
+"""Watchdog that polls each service's /healthz and restarts it with backoff when it fails."""
+import threading
+import time
+from collections.abc import Callable
+
+from scheduler import is_ready
+
+
+class Supervisor(threading.Thread):
+    """Poll the liveness endpoint of every watched service and restart unhealthy ones.
+
+    A service is restarted after `failure_threshold` consecutive failed probes. Repeated
+    restarts of the same service are spaced out with exponential backoff (capped at
+    `backoff_max` seconds), and a freshly restarted service gets `grace` seconds to
+    come up before it is probed again. If an `alive` callback is given, a service whose
+    process has exited is restarted right away; `wake()` runs a round of checks without
+    waiting for the next interval (e.g. when a child process exits). Every restart is kept
+    in `history`.
+    """
+
+    def __init__(
+        self,
+        services: dict[str, dict],
+        restart: Callable[[str], None],
+        host: str,
+        watched: Callable[[], list[str]],
+        alive: Callable[[str], bool] | None = None,
+        interval: float = 10,
+        failure_threshold: int = 3,
+        backoff_base: float = 5,
+        backoff_max: float = 300,
+        grace: float = 60,
+    ) -> None:
+        super().__init__(name="supervisor", daemon=True)
+        self.services = services
+        self.restart = restart
+        self.host = host
+        self.watched = watched
+        self.alive = alive
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.grace = grace
+
+        self.history: list[dict[str, str | int | float]] = []
+        self.failures: dict[str, int] = {}
+        self.attempts: dict[str, int] = {}
+        self.next_check: dict[str, float] = {}
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def stop(self) -> None:
+        """Stop the supervisor loop after the current round of probes."""
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def wake(self) -> None:
+        """Check the services now instead of at the end of the current interval."""
+        self._wake_event.set()
+
+    def check(self, name: str) -> None:
+        """Probe one service and restart it if it has failed too often in a row."""
+        now = time.monotonic()
+        if name not in self.next_check:
+            # First time we see this service, give it time to come up
+            self.next_check[name] = now + self.grace
+            return
+        if now < self.next_check[name]:
+            return
+
+        service = self.services[name]
+        if self.alive is not None and not self.alive(name):
+            reason = "process exited"
+        elif is_ready(self.host, service["port"], "/healthz"):
+            self.failures[name] = 0
+            self.attempts[name] = 0
+            return
+        else:
+            self.failures[name] = self.failures.get(name, 0) + 1
+            if self.failures[name] < self.failure_threshold:
+                return
+            reason = f"{self.failure_threshold} failed health checks"
+
+        attempt = self.attempts.get(name, 0) + 1
+        self.attempts[name] = attempt
+        self.failures[name] = 0
+        record = {
+            "service": name,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "attempt": attempt,
+            "reason": reason,
+        }
+        try:
+            self.restart(name)
+            record["result"] = "restarted"
+        except Exception as e:
+            record["result"] = f"restart failed: {e}"
+        self.history.append(record)
+
+        backoff = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
+        self.next_check[name] = time.monotonic() + max(backoff, self.grace)
+
+    def run(self) -> None:
+        """Supervisor loop, runs until `stop()` is called."""
+        while True:
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                return
+            for name in list(self.watched()):
+                if name in self.services:
+                    self.check(name)
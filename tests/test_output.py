@@ -0,0 +1,75 @@
+"""Captured service output: reading back the last lines, bounding the buffer, logging to disk."""
+import re
+from pathlib import Path
+
+import pytest
+
+import output
+
+
+def memory_only(buffer_bytes: int = 2**20) -> output.OutputBuffer:
+    return output.OutputBuffer("svc", {"log_dir": None, "buffer_bytes": buffer_bytes})
+
+
+def lines(buffer: output.OutputBuffer, n: int = 50) -> list[str]:
+    """`tail()` without the timestamps."""
+    return [re.sub(r"^\d\d:\d\d:\d\d ", "", line) for line in buffer.tail(n)]
+
+
+def test_tail_returns_the_last_lines_tagged_with_their_pid() -> None:
+    buffer = memory_only()
+    buffer._append(10, b"one\ntwo\n")
+    buffer._append(10, b"three\r\n")
+    assert lines(buffer) == ["[10] one", "[10] two", "[10] three"]
+    assert lines(buffer, 2) == ["[10] two", "[10] three"]
+    assert buffer.tail(0) == []
+
+
+def test_tail_joins_a_line_split_across_reads() -> None:
+    buffer = memory_only()
+    buffer._append(10, b"hel")
+    buffer._append(10, b"lo\nwor")
+    buffer._append(10, b"ld\n")
+    assert lines(buffer) == ["[10] hello", "[10] world"]
+
+
+def test_tail_keeps_processes_apart_across_a_restart() -> None:
+    buffer = memory_only()
+    buffer._append(10, b"old pid, last line\n")
+    buffer._append(11, b"new pid\n")
+    assert lines(buffer) == ["[10] old pid, last line", "[11] new pid"]
+
+
+def test_tail_decodes_invalid_utf8() -> None:
+    buffer = memory_only()
+    buffer._append(10, b"caf\xe9\n")
+    assert lines(buffer) == ["[10] caf\N{REPLACEMENT CHARACTER}"]
+
+
+def test_drops_the_oldest_output_beyond_buffer_bytes() -> None:
+    buffer = memory_only(buffer_bytes=10)
+    for i in range(5):
+        buffer._append(10, f"line {i}\n".encode())
+    assert lines(buffer) == ["[10] line 4"]
+    assert buffer.size == 7
+    assert buffer.total_bytes == 35
+
+
+def test_writes_the_output_to_the_log_file(tmp_path: Path) -> None:
+    buffer = output.OutputBuffer("svc", {"log_dir": str(tmp_path), "max_bytes": 8, "backups": 1})
+    buffer._append(10, b"first\n")
+    buffer._append(10, b"second\n")  # Reaches max_bytes, rotates
+    buffer._append(10, b"third\n")
+    buffer.close()
+    assert (tmp_path / "svc.log.1").read_bytes() == b"first\nsecond\n"
+    assert (tmp_path / "svc.log").read_bytes() == b"third\n"
+
+
+@pytest.mark.skipif(not Path("/dev/full").exists(), reason="needs /dev/full to fail writes")
+def test_keeps_buffering_when_the_log_file_cannot_be_written(tmp_path: Path) -> None:
+    buffer = output.OutputBuffer("svc", {"log_dir": str(tmp_path)})
+    buffer.file.path = Path("/dev/full")
+    buffer.file.reopen()  # Every write now fails with ENOSPC
+    buffer._append(10, b"still captured\n")
+    assert buffer.file is None
+    assert lines(buffer) == ["[10] still captured"]
@@ -0,0 +1,36 @@
+"""Parsing the `cpus` of a resource policy into the cores a service may run on."""
+import pytest
+
+import resources
+
+
+@pytest.fixture(autouse=True)
+def eight_cores(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(resources, "available_cpus", lambda: list(range(8)))
+
+
+@pytest.mark.parametrize(
+    ("spec", "cores"),
+    [
+        ("0-1", [0, 1]),
+        ("0-1,4", [0, 1, 4]),
+        ("2-", [2, 3, 4, 5, 6, 7]),
+        ("-2", [0, 1, 2]),
+        (" 1 , 3-4 ", [1, 3, 4]),
+        (3, [3]),
+        ([5, 1, 1], [1, 5]),
+    ],
+)
+def test_parses_ranges_lists_and_single_cores(spec: str | int | list[int], cores: list[int]) -> None:
+    assert resources.parse_cpus(spec) == cores
+
+
+def test_drops_cores_that_do_not_exist() -> None:
+    assert resources.parse_cpus("6-12") == [6, 7]
+    assert resources.parse_cpus([9]) == []
+
+
+def test_drops_cores_outside_the_affinity_mask(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(resources, "available_cpus", lambda: [2, 3, 6])  # e.g. started under taskset
+    assert resources.parse_cpus("2-") == [2, 3, 6]
+    assert resources.parse_cpus("0-2") == [2]
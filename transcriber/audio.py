@@ -0,0 +1,138 @@
+"""In-process decoding of uploaded audio to 16 kHz mono float32, as Whisper expects it.
+
+Three paths, cheapest first:
+1. Raw 16 kHz mono PCM (`audio/pcm;rate=16000` little-endian, or `audio/L16;rate=16000`
+   big-endian as in RFC 2586) is converted straight to float32 without decoding.
+2. 16 kHz mono 16-bit WAV is read with the standard library the same way.
+3. Anything else (webm/opus from the UI, ogg, other WAVs, ...) is decoded with PyAV,
+   which links FFmpeg in-process, and resampled directly into a preallocated buffer.
+
+pydub, which runs an ffmpeg subprocess per file, is only used if PyAV cannot read the file.
+"""
+import wave
+from io import BytesIO
+
+import av
+import numpy as np
+from pydub.audio_segment import AudioSegment
+
+SAMPLE_RATE = 16000
+
+# Buffer size used when the container does not tell us its duration (MediaRecorder webm)
+DEFAULT_SECONDS = 30
+
+
+class UnsupportedAudioError(Exception):
+    """UnsupportedAudioError occurs when raw audio is sent in a layout we cannot use as is."""
+
+
+def parse_content_type(content_type: str | None) -> tuple[str, dict[str, str]]:
+    """Split `audio/pcm; rate=16000` into ("audio/pcm", {"rate": "16000"})."""
+    if not content_type:
+        return "", {}
+    mime, *params = (part.strip() for part in content_type.split(";"))
+    options = {}
+    for param in params:
+        key, _, value = param.partition("=")
+        options[key.strip().lower()] = value.strip()
+    return mime.lower(), options
+
+
+def pcm16_to_float(data: bytes, big_endian: bool = False) -> np.ndarray:
+    """Convert 16-bit PCM bytes to float32 samples in [-1, 1]."""
+    samples = np.frombuffer(data, dtype=">i2" if big_endian else "<i2").astype(np.float32)
+    samples *= 1 / 32768
+    return samples
+
+
+def decode_raw(data: bytes, mime: str, options: dict[str, str]) -> np.ndarray:
+    """Fast path for raw PCM uploads, no decoding or resampling involved."""
+    try:
+        rate = int(options.get("rate", SAMPLE_RATE))
+        channels = int(options.get("channels", 1))
+    except ValueError:
+        raise UnsupportedAudioError(f"Invalid rate or channels in the content type: {options}.") from None
+    if rate != SAMPLE_RATE or channels != 1:
+        raise UnsupportedAudioError(f"Raw PCM must be {SAMPLE_RATE} Hz mono, got {rate} Hz with {channels} channels.")
+    return pcm16_to_float(data[: len(data) - len(data) % 2], big_endian=mime == "audio/l16")
+
+
+def decode_wav(data: bytes) -> np.ndarray | None:
+    """Read a 16 kHz mono 16-bit WAV without decoding, or return None for any other WAV."""
+    try:
+        with wave.open(BytesIO(data)) as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                return None
+            return pcm16_to_float(wav.readframes(wav.getnframes()))
+    except (wave.Error, EOFError):
+        return None
+
+
+def decode_av(data: bytes) -> np.ndarray:
+    """Decode any container/codec FFmpeg knows, resampling into one float32 buffer."""
+    with av.open(BytesIO(data)) as container:
+        stream = container.streams.audio[0]
+        duration = float(stream.duration * stream.time_base) if stream.duration else None
+        if duration is None and container.duration:
+            duration = container.duration / av.time_base
+        buffer = np.empty(int((duration or DEFAULT_SECONDS) * SAMPLE_RATE) + SAMPLE_RATE, dtype=np.float32)
+
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+
+        def resampled_frames():  # noqa: ANN202
+            for frame in container.decode(stream):
+                yield from resampler.resample(frame)
+            yield from resampler.resample(None)  # Flush whatever the resampler still holds
+
+        filled = 0
+        for resampled in resampled_frames():
+            chunk = resampled.to_ndarray().reshape(-1)
+            if filled + len(chunk) > len(buffer):
+                buffer = np.resize(buffer, max(2 * len(buffer), filled + len(chunk)))
+            buffer[filled : filled + len(chunk)] = chunk
+            filled += len(chunk)
+    return buffer[:filled]
+
+
+def decode_pydub(data: bytes) -> np.ndarray:
+    """Original ffmpeg-subprocess path, kept as a fallback for files PyAV cannot read."""
+    audio_segment = AudioSegment.from_file(BytesIO(data))
+    audio_segment = audio_segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return np.array(audio_segment.get_array_of_samples(), dtype=np.float32) / 32768
+
+
+def decode(data: bytes, content_type: str | None) -> np.ndarray:
+    """Return the upload as 16 kHz mono float32 samples in [-1, 1].
+
+    Raises:
+        UnsupportedAudioError: If raw PCM is not 16 kHz mono.
+
+    """
+    mime, options = parse_content_type(content_type)
+    if mime in ("audio/pcm", "audio/l16"):
+        return decode_raw(data, mime, options)
+
+    if data[:4] == b"RIFF":
+        samples = decode_wav(data)
+        if samples is not None:
+            return samples
+
+    try:
+        return decode_av(data)
+    except (av.error.FFmpegError, IndexError):
+        return decode_pydub(data)
+
+
+def synthetic_wav(seconds: float) -> bytes:
+    """A speech-like 16 kHz mono WAV (voiced harmonics in syllable-length bursts), for warm-up."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 20))
+    syllables = np.clip(np.sin(2 * np.pi * 3 * t), 0, None)
+    samples = (0.1 * voice * syllables * 32767).astype("<i2")
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
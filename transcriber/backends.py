@@ -0,0 +1,118 @@
+"""Inference backends: the engines a model tier can be run on.
+
+Every backend loads one model tier and transcribes 16 kHz float32 samples with the
+decoding options of `decoding.py`, returning a `decoding.Decoded`. The rest of the
+transcriber only sees this interface, so the engine is a config choice:
+
+- `torch`: the reference openai-whisper implementation, optionally with int8 dynamic
+  quantization of its Linear layers.
+- `ctranslate2`: the same weights converted for CTranslate2 (through faster-whisper),
+  an inference engine with int8 CPU kernels and a lighter decoding loop. Optional,
+  install with `uv sync --extra ctranslate2`.
+"""
+import abc
+
+import numpy as np
+import torch
+import whisper
+
+import decoding
+
+
+class CannotLoadModelError(Exception):
+    """CannotLoadModelError occurs when you are facing issues while loading a model."""
+
+
+class InferenceBackend(abc.ABC):
+    """One model tier loaded on one engine."""
+
+    name = "base"
+
+    def __init__(self, tier: str, device: str = "cpu", *, quantized: bool = False, threads: int = 0) -> None:
+        """Load `tier` on `device`, int8-quantized if `quantized`, with `threads` CPU threads (0: the default)."""
+        self.tier = tier
+        self.device = device
+        self.quantized = quantized
+        self.threads = threads
+
+    @abc.abstractmethod
+    def transcribe(self, samples: np.ndarray, options: dict) -> decoding.Decoded:
+        """Transcribe `samples` with the options of a decoding mode."""
+
+
+def quantize(model: whisper.Whisper) -> whisper.Whisper:
+    """Quantize the Linear layers of `model` to int8 for CPU inference."""
+    # Whisper subclasses nn.Linear only to cast weights to the input dtype, which is a no-op
+    # in float32. quantize_dynamic matches exact types, so turn them back into nn.Linear.
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class WhisperTorch(InferenceBackend):
+    """The openai-whisper PyTorch model."""
+
+    name = "torch"
+
+    def __init__(self, tier: str, device: str = "cpu", *, quantized: bool = False, threads: int = 0) -> None:
+        """Load `tier` with openai-whisper. Dynamic quantization only has CPU kernels."""
+        super().__init__(tier, device, quantized=quantized and device == "cpu", threads=threads)
+        try:
+            model = whisper.load_model(tier, device=device)
+        except (RuntimeError, OSError) as e:
+            msg = f"Could not load {tier}: {e}"
+            raise CannotLoadModelError(msg) from e
+        self.model = quantize(model) if self.quantized else model
+
+    def transcribe(self, samples: np.ndarray, options: dict) -> decoding.Decoded:
+        """Decode with openai-whisper, as the transcriber always did."""
+        return decoding.run(self.model, samples, options)
+
+
+class CTranslate2(InferenceBackend):
+    """The same model tier converted for CTranslate2, run through faster-whisper."""
+
+    name = "ctranslate2"
+
+    def __init__(self, tier: str, device: str = "cpu", *, quantized: bool = False, threads: int = 0) -> None:
+        """Load `tier` with faster-whisper, int8 or at the device's native precision."""
+        super().__init__(tier, device, quantized=quantized, threads=threads)
+        try:
+            from faster_whisper import WhisperModel  # noqa: PLC0415 - optional dependency, loaded on use
+        except ImportError as e:
+            msg = "The ctranslate2 backend needs faster-whisper (uv sync --extra ctranslate2)"
+            raise CannotLoadModelError(msg) from e
+
+        compute_type = "int8" if quantized else ("float16" if device == "cuda" else "float32")
+        try:
+            self.model = WhisperModel(tier, device=device, compute_type=compute_type, cpu_threads=threads)
+        except (RuntimeError, OSError, ValueError) as e:
+            msg = f"Could not load {tier}: {e}"
+            raise CannotLoadModelError(msg) from e
+
+    def transcribe(self, samples: np.ndarray, options: dict) -> decoding.Decoded:
+        """Decode greedily with faster-whisper, mapping the command-mode options onto its arguments."""
+        command_mode = options.get("mode") == "command"
+        segments, _ = self.model.transcribe(
+            samples,
+            language="en",
+            beam_size=1,  # Greedy, as openai-whisper does at temperature 0
+            temperature=0,
+            condition_on_previous_text=False,
+            word_timestamps=options["word_timestamps"],
+            initial_prompt=options["prompt"] if command_mode else None,
+            without_timestamps=command_mode and not options["word_timestamps"],
+            max_new_tokens=options["max_tokens"] if command_mode else None,
+        )
+        segments = list(segments)  # Decoding happens lazily while iterating
+        return decoding.from_transcribe({
+            "text": "".join(segment.text for segment in segments),
+            "segments": [
+                {"tokens": segment.tokens, "avg_logprob": segment.avg_logprob, "no_speech_prob": segment.no_speech_prob}
+                for segment in segments
+            ],
+        })
+
+
+BACKENDS: dict[str, type[InferenceBackend]] = {backend.name: backend for backend in (WhisperTorch, CTranslate2)}
@@ -0,0 +1,119 @@
+"""Transcription cache keyed by the content of the decoded audio.
+
+Identical recordings (client retries, replayed test audio) decode to identical 16 kHz
+float32 samples, so a hash of those samples plus the model and decoding options
+identifies a transcription. Entries live in a bounded in-memory LRU; entries evicted
+from it can optionally be spilled to disk and are promoted back on their next hit.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class TranscriptionCache:
+    """Bounded LRU of transcription results with optional on-disk spillover."""
+
+    def __init__(self, max_entries: int, spill_dir: str = "", spill_max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_entries = spill_max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0, "spilled": 0}
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(samples: np.ndarray, model: str, options: dict) -> str:
+        """Hash the samples together with everything else that changes the transcription."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(model.encode())
+        digest.update(json.dumps(options, sort_keys=True).encode())
+        digest.update(np.ascontiguousarray(samples, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """Return the cached result for `key`, looking on disk if it is not in memory."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+
+        entry = self._read_spilled(key)
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self.put(key, entry)
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """Store a result, evicting (and possibly spilling) the least recently used ones."""
+        evicted = []
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+                self.stats["evictions"] += 1
+        for old_key, old_entry in evicted:
+            self._spill(old_key, old_entry)
+
+    def bypass(self) -> None:
+        """Count a request that skipped the cache on purpose."""
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def _read_spilled(self, key: str) -> dict | None:
+        if self.spill_dir is None:
+            return None
+        path = self.spill_dir / f"{key}.json"
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError):
+            return None
+        path.unlink(missing_ok=True)  # It moves back into memory
+        return entry
+
+    def _spill(self, key: str, entry: dict) -> None:
+        if self.spill_dir is None:
+            return
+        try:
+            (self.spill_dir / f"{key}.json").write_text(json.dumps(entry))
+        except OSError:
+            return
+        with self._lock:
+            self.stats["spilled"] += 1
+            prune = self.stats["spilled"] % 64 == 0
+        if prune:
+            self._prune_spilled()
+
+    def _prune_spilled(self) -> None:
+        """Keep at most `spill_max_entries` files on disk, dropping the oldest first."""
+        def mtime(path: Path) -> float:
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0.0  # Already removed by a concurrent read
+
+        files = sorted(self.spill_dir.glob("*.json"), key=mtime)
+        for path in files[: max(len(files) - self.spill_max_entries, 0)]:
+            path.unlink(missing_ok=True)
+
+    def snapshot(self) -> dict:
+        """Return the counters plus current sizes and hit rate."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["spill_dir"] = str(self.spill_dir) if self.spill_dir else None
+        return stats
@@ -0,0 +1,64 @@
+"""Split long recordings at pauses and stitch the chunk transcriptions back together.
+
+Long dictations are cut into chunks that each fit one Whisper window, so the chunks can
+be transcribed in parallel on separate inference workers. Cuts are placed at the quietest
+point near the target length (a pause between words, ideally), and neighbouring chunks
+overlap slightly so a word spoken across the cut is heard whole by at least one of them.
+Words transcribed twice at an overlap are removed when stitching.
+"""
+import re
+from itertools import pairwise
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME = 160  # 10 ms energy frames
+SMOOTHING = 10  # Frames, a single quiet frame inside a word is not a pause
+SEARCH_SECONDS = 3  # How far before the target length a cut may be placed
+MIN_CHUNK_SECONDS = 10  # Whisper pads every chunk to 30 s, much shorter chunks waste the encoder
+
+
+def frame_energy(samples: np.ndarray) -> np.ndarray:
+    """Mean power per 10 ms frame, smoothed over 100 ms."""
+    n_frames = len(samples) // FRAME
+    energy = np.square(samples[: n_frames * FRAME].reshape(n_frames, FRAME)).mean(axis=1)
+    return np.convolve(energy, np.ones(SMOOTHING) / SMOOTHING, mode="same")
+
+
+def split(samples: np.ndarray, chunk_seconds: float, overlap_seconds: float) -> list[np.ndarray]:
+    """Cut `samples` into chunks of at most `chunk_seconds` plus the overlap, at quiet points."""
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    if len(samples) <= chunk:
+        return [samples]
+
+    energy = frame_energy(samples)
+    search = int(SEARCH_SECONDS * SAMPLE_RATE)
+    cuts = [0]
+    while len(samples) - cuts[-1] > chunk:
+        # Quietest frame in the last few seconds before the target length
+        lo = (cuts[-1] + max(chunk - search, chunk // 2)) // FRAME
+        hi = (cuts[-1] + chunk) // FRAME
+        cuts.append(int(lo + np.argmin(energy[lo:hi])) * FRAME)
+    cuts.append(len(samples))
+
+    half = int(overlap_seconds * SAMPLE_RATE) // 2
+    return [samples[max(start - half, 0) : end + half] for start, end in pairwise(cuts)]
+
+
+def _normalise(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def stitch(texts: list[str], max_overlap_words: int = 8) -> str:
+    """Join chunk transcriptions, dropping words repeated across each overlap."""
+    words: list[str] = []
+    for text in texts:
+        new = text.split()
+        repeated = 0
+        # Longest run of words ending the text so far that also starts this chunk
+        for n in range(min(max_overlap_words, len(words), len(new)), 0, -1):
+            if [_normalise(w) for w in words[-n:]] == [_normalise(w) for w in new[:n]]:
+                repeated = n
+                break
+        words += new[repeated:]
+    return " ".join(words)
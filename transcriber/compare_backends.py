@@ -0,0 +1,178 @@
+"""Compare inference backends on the same audio: latency, memory and transcript differences.
+
+Each backend runs in its own process so its memory use is measured without the other
+engine loaded. The first backend is the reference the transcripts are compared against.
+
+    uv run compare_backends.py                                # benchmark corpus, torch vs ctranslate2
+    uv run compare_backends.py recording.webm --model base.en --repeats 5
+"""
+import argparse
+import json
+import multiprocessing
+import re
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import toml
+import yaml
+
+import decoding
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "corpus"
+
+
+def rss_mb() -> tuple[float, float]:
+    """Current and peak resident memory of this process, in MB."""
+    try:
+        status = dict(line.split(":", 1) for line in Path("/proc/self/status").read_text().splitlines())
+        return int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kB on Linux
+        return peak, peak
+
+
+def corpus_files() -> list[Path]:
+    """Recordings listed in the benchmark corpus manifest that exist on disk."""
+    manifest = yaml.safe_load((CORPUS_DIR / "manifest.yaml").read_text()) or []
+    return [CORPUS_DIR / entry["file"] for entry in manifest if (CORPUS_DIR / entry["file"]).exists()]
+
+
+def transcribe_options(config: dict) -> dict:
+    """The decoding options the transcriber uses with this config."""
+    yaml_commands = yaml.safe_load(Path("commands.yaml").read_text()) or []
+    command_list = [
+        (queries, cmd)
+        for category_dict in yaml_commands
+        for command_dict in category_dict.values()
+        for cmd, queries in command_dict.items()
+    ]
+    return decoding.decoding_options(
+        config["decoding"].get("mode", "command"),
+        prompt=decoding.command_prompt(command_list),
+        max_tokens=config["decoding"].get("max_tokens", 64),
+        word_timestamps=config["decoding"].get("word_timestamps", False),
+    )
+
+
+def run_backend(backend: str, settings: dict, files: list[str]) -> dict:
+    """Load one backend and transcribe every file `repeats` times (runs in a child process)."""
+    from audio import decode
+    from backends import CannotLoadModelError
+    from model_tiers import ModelRegistry
+
+    audio = {path: decode(Path(path).read_bytes(), None) for path in files}
+    base_rss, _ = rss_mb()
+
+    start = time.perf_counter()
+    try:
+        quantized, threads = settings["quantize"], settings["threads"]
+        registry = ModelRegistry(backend, settings["device"], quantized=quantized, threads=threads)
+        model = registry.get(settings["model"])
+    except CannotLoadModelError as e:
+        return {"backend": backend, "error": str(e)}
+    load_seconds = time.perf_counter() - start
+    loaded_rss, _ = rss_mb()
+
+    model.transcribe(next(iter(audio.values())), settings["options"])  # Untimed warm-up
+    latencies, transcripts = [], {}
+    for _ in range(settings["repeats"]):
+        for path, samples in audio.items():
+            start = time.perf_counter()
+            transcripts[path] = model.transcribe(samples, settings["options"]).text.strip()
+            latencies.append(time.perf_counter() - start)
+    ordered = sorted(latencies)
+    _, peak_rss = rss_mb()
+    return {
+        "backend": backend,
+        "quantized": model.quantized,
+        "load_s": round(load_seconds, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+        "model_mb": round(loaded_rss - base_rss, 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "transcripts": transcripts,
+    }
+
+
+def words(text: str) -> list[str]:
+    return re.sub(r"[^a-z0-9' ]", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the length of the reference."""
+    ref, hyp = words(reference), words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(len(ref), 1)
+
+
+def main() -> None:
+    config = toml.load("config.toml")
+    parser = argparse.ArgumentParser(description="Compare inference backends on the same audio")
+    parser.add_argument("files", nargs="*", type=Path, help="recordings (default: the benchmark corpus)")
+    parser.add_argument("--backends", nargs="+", default=["torch", "ctranslate2"])
+    parser.add_argument("--model", default=config["model"].get("name", "base.en"))
+    parser.add_argument("--device", default=config["model"].get("device", "cpu"))
+    parser.add_argument("--quantize", action=argparse.BooleanOptionalAction, default=config["model"].get("quantize"))
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads per backend, 0 for the engine default")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None, help="where to write the JSON results")
+    args = parser.parse_args()
+
+    files = [str(path) for path in (args.files or corpus_files())]
+    if not files:
+        sys.exit(f"No recordings given and none found in {CORPUS_DIR}")
+
+    settings = {
+        "model": args.model,
+        "device": args.device,
+        "quantize": bool(args.quantize),
+        "threads": args.threads,
+        "repeats": args.repeats,
+        "options": transcribe_options(config),
+    }
+    # A fresh interpreter per backend, so neither engine's memory counts against the other
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in args.backends:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_backend, (backend, settings, files)))
+
+    print(f"\n📊 {len(files)} recordings x {args.repeats} repeats, model {args.model}, "
+          f"{settings['options'].get('mode', 'open')} decoding")
+    print(f"{'Backend':<12} | {'load s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'model MB':>8} | {'peak MB':>8} | WER")
+    print("-" * 78)
+    reference = next((r for r in results if "error" not in r), None)
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<12} | ❌ {result['error']}")
+            continue
+        wer = statistics.fmean(
+            word_error_rate(reference["transcripts"][path], result["transcripts"][path]) for path in files
+        )
+        result["wer_vs_reference"] = round(wer, 4)
+        print(f"{result['backend']:<12} | {result['load_s']:>7.2f} | {result['p50_ms']:>8.1f} | "
+              f"{result['p95_ms']:>8.1f} | {result['model_mb']:>8.1f} | {result['peak_rss_mb']:>8.1f} | {wer:.3f}")
+
+    for path in files:
+        texts = {r["backend"]: r["transcripts"][path] for r in results if "error" not in r}
+        if len(set(texts.values())) > 1:
+            print(f"\n🔀 {Path(path).name}")
+            for backend, text in texts.items():
+                print(f"   {backend:<12} {text}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"settings": {**settings, "files": files}, "results": results}, indent=2))
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Whisper decoding modes.
+
+`open` is the original setting: `MODEL.transcribe` over the whole recording with word
+timestamps. `command` is tuned for what `commands()` actually needs:
+
+- the command phrases from commands.yaml are passed as the decoder prompt, biasing it
+  towards the vocabulary we match against;
+- recordings that fit in one 30 s window (every spoken command) are decoded with a single
+  `whisper.decode` call, skipping the sliding-window loop of `transcribe`;
+- timestamp tokens and word alignment are skipped unless word timestamps are asked for;
+- decoding stops after `max_tokens` tokens, enough for a few commands plus a search tail.
+
+Both modes report Whisper's own confidence (average token log-probability and the
+probability that there was no speech), used to decide whether to retry with a larger model.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import whisper
+from whisper.audio import N_SAMPLES
+
+MODES = ("command", "open")
+
+OPEN_OPTIONS = {
+    "temperature": 0,
+    "condition_on_previous_text": False,
+    "word_timestamps": True,
+}
+
+
+class Decoded(NamedTuple):
+    """Transcription text with the confidence Whisper assigned to it."""
+
+    text: str
+    avg_logprob: float
+    no_speech_prob: float
+
+
+def from_transcribe(result: dict) -> Decoded:
+    """Combine the per-segment confidences of `model.transcribe`, weighted by token count."""
+    segments = result["segments"]
+    tokens = sum(len(segment["tokens"]) for segment in segments)
+    if not tokens:
+        return Decoded(result["text"], 0.0, 1.0)
+    avg_logprob = sum(segment["avg_logprob"] * len(segment["tokens"]) for segment in segments) / tokens
+    return Decoded(result["text"], avg_logprob, min(segment["no_speech_prob"] for segment in segments))
+
+
+def command_prompt(command_list: list[tuple[list[str], str]]) -> str:
+    """Build the decoder prompt from the command phrases, each phrase once."""
+    phrases = dict.fromkeys(query.lower() for queries, _ in command_list for query in queries)
+    return ", ".join(phrases) + "."
+
+
+def decoding_options(mode: str, prompt: str, max_tokens: int, word_timestamps: bool) -> dict:
+    """Return the options that define a mode, used both to decode and in the cache key."""
+    if mode == "open":
+        return dict(OPEN_OPTIONS)
+    return {
+        "mode": "command",
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "word_timestamps": word_timestamps,
+    }
+
+
+def run(model: whisper.Whisper, samples: np.ndarray, options: dict) -> Decoded:
+    """Transcribe `samples` (16 kHz mono float32) with the given decoding options."""
+    if options.get("mode") != "command":
+        return from_transcribe(model.transcribe(samples, **options))
+
+    if options["word_timestamps"] or len(samples) > N_SAMPLES:
+        # Word alignment and long recordings need the full transcribe loop, still primed
+        return from_transcribe(model.transcribe(
+            samples,
+            temperature=0,
+            condition_on_previous_text=False,
+            word_timestamps=options["word_timestamps"],
+            initial_prompt=options["prompt"],
+        ))
+
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), model.dims.n_mels).to(model.device)
+    result = whisper.decode(
+        model,
+        mel,
+        whisper.DecodingOptions(
+            language="en",
+            temperature=0,
+            without_timestamps=True,
+            sample_len=options["max_tokens"],
+            prompt=options["prompt"],
+            fp16=model.device.type != "cpu",
+        ),
+    )
+    return Decoded(result.text, result.avg_logprob, result.no_speech_prob)
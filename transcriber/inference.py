@@ -0,0 +1,189 @@
+"""Bounded inference pool with admission control.
+
+Whisper inference is CPU-bound and blocks whatever thread runs it, so it runs on a
+small thread pool instead of the event loop. Each worker owns a model replica (Whisper
+installs per-call hooks on the model, so one model cannot decode two requests at once).
+Requests wait for a free replica in a bounded queue; when the queue is full, or a request
+has waited longer than `max_wait`, it is turned away with a Retry-After hint instead of
+piling up latency for everyone behind it. A request made of several calls, like the chunks
+of a long recording, is admitted once as a whole (`run_all()`).
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from voicecontrol_common.metrics import Counter, Gauge, Histogram
+
+QUEUE_DEPTH = Gauge("transcriber_queue_depth", "Requests waiting for an inference worker.")
+BUSY_WORKERS = Gauge("transcriber_busy_workers", "Inference workers currently running a request.")
+QUEUE_WAIT = Histogram("transcriber_queue_wait_seconds", "Time requests waited for an inference worker.")
+REJECTED = Counter(
+    "transcriber_rejected_total",
+    "Requests turned away by admission control: queue_full (429) or wait_timeout (503).",
+    ("reason",),
+)
+
+
+class OverloadedError(Exception):
+    """OverloadedError occurs when a request cannot be admitted to the inference pool."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int) -> None:
+        super().__init__(f"Transcriber overloaded ({reason}), retry after {retry_after} s.")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """Run blocking inference on one of `replicas`, each used by one request at a time."""
+
+    def __init__(self, replicas: list, max_queue: int, max_wait: float) -> None:
+        self.replicas = replicas
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.busy = 0
+        # Moving average of how long a request holds a replica, for Retry-After
+        self.average_seconds = 1.0
+        self._executor = ThreadPoolExecutor(max_workers=len(replicas), thread_name_prefix="inference")
+        self._free: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        return max(1, math.ceil((self.waiting + 1) * self.average_seconds / len(self.replicas)))
+
+    def _overloaded(self, status_code: int, reason: str) -> OverloadedError:
+        REJECTED.inc(reason=reason)
+        return OverloadedError(status_code, reason, self.retry_after())
+
+    async def _acquire(self, *, limited: bool = True) -> tuple[Any, float]:
+        """Wait for a free replica; return it and how long that took.
+
+        Raises:
+            OverloadedError: If `limited` and the queue is full (429) or no replica freed up within `max_wait` (503).
+
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Created lazily so it belongs to the running event loop. A warm standby warms up
+            # in a loop of its own before serving; the pool is idle when the server's loop takes over.
+            self._free = asyncio.Queue()
+            self._loop = loop
+            for replica in self.replicas:
+                self._free.put_nowait(replica)
+
+        if limited and self._free.empty() and self.waiting >= self.max_queue:
+            raise self._overloaded(429, "queue_full")
+
+        self.waiting += 1
+        QUEUE_DEPTH.set(self.waiting)
+        start = time.perf_counter()
+        try:
+            if limited:
+                replica = await asyncio.wait_for(self._free.get(), timeout=self.max_wait)
+            else:
+                replica = await self._free.get()
+        except TimeoutError:
+            raise self._overloaded(503, "wait_timeout") from None
+        finally:
+            self.waiting -= 1
+            QUEUE_DEPTH.set(self.waiting)
+        waited = time.perf_counter() - start
+        QUEUE_WAIT.observe(waited)
+        return replica, waited
+
+    async def _call(self, fn: Callable[..., Any], replica: Any, *args: Any) -> Any:
+        """Call `fn(replica, *args)` on a worker thread and hand the replica back afterwards."""
+        self.busy += 1
+        BUSY_WORKERS.set(self.busy)
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Carry the request context (request ID for spans) over to the worker thread
+        future = self._executor.submit(contextvars.copy_context().run, fn, replica, *args)
+        # Hand the replica back when the thread is done, not when the request is: a client
+        # that disconnects cancels the request while the thread is still using the model
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, replica, started))
+        return await asyncio.wrap_future(future)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> tuple[Any, float]:
+        """Call `fn(replica, *args)` on a worker thread; return its result and the queue wait.
+
+        Raises:
+            OverloadedError: If the queue is full (429) or no replica freed up within `max_wait` (503).
+
+        """
+        replica, waited = await self._acquire()
+        return await self._call(fn, replica, *args), waited
+
+    async def run_each(self, fn: Callable[..., Any], *args: Any) -> list:
+        """Call `fn(replica, *args)` once on every replica, e.g. to warm them up.
+
+        Waits until it holds all replicas, so no request runs on one of them meanwhile.
+        """
+        held = [(await self._acquire(limited=False))[0] for _ in self.replicas]
+        return await asyncio.gather(*(self._call(fn, replica, *args) for replica in held))
+
+    async def run_all(self, fn: Callable[..., Any], calls: list[tuple]) -> tuple[list, float]:
+        """Call `fn(replica, *args)` for every `args` of `calls` as one request, in parallel.
+
+        The request is admitted once, with its first call: only that one can be turned away.
+        The other calls then wait for free replicas without the queue limits, so a long
+        recording is not rejected halfway through. If a call fails, the calls that have not
+        finished are cancelled; those already on a worker thread run to completion.
+
+        Returns:
+            The results in the order of `calls`, and the wait for admission.
+
+        Raises:
+            OverloadedError: If the request is not admitted (429 or 503).
+
+        """
+        replica, waited = await self._acquire()
+        # Set by the worker thread itself, before its replica is handed back to a waiting call
+        failed = threading.Event()
+
+        def call(replica: Any, *args: Any) -> Any:
+            try:
+                return fn(replica, *args)
+            except BaseException:
+                failed.set()
+                raise
+
+        async def call_when_free(args: tuple) -> Any:
+            next_replica, _ = await self._acquire(limited=False)
+            if failed.is_set():  # Another call failed, the request is over: its error is what gather() raises
+                self._free.put_nowait(next_replica)
+                return None
+            return await self._call(call, next_replica, *args)
+
+        tasks = [asyncio.ensure_future(self._call(call, replica, *calls[0]))]
+        tasks += [asyncio.ensure_future(call_when_free(args)) for args in calls[1:]]
+        try:
+            return await asyncio.gather(*tasks), waited
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def _release(self, replica: Any, started: float) -> None:
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.perf_counter() - started)
+        self.busy -= 1
+        BUSY_WORKERS.set(self.busy)
+        self._free.put_nowait(replica)
+
+    def snapshot(self) -> dict:
+        """Return current load, for the status endpoint."""
+        return {
+            "workers": len(self.replicas),
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "average_seconds": round(self.average_seconds, 3),
+        }
@@ -0,0 +1,173 @@
+"""Keyword-spotting gate in front of Whisper.
+
+Accidental clicks, silence and background noise are rejected before they reach the
+model. The gate works on the decoded 16 kHz samples in two steps, both pure NumPy:
+
+1. An energy-based voice activity check: audio without at least `min_speech_ms` of
+   frames clearly above the noise floor, mostly in the speech band, is rejected. The
+   floor is absolute (`noise_floor_db`, or the one `train_kws.py` calibrated from real
+   recordings), not estimated per clip: a recording that is speech from start to end
+   has no quiet frames to estimate it from.
+2. If a classifier has been trained on recordings of the command vocabulary
+   (`train_kws.py`), a logistic regression over log-mel statistics of the voiced frames
+   scores how command-like the audio is, and audio scoring below `threshold` is rejected.
+
+Both steps take a few milliseconds for a typical recording.
+"""
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME = 400  # 25 ms
+HOP = 160  # 10 ms
+N_FFT = 512
+N_MELS = 40
+SPEECH_BAND = (100, 4000)  # Hz, voiced speech including its fundamental
+
+# Background noise of a typical microphone in a quiet room, in dB relative to full scale
+NOISE_FLOOR_DB = -60
+# A frame is voiced when it is this far above the noise floor
+VOICED_MARGIN_DB = 12
+
+# Only the start of a recording is looked at, commands are short
+MAX_SECONDS = 15
+
+
+def mel_filters(n_mels: int = N_MELS, n_fft: int = N_FFT, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Triangular mel filterbank of shape (n_mels, n_fft // 2 + 1)."""
+    def hz_to_mel(hz: np.ndarray) -> np.ndarray:
+        return 2595 * np.log10(1 + hz / 700)
+
+    def mel_to_hz(mel: np.ndarray) -> np.ndarray:
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    edges = mel_to_hz(np.linspace(hz_to_mel(np.array(0.0)), hz_to_mel(np.array(sample_rate / 2)), n_mels + 2))
+    bins = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    lower, centre, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (centre - lower)
+    falling = (upper - bins) / (upper - centre)
+    return np.maximum(0, np.minimum(rising, falling)).astype(np.float32)
+
+
+MEL_FILTERS = mel_filters()
+WINDOW = np.hanning(FRAME).astype(np.float32)
+BINS = np.fft.rfftfreq(N_FFT, 1 / SAMPLE_RATE)
+SPEECH_BINS = (BINS >= SPEECH_BAND[0]) & (BINS <= SPEECH_BAND[1])
+N_FEATURES = 2 * N_MELS + 3
+
+
+class Features(NamedTuple):
+    """What the gate extracts from one recording."""
+
+    vector: np.ndarray  # Classifier input, N_FEATURES values
+    voiced_seconds: float
+
+
+def frame_power(samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Power spectrum and energy in dB of every frame of `samples` (at least FRAME long)."""
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::HOP] * WINDOW
+    power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2
+    energy_db = 10 * np.log10((power.sum(axis=1) + 1e-10) / (FRAME * FRAME))
+    return power, energy_db
+
+
+def quiet_level(samples: np.ndarray) -> float | None:
+    """Energy in dB of the quietest tenth of the frames: the background noise, if the recording has pauses."""
+    samples = samples[: MAX_SECONDS * SAMPLE_RATE]
+    if len(samples) < FRAME:
+        return None
+    return float(np.percentile(frame_power(samples)[1], 10))
+
+
+def extract(samples: np.ndarray, noise_floor_db: float = NOISE_FLOOR_DB) -> Features:
+    """Compute log-mel statistics over the voiced frames of `samples`."""
+    samples = samples[: MAX_SECONDS * SAMPLE_RATE]
+    if len(samples) < FRAME:
+        return Features(np.zeros(N_FEATURES, dtype=np.float32), 0.0)
+
+    power, energy_db = frame_power(samples)
+    log_mel = np.log10(power @ MEL_FILTERS.T + 1e-10)
+    speech_ratio = power[:, SPEECH_BINS].sum(axis=1) / (power.sum(axis=1) + 1e-10)
+
+    voiced = (energy_db > noise_floor_db + VOICED_MARGIN_DB) & (speech_ratio > 0.5)
+    voiced_seconds = float(voiced.sum() * HOP / SAMPLE_RATE)
+    if not voiced.any():
+        return Features(np.zeros(N_FEATURES, dtype=np.float32), 0.0)
+
+    speech = log_mel[voiced]
+    vector = np.concatenate([
+        speech.mean(axis=0),
+        speech.std(axis=0),
+        [voiced_seconds, voiced.mean(), speech_ratio[voiced].mean()],
+    ]).astype(np.float32)
+    return Features(vector, voiced_seconds)
+
+
+class Verdict(NamedTuple):
+    """Whether to hand the audio to Whisper, and why."""
+
+    accepted: bool
+    score: float
+    reason: str
+
+
+class KeywordSpotter:
+    """Energy gate plus an optional logistic-regression classifier loaded from an .npz file.
+
+    A noise floor calibrated by train_kws.py and saved with the classifier replaces `noise_floor_db`.
+    """
+
+    def __init__(
+        self,
+        model_path: str = "",
+        threshold: float = 0.5,
+        min_speech_ms: float = 250,
+        noise_floor_db: float = NOISE_FLOOR_DB,
+    ) -> None:
+        self.threshold = threshold
+        self.min_speech = min_speech_ms / 1000
+        self.noise_floor_db = noise_floor_db
+        self.classifier = None
+        if model_path and Path(model_path).exists():
+            with np.load(model_path) as data:
+                self.classifier = {name: data[name] for name in ("mean", "std", "weights", "bias")}
+                if "noise_floor_db" in data.files:
+                    self.noise_floor_db = float(data["noise_floor_db"])
+        self._lock = threading.Lock()
+        self.stats = {"accepted": 0, "no_speech": 0, "low_score": 0}
+
+    def score(self, vector: np.ndarray) -> float:
+        """Probability that `vector` comes from a spoken command."""
+        if self.classifier is None:
+            return 1.0
+        normalised = (vector - self.classifier["mean"]) / self.classifier["std"]
+        logit = float(normalised @ self.classifier["weights"] + self.classifier["bias"])
+        return float(1 / (1 + np.exp(-logit)))
+
+    def check(self, samples: np.ndarray, record: bool = True) -> Verdict:
+        """Decide whether `samples` is likely to contain a command, counting the verdict if `record`."""
+        features = extract(samples, self.noise_floor_db)
+        if features.voiced_seconds < self.min_speech:
+            verdict = Verdict(False, 0.0, "no_speech")
+        else:
+            score = self.score(features.vector)
+            verdict = Verdict(score >= self.threshold, score, "accepted" if score >= self.threshold else "low_score")
+        if record:
+            with self._lock:
+                self.stats[verdict.reason] += 1
+        return verdict
+
+    def snapshot(self) -> dict:
+        """Return counts per verdict and the overall rejection rate."""
+        with self._lock:
+            stats = dict(self.stats)
+        checked = stats["accepted"] + stats["no_speech"] + stats["low_score"]
+        stats["rejection_rate"] = round((checked - stats["accepted"]) / checked, 4) if checked else 0.0
+        stats["classifier"] = self.classifier is not None
+        stats["threshold"] = self.threshold
+        stats["min_speech_ms"] = self.min_speech * 1000
+        stats["noise_floor_db"] = self.noise_floor_db
+        return stats
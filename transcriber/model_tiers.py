@@ -0,0 +1,66 @@
+"""Registry of the Whisper model tiers the transcriber can serve.
+
+Smaller tiers are much faster on CPU but less accurate, so the transcriber decodes with
+a small primary tier and only escalates to a larger fallback tier when the result looks
+unreliable. Models are loaded once per tier on the configured inference backend and, on
+CPU, can run int8-quantized.
+"""
+import threading
+
+from backends import BACKENDS, CannotLoadModelError, InferenceBackend
+
+# Smallest (fastest) first
+MODEL_TIERS = ("tiny.en", "base.en", "small.en")
+
+
+class ModelRegistry:
+    """Load each tier on first use and keep it for the lifetime of the process."""
+
+    def __init__(
+        self, backend: str = "torch", device: str = "cpu", *, quantized: bool = False, threads: int = 0,
+    ) -> None:
+        """Models will be loaded on `backend`, see backends.InferenceBackend for the other arguments."""
+        if backend not in BACKENDS:
+            msg = f"Unknown inference backend {backend!r}, expected one of {tuple(BACKENDS)}."
+            raise CannotLoadModelError(msg)
+        self.backend = BACKENDS[backend]
+        self.device = device
+        self.quantized = quantized
+        self.threads = threads
+        self._models: dict[str, InferenceBackend] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> InferenceBackend:
+        """Return the model of tier `name`, loading it if needed.
+
+        Raises:
+            CannotLoadModelError: If the tier is unknown or its weights cannot be loaded.
+
+        """
+        if name not in MODEL_TIERS:
+            msg = f"Unknown model tier {name!r}, expected one of {MODEL_TIERS}."
+            raise CannotLoadModelError(msg)
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self.backend(name, self.device, quantized=self.quantized, threads=self.threads)
+            return self._models[name]
+
+    def load_first(self, names: list[str]) -> tuple[str, InferenceBackend]:
+        """Load the first tier of `names` that loads successfully.
+
+        Raises:
+            CannotLoadModelError: If none of them can be loaded.
+
+        """
+        errors = []
+        for name in names:
+            try:
+                return name, self.get(name)
+            except CannotLoadModelError as e:
+                errors.append(str(e))
+        raise CannotLoadModelError("; ".join(errors))
+
+    def loaded(self) -> list[str]:
+        """Names of the tiers currently in memory."""
+        with self._lock:
+            return list(self._models)
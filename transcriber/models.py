@@ -38,11 +38,14 @@ class FinalResponse(BaseModel):
     ----------
     response: CommandListResponse
     message: str
+    request_id: str
 
     response is CommandListResponse object
     message is a string
+    request_id correlates this transcription with the commands it triggers across services
 
     """
 
     response: CommandListResponse = Field(..., strict=True)
     message: str = Field(..., strict=True)
+    request_id: str = Field(..., strict=True)
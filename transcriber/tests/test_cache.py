@@ -0,0 +1,62 @@
+"""TranscriptionCache: LRU eviction, spilling to disk and promotion back into memory."""
+from pathlib import Path
+
+import numpy as np
+
+from cache import TranscriptionCache
+
+
+def entry(text: str) -> dict:
+    return {"message": text}
+
+
+def test_key_depends_on_samples_model_and_options() -> None:
+    samples = np.zeros(16000, dtype=np.float32)
+    key = TranscriptionCache.key(samples, "base.en", {"language": "en"})
+    assert key == TranscriptionCache.key(samples.copy(), "base.en", {"language": "en"})
+    assert key != TranscriptionCache.key(samples + 0.1, "base.en", {"language": "en"})
+    assert key != TranscriptionCache.key(samples, "tiny.en", {"language": "en"})
+    assert key != TranscriptionCache.key(samples, "base.en", {"language": "de"})
+
+
+def test_evicts_least_recently_used() -> None:
+    cache = TranscriptionCache(max_entries=2)
+    cache.put("a", entry("a"))
+    cache.put("b", entry("b"))
+    assert cache.get("a") == entry("a")  # "b" is now the least recently used
+    cache.put("c", entry("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == entry("a")
+    assert cache.get("c") == entry("c")
+    assert cache.stats["evictions"] == 1
+    assert cache.snapshot()["entries"] == 2
+
+
+def test_spills_evicted_entries_and_promotes_them_back(tmp_path: Path) -> None:
+    cache = TranscriptionCache(max_entries=1, spill_dir=str(tmp_path))
+    cache.put("a", entry("a"))
+    cache.put("b", entry("b"))
+    assert (tmp_path / "a.json").exists()
+
+    assert cache.get("a") == entry("a")
+    assert cache.stats["disk_hits"] == 1
+    assert not (tmp_path / "a.json").exists()  # Back in memory, which spilled "b"
+    assert (tmp_path / "b.json").exists()
+    assert cache.get("a") == entry("a")
+    assert cache.stats["hits"] == 1
+
+
+def test_prunes_the_oldest_spilled_entries(tmp_path: Path) -> None:
+    cache = TranscriptionCache(max_entries=1, spill_dir=str(tmp_path), spill_max_entries=10)
+    for i in range(65):  # Pruning runs every 64 spills
+        cache.put(str(i), entry(str(i)))
+    assert len(list(tmp_path.glob("*.json"))) == 10
+
+
+def test_without_spill_dir_evicted_entries_are_gone() -> None:
+    cache = TranscriptionCache(max_entries=1)
+    cache.put("a", entry("a"))
+    cache.put("b", entry("b"))
+    assert cache.get("a") is None
+    assert cache.snapshot()["hit_rate"] == 0.0
@@ -0,0 +1,51 @@
+"""Splitting long recordings at pauses and stitching the chunk transcriptions back together."""
+import numpy as np
+
+from chunking import SAMPLE_RATE, split, stitch
+
+
+def speech_with_pause_at(seconds: float, pause_at: float, pause: float = 0.5) -> np.ndarray:
+    """Loud noise standing in for speech, with a silent gap starting at `pause_at` seconds."""
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    samples[int(pause_at * SAMPLE_RATE) : int((pause_at + pause) * SAMPLE_RATE)] = 0
+    return samples
+
+
+def test_short_recording_is_one_chunk() -> None:
+    samples = np.zeros(10 * SAMPLE_RATE, dtype=np.float32)
+    chunks = split(samples, chunk_seconds=25, overlap_seconds=1)
+    assert len(chunks) == 1
+    assert chunks[0] is samples
+
+
+def test_cuts_at_the_pause_before_the_target_length() -> None:
+    samples = speech_with_pause_at(40, pause_at=23)
+    chunks = split(samples, chunk_seconds=25, overlap_seconds=0)
+    assert len(chunks) == 2
+    cut = len(chunks[0]) / SAMPLE_RATE
+    assert 23 <= cut <= 23.5
+    assert sum(len(chunk) for chunk in chunks) == len(samples)
+
+
+def test_chunks_overlap_and_stay_within_the_limit() -> None:
+    samples = speech_with_pause_at(80, pause_at=23)
+    chunks = split(samples, chunk_seconds=25, overlap_seconds=1)
+    assert len(chunks) == 4
+    assert all(len(chunk) <= 26 * SAMPLE_RATE for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) == len(samples) + 3 * SAMPLE_RATE  # Half a second each side
+
+
+def test_stitch_drops_words_repeated_across_the_overlap() -> None:
+    texts = ["open a new window and", "And search for", "search for the weather today."]
+    assert stitch(texts) == "open a new window and search for the weather today."
+
+
+def test_stitch_keeps_words_that_do_not_continue_the_previous_chunk() -> None:
+    assert stitch(["take a screenshot", "take a screenshot again"], max_overlap_words=2) == (
+        "take a screenshot take a screenshot again"
+    )
+    assert stitch(["close the window", "the browser"]) == "close the window the browser"
+
+
+def test_stitch_ignores_empty_chunks() -> None:
+    assert stitch(["", "hello world", "", "world peace"]) == "hello world peace"
@@ -0,0 +1,113 @@
+"""Train the keyword-spotting classifier used by kws.py.
+
+Positives are recordings of the command vocabulary (by default the benchmark corpus),
+negatives are recordings of anything else: background noise, music, unrelated speech.
+Synthetic clicks, hum and noise are added to the negatives so the classifier has
+something to reject even with few recordings. The result is a logistic regression stored
+as an .npz file that the transcriber loads at startup, together with the noise floor of
+the command recordings: the typical level of the pauses around the commands, so the
+energy gate matches the microphone and room they were recorded with.
+
+    uv run train_kws.py --negative ~/recordings/noise --output kws_model.npz
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from audio import decode
+from kws import NOISE_FLOOR_DB, SAMPLE_RATE, KeywordSpotter, extract, quiet_level
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "corpus"
+AUDIO_SUFFIXES = {".webm", ".wav", ".ogg", ".mp3", ".m4a", ".flac"}
+DIGITAL_SILENCE_DB = -100
+
+
+def corpus_files() -> list[Path]:
+    """Recordings listed in the benchmark corpus manifest that exist on disk."""
+    manifest = yaml.safe_load((CORPUS_DIR / "manifest.yaml").read_text()) or []
+    return [CORPUS_DIR / entry["file"] for entry in manifest if (CORPUS_DIR / entry["file"]).exists()]
+
+
+def audio_files(directory: Path | None) -> list[Path]:
+    if directory is None:
+        return []
+    return sorted(path for path in directory.rglob("*") if path.suffix.lower() in AUDIO_SUFFIXES)
+
+
+def synthetic_negatives(count: int, seed: int = 0) -> list[np.ndarray]:
+    """Clicks, mains hum and noise bursts, the things that trigger accidental recordings."""
+    rng = np.random.default_rng(seed)
+    negatives = []
+    for i in range(count):
+        seconds = rng.uniform(0.5, 4)
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        samples = rng.normal(0, rng.uniform(0.0005, 0.01), len(t))
+        kind = i % 3
+        if kind == 0:  # Clicks
+            for start in rng.integers(0, len(t) - 200, size=rng.integers(1, 4)):
+                samples[start : start + rng.integers(20, 200)] += rng.uniform(0.3, 0.9)
+        elif kind == 1:  # Hum with harmonics
+            base = rng.choice([50, 60])
+            samples += sum(rng.uniform(0.02, 0.2) / k * np.sin(2 * np.pi * base * k * t) for k in range(1, 6))
+        else:  # Noise burst, e.g. a fan or a knock
+            start, length = rng.integers(0, len(t) // 2), rng.integers(len(t) // 8, len(t) // 2)
+            samples[start : start + length] += rng.normal(0, rng.uniform(0.05, 0.3), min(length, len(t) - start))
+        negatives.append(samples.astype(np.float32))
+    return negatives
+
+
+def fit(x: np.ndarray, y: np.ndarray, epochs: int = 2000, learning_rate: float = 0.1, l2: float = 1e-2) -> dict:
+    """Logistic regression by full-batch gradient descent on standardised features."""
+    mean, std = x.mean(axis=0), x.std(axis=0) + 1e-6
+    z = (x - mean) / std
+    weights, bias = np.zeros(z.shape[1]), 0.0
+    # Weight the classes equally, there are usually far more negatives
+    sample_weight = np.where(y == 1, 0.5 / max(y.sum(), 1), 0.5 / max((1 - y).sum(), 1))
+    for _ in range(epochs):
+        p = 1 / (1 + np.exp(-(z @ weights + bias)))
+        error = (p - y) * sample_weight
+        weights -= learning_rate * (z.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum()
+    return {"mean": mean, "std": std, "weights": weights, "bias": np.array(bias)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the keyword-spotting classifier")
+    parser.add_argument("--positive", type=Path, default=None, help="directory of extra command recordings")
+    parser.add_argument("--negative", type=Path, default=None, help="directory of non-command recordings")
+    parser.add_argument("--synthetic", type=int, default=60, help="number of synthetic negatives to add")
+    parser.add_argument("--threshold", type=float, default=0.5, help="threshold to report error rates at")
+    parser.add_argument("--output", type=Path, default=Path("kws_model.npz"))
+    args = parser.parse_args()
+
+    positives = [decode(path.read_bytes(), None) for path in corpus_files() + audio_files(args.positive)]
+    negatives = [decode(path.read_bytes(), None) for path in audio_files(args.negative)]
+    negatives += synthetic_negatives(args.synthetic)
+    if not positives:
+        sys.exit(f"No command recordings found, add some to {CORPUS_DIR} or pass --positive")
+
+    # The median over recordings, so a few recordings without pauses do not raise the floor.
+    # Digital silence (e.g. the generated corpus) says nothing about a microphone, skip it.
+    levels = [level for level in map(quiet_level, positives) if level is not None and level > DIGITAL_SILENCE_DB]
+    noise_floor_db = float(np.median(levels)) if levels else NOISE_FLOOR_DB
+
+    x = np.stack([extract(samples, noise_floor_db).vector for samples in positives + negatives])
+    y = np.array([1.0] * len(positives) + [0.0] * len(negatives))
+    classifier = fit(x, y)
+    np.savez(args.output, **classifier, noise_floor_db=np.array(noise_floor_db))
+
+    # Report how the saved model behaves through the same path the transcriber uses
+    spotter = KeywordSpotter(str(args.output), threshold=args.threshold)
+    accepted = [spotter.check(samples).accepted for samples in positives + negatives]
+    false_rejects = sum(not a for a in accepted[: len(positives)])
+    false_accepts = sum(accepted[len(positives) :])
+    print(f"✅ Trained on {len(positives)} command and {len(negatives)} other recordings, saved to {args.output}")
+    print(f"   False rejections: {false_rejects}/{len(positives)}, false acceptances: {false_accepts}/{len(negatives)}")
+    print(f"   Noise floor: {noise_floor_db:.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
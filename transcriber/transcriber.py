@@ -1,19 +1,38 @@
 """Audio transcription and command extraction service using FastAPI and PyYAML."""
 
-from io import BytesIO
+import argparse
+import asyncio
+import os
+import sys
+import time
+import traceback
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
 from typing import Annotated
 
 import numpy as np
-import uvicorn
-import whisper
+import torch
 import yaml
 import httpx
 import toml
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, Header, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import validate_call
-from pydub.audio_segment import AudioSegment
 
+from voicecontrol_common import profiler, registration, tracing
+from voicecontrol_common.metrics import Counter, Histogram, instrument
+from voicecontrol_common.serving import serve, uvicorn_options
+from voicecontrol_common.tracing import current_request_id, record_span
+
+from audio import UnsupportedAudioError, decode, decode_av, synthetic_wav
+from cache import TranscriptionCache
+import chunking
+from inference import InferencePool, OverloadedError
+from kws import KeywordSpotter
+import decoding
+from backends import CannotLoadModelError, InferenceBackend
+from model_tiers import MODEL_TIERS, ModelRegistry
 from models import CommandListResponse, CommandResponse, FinalResponse
 
 APP = FastAPI()
@@ -23,25 +42,164 @@ APP.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # Read by the UI when the transcriber is overloaded
 )
-
-class CannotLoadModelError(Exception):
-    """CannotLoadModelError occurs when you are facing issues while loading a model."""
+instrument(APP)
+tracing.instrument(APP, "transcriber")
+registration.instrument(APP, "transcriber", 8005)
+profiler.instrument(APP)
+
+STAGE_SECONDS = {
+    "decode": Histogram("transcriber_decode_seconds", "Time to decode and resample the uploaded audio."),
+    "transcribe": Histogram("transcriber_inference_seconds", "Time spent in Whisper inference."),
+    "match": Histogram("transcriber_match_seconds", "Time to match the transcription against the commands."),
+    "fallback": Histogram("transcriber_fallback_seconds", "Time spent re-transcribing with the fallback model."),
+    "kws": Histogram("transcriber_kws_seconds", "Time the keyword-spotting gate takes to accept or reject audio."),
+}
+KWS_RESULTS = Counter(
+    "transcriber_kws_results_total",
+    "Keyword-spotting verdicts: accepted, no_speech or low_score (both rejected before Whisper).",
+    ("result",),
+)
+MODEL_FALLBACKS = Counter(
+    "transcriber_model_fallbacks_total",
+    "Low-confidence transcriptions, by whether the fallback model was used or the latency budget ruled it out.",
+    ("outcome",),
+)
+CACHE_REQUESTS = Counter("transcriber_cache_requests_total", "Transcription cache lookups by result.", ("result",))
 
 def logger_info(message:str):
     "Log message in a server."
     url = toml.load("log_config.toml")["url"]+"/log"
-    httpx.request(method="POST", url=url, json={"message":message})
+    httpx.request(method="POST", url=url, json={"message":message, "request_id":current_request_id()})
 
 
-DEVICE = "cpu"
+# Load config
+config = toml.load("config.toml")
 
-try:
-    MODEL = whisper.load_model("base.en", device=DEVICE)
-except CannotLoadModelError:
-    # Fall back in case there's a problem loading the model
-    # (This except block is a bit unusual. Possibly you meant another fallback.)
-    MODEL = whisper.load_audio("base.en", DEVICE)
+DEVICE = config["model"].get("device", "cpu")
+
+# "command" decodes with the command vocabulary as prompt, "open" is plain transcription
+DECODING_MODE = config["decoding"].get("mode", "command")
+if DECODING_MODE not in decoding.MODES:
+    sys.exit(f"Unknown decoding mode {DECODING_MODE!r}, expected one of {decoding.MODES}.")
+
+class Replica:
+    """The models one inference worker uses, never shared with another worker.
+
+    The fallback tier is only loaded the first time a transcription is retried with it,
+    most deployments never need it and it would double the memory of every worker.
+    """
+
+    def __init__(self, model: InferenceBackend, models: ModelRegistry, fallback_name: str | None) -> None:
+        self.model = model
+        self.models = models
+        self.fallback_name = fallback_name
+
+    @property
+    def fallback(self) -> InferenceBackend | None:
+        """The fallback model if it has been loaded, without loading it."""
+        if self.fallback_name is None or self.fallback_name not in self.models.loaded():
+            return None
+        return self.models.get(self.fallback_name)
+
+    def load_fallback(self) -> InferenceBackend | None:
+        """The fallback model, loaded now if needed; None (for good) if it cannot be loaded."""
+        if self.fallback_name is None:
+            return None
+        try:
+            return self.models.get(self.fallback_name)
+        except CannotLoadModelError as e:
+            logger_info(f"Fallback model disabled: {e}")
+            self.fallback_name = None
+            return None
+
+
+def load_replica() -> tuple[str, Replica]:
+    """Load the primary and fallback model for one inference worker."""
+    try:
+        models = ModelRegistry(
+            backend=BACKEND,
+            device=DEVICE,
+            quantized=config["model"].get("quantize", False),
+            threads=THREADS_PER_WORKER,
+        )
+    except CannotLoadModelError as e:
+        sys.exit(str(e))
+
+    # Load the configured tier, or the next one that loads if its weights are unavailable
+    configured_model = config["model"].get("name", "base.en")
+    try:
+        name, model = models.load_first([configured_model, *(t for t in MODEL_TIERS if t != configured_model)])
+    except CannotLoadModelError as e:
+        sys.exit(f"No Whisper model could be loaded: {e}")
+    if name != configured_model:
+        logger_info(f"Could not load {configured_model}, serving {name} instead.")
+
+    # Larger tier to retry low-confidence transcriptions with, if it fits the latency budget
+    fallback_name = FALLBACK_NAME if FALLBACK_NAME and FALLBACK_NAME != name else None
+    return name, Replica(model, models, fallback_name)
+
+
+# Engine the models run on, see backends.py
+BACKEND = config["model"].get("backend", "torch")
+FALLBACK_NAME = config["model"].get("fallback", "")
+
+# One replica per inference worker, sharing the CPU cores between them
+WORKERS = max(1, config["inference"].get("workers", 1))
+# The cores we may run on: a resource policy or container may pin us to fewer than the host has
+CORES = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+THREADS_PER_WORKER = config["inference"].get("threads_per_worker", 0) or max(1, CORES // WORKERS)
+torch.set_num_threads(THREADS_PER_WORKER)
+MODEL_NAME, first_replica = load_replica()
+REPLICAS = [first_replica] + [load_replica()[1] for _ in range(WORKERS - 1)]
+POOL = InferencePool(
+    REPLICAS,
+    max_queue=config["inference"].get("max_queue", 8),
+    max_wait=config["inference"].get("max_wait_ms", 5000) / 1000,
+)
+
+# Recordings longer than this are split at pauses and the chunks transcribed in parallel
+CHUNKING = config["chunking"].get("enabled", False)
+CHUNK_MIN_SECONDS = config["chunking"].get("min_seconds", 30)
+CHUNK_MAX_SECONDS = config["chunking"].get("max_chunk_seconds", 25)
+CHUNK_OVERLAP_SECONDS = config["chunking"].get("overlap_seconds", 1)
+if CHUNKING and WORKERS == 1:
+    logger_info("Chunking needs more than one inference worker, long recordings are transcribed whole.")
+
+MIN_AVG_LOGPROB = config["model"].get("min_avg_logprob", -0.5)
+MAX_NO_SPEECH_PROB = config["model"].get("max_no_speech_prob", 0.6)
+LATENCY_BUDGET = config["model"].get("latency_budget_ms", 2500) / 1000
+
+# Moving average of the fallback model's latency, None until it has run once
+FALLBACK_LATENCY: dict[str, float | None] = {"average": None}
+
+# Everything about the models that changes the transcription, part of the cache key
+MODEL_KEY = (
+    f"{BACKEND}:{MODEL_NAME}"
+    + ("/int8" if first_replica.model.quantized else "")
+    + (f">{FALLBACK_NAME}" if first_replica.fallback_name else "")
+)
+
+CACHE = TranscriptionCache(
+    max_entries=config["cache"].get("max_entries", 256),
+    spill_dir=config["cache"].get("spill_dir", ""),
+    spill_max_entries=config["cache"].get("spill_max_entries", 4096),
+) if config["cache"].get("enabled", True) else None
+
+# Send `X-Transcription-Cache: bypass` to always run Whisper, e.g. when debugging the model
+CACHE_HEADER = "X-Transcription-Cache"
+
+# Rejects silence, clicks and noise before Whisper sees them
+KWS = KeywordSpotter(
+    model_path=config["kws"].get("model", ""),
+    threshold=config["kws"].get("threshold", 0.5),
+    min_speech_ms=config["kws"].get("min_speech_ms", 250),
+    noise_floor_db=config["kws"].get("noise_floor_db", -60),
+) if config["kws"].get("enabled", False) else None
+
+# Send `X-KWS: bypass` to skip the gate, e.g. for synthetic benchmark audio
+KWS_HEADER = "X-KWS"
 
 # ------------------------------------------------
 # Load commands from `commands.yaml`
@@ -64,6 +222,14 @@ for category_dict in YAML_COMMANDS:
         for cmd, queries in command_dict.items():
             COMMAND_LIST.append((queries, cmd))
 
+# Options of the configured decoding mode, also part of the cache key
+TRANSCRIBE_OPTIONS = decoding.decoding_options(
+    DECODING_MODE,
+    prompt=decoding.command_prompt(COMMAND_LIST),
+    max_tokens=config["decoding"].get("max_tokens", 64),
+    word_timestamps=config["decoding"].get("word_timestamps", False),
+)
+
 
 @validate_call
 def commands(transcription: str) -> CommandListResponse:
@@ -103,46 +269,324 @@ def commands(transcription: str) -> CommandListResponse:
     return CommandListResponse(commands=responses)
 
 
+@contextmanager
+def stage(name: str, timings: dict[str, float]) -> Iterator[None]:
+    """Time one step of the transcription pipeline for Server-Timing, /metrics and the request trace."""
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[name] = elapsed
+        STAGE_SECONDS[name].observe(elapsed)
+        record_span(name, started_at, elapsed)
+
+
+def should_fall_back(replica: Replica, decoded: decoding.Decoded, elapsed: float) -> bool:
+    """Decide whether a primary-model transcription is worth retrying with the fallback model.
+
+    Only low-confidence speech is retried (silence stays silence with a larger model), and
+    only if the fallback is expected to finish within the latency budget.
+    """
+    if replica.fallback_name is None or decoded.no_speech_prob > MAX_NO_SPEECH_PROB:
+        return False
+    if decoded.avg_logprob >= MIN_AVG_LOGPROB:
+        return False
+    expected = FALLBACK_LATENCY["average"]
+    if expected is not None and elapsed + expected > LATENCY_BUDGET:
+        MODEL_FALLBACKS.inc(outcome="over_budget")
+        return False
+    MODEL_FALLBACKS.inc(outcome="retried")
+    return True
+
+
+def run_inference(
+    replica: Replica,
+    samples: np.ndarray,
+    timings: dict[str, float],
+    received: float,
+) -> decoding.Decoded:
+    """Transcribe on an inference worker, retrying with the fallback model when confidence is low."""
+    with stage("transcribe", timings):
+        decoded = replica.model.transcribe(samples, TRANSCRIBE_OPTIONS)
+
+    if should_fall_back(replica, decoded, time.perf_counter() - received):
+        # Loaded outside the timed stage, so the load does not count against the fallback's latency
+        fallback = replica.load_fallback()
+        if fallback is None:
+            return decoded
+        logger_info(f"Low confidence ({decoded.avg_logprob:.2f}), retrying with {FALLBACK_NAME}.")
+        with stage("fallback", timings):
+            decoded = fallback.transcribe(samples, TRANSCRIBE_OPTIONS)
+        average = FALLBACK_LATENCY["average"]
+        FALLBACK_LATENCY["average"] = (
+            timings["fallback"] if average is None else 0.8 * average + 0.2 * timings["fallback"]
+        )
+    return decoded
+
+
+def chunk_seconds(duration: float) -> float:
+    """Chunk length spreading a recording over all workers, within one Whisper window."""
+    # Every chunk costs a full encoder pass, so there is no point in more chunks than workers
+    return min(max(duration / WORKERS, chunking.MIN_CHUNK_SECONDS), CHUNK_MAX_SECONDS)
+
+
+async def transcribe_samples(samples: np.ndarray, timings: dict[str, float], received: float) -> str:
+    """Transcribe on the inference pool, long recordings as parallel chunks.
+
+    With a single worker the chunks could only run one after the other, so the recording
+    is transcribed whole instead.
+
+    Raises:
+        OverloadedError: If the pool cannot take the request.
+
+    """
+    duration = len(samples) / chunking.SAMPLE_RATE
+    if not CHUNKING or WORKERS == 1 or duration < CHUNK_MIN_SECONDS:
+        decoded, timings["queue"] = await POOL.run(run_inference, samples, timings, received)
+        return decoded.text
+
+    chunks = chunking.split(samples, chunk_seconds(duration), CHUNK_OVERLAP_SECONDS)
+    logger_info(f"Transcribing {duration:.1f} s of audio as {len(chunks)} chunks.")
+    start = time.perf_counter()
+    # Admitted as one request, the chunks do not each have to get past admission control
+    results, timings["queue"] = await POOL.run_all(
+        run_inference, [(chunk, {}, received) for chunk in chunks],
+    )
+    # Report wall-clock time (fallbacks included), the per-chunk times are in the stage histograms
+    timings["transcribe"] = time.perf_counter() - start - timings["queue"]
+    return chunking.stitch([decoded.text for decoded in results])
+
+
+def set_server_timing(http_response: Response, timings: dict[str, float]) -> None:
+    """Report the stage timings of this request in the `Server-Timing` header."""
+    http_response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()
+    )
+
+
+# Set once the warm-up has run, /readyz reports "not ready" until then
+WARMUP: dict[str, float | bool | None] = {"done": False, "seconds": None}
+
+
+def warm_replica(replica: Replica, samples: np.ndarray) -> None:
+    """Transcribe `samples` with every model of `replica` that is loaded, and match the result."""
+    for model in (replica.model, replica.fallback):
+        if model is not None:
+            commands(model.transcribe(samples, TRANSCRIBE_OPTIONS).text)
+
+
+async def warm_up() -> bool:
+    """Push synthetic audio through every step of a request so no real request pays for lazy init.
+
+    Covers WAV and FFmpeg decoding, keyword spotting, the inference engine (mel filterbank,
+    kernels) of every model replica (and of the fallback models loaded so far), and command
+    matching. The replicas are taken from the inference pool, so a request that arrives
+    meanwhile never shares a model with the warm-up.
+
+    Returns:
+        False if any step failed: the service could not handle a real request either.
+
+    """
+    if WARMUP["done"]:
+        return True
+    if not config["warmup"].get("enabled", True):
+        WARMUP["done"] = True
+        return True
+
+    start = time.perf_counter()
+    try:
+        audio = synthetic_wav(config["warmup"].get("seconds", 2))
+        for _ in range(max(1, config["warmup"].get("runs", 1))):
+            samples = await asyncio.to_thread(decode, audio, "audio/wav")
+            await asyncio.to_thread(decode_av, audio)
+            if KWS is not None:
+                KWS.check(samples, record=False)  # Warm-up is not traffic, keep the rejection rate honest
+            await POOL.run_each(warm_replica, samples)
+    except Exception as e:  # noqa: BLE001
+        traceback.print_exc()
+        with suppress(httpx.HTTPError):
+            logger_info(f"Warm-up failed: {type(e).__name__}: {e}")
+        return False
+
+    WARMUP["seconds"] = round(time.perf_counter() - start, 3)
+    WARMUP["done"] = True
+    logger_info(f"Warm-up finished in {WARMUP['seconds']} s.")
+    return True
+
+
+async def warm_up_or_exit() -> None:
+    """Warm up, or exit with an error so the orchestrator restarts us instead of waiting for /readyz forever."""
+    if not await warm_up():
+        os._exit(1)
+
+
+@APP.on_event("startup")
+async def startup() -> None:
+    """Warm up in the background: /healthz answers meanwhile, /readyz only once it is done."""
+    APP.state.warm_up = asyncio.create_task(warm_up_or_exit())
+
+
+@APP.get("/healthz")
+def healthz() -> JSONResponse:
+    """Liveness probe: the event loop is responsive."""
+    return JSONResponse(content={"status": "ok", "checks": {}})
+
+
+@APP.get("/readyz")
+def readyz() -> JSONResponse:
+    """Readiness probe: every model replica has been warmed up, and commands are available.
+
+    The models load at import, before the server answers at all; the warm-up is what shows they decode.
+    """
+    checks = {"commands_loaded": bool(COMMAND_LIST), "warmed_up": WARMUP["done"]}
+    ok = all(checks.values())
+    return JSONResponse(
+        content={"status": "ok" if ok else "not ready", "checks": checks},
+        status_code=200 if ok else 503,
+    )
+
+
 @APP.post("/transcribe", response_model=FinalResponse)
-async def transcribe(recording: Annotated[UploadFile, File(...)]) -> FinalResponse:
+async def transcribe(
+    recording: Annotated[UploadFile, File(...)],
+    http_response: Response,
+    x_transcription_cache: Annotated[str | None, Header()] = None,
+    x_kws: Annotated[str | None, Header()] = None,
+) -> FinalResponse:
     """Handle audio transcription requests.
 
+    Audio without a likely command (silence, clicks, noise) is rejected by the keyword-spotting
+    gate with an empty command list, unless the `X-KWS: bypass` header is sent. Identical audio
+    (same decoded samples, model and options) is answered from the transcription cache unless
+    the `X-Transcription-Cache: bypass` header is sent.
+
     Args:
         recording (UploadFile): The audio file upload.
+        http_response (Response): Used to report per-stage timings in the `Server-Timing` header.
+        x_transcription_cache (str | None): Set to "bypass" to skip the cache.
+        x_kws (str | None): Set to "bypass" to skip the keyword-spotting gate.
 
     Returns:
-        FinalResponse: An object containing transcription text and matched commands.
+        FinalResponse: An object containing transcription text, matched commands and the request ID
+        to send along (as X-Request-ID) with the resulting aggregator calls.
 
     """
     logger_info("Transcribe request received.")
+    timings = {}
+    received = time.perf_counter()
 
     # Read the uploaded audio content
     audio = await recording.read()
-    audio_buffer = BytesIO(audio)
 
-    # Convert the audio to single-channel, 16kHz
-    audio_segment = AudioSegment.from_file(audio_buffer).set_frame_rate(16000).set_channels(1).set_sample_width(2)
+    with stage("decode", timings):
+        # Convert the audio to single-channel, 16kHz float32 in range [-1,1]
+        try:
+            samples = await asyncio.to_thread(decode, audio, recording.content_type)
+        except UnsupportedAudioError as e:
+            raise HTTPException(status_code=415, detail=str(e)) from e
+
+    if KWS is not None and (x_kws or "").lower() != "bypass":
+        with stage("kws", timings):
+            verdict = KWS.check(samples)
+        KWS_RESULTS.inc(result=verdict.reason)
+        http_response.headers[KWS_HEADER] = f"{verdict.reason};score={verdict.score:.3f}"
+        if not verdict.accepted:
+            logger_info(f"Rejected by keyword spotting ({verdict.reason}).")
+            set_server_timing(http_response, timings)
+            return FinalResponse(
+                response=CommandListResponse(commands=[]),
+                message="",
+                request_id=current_request_id(),
+            )
+
+    cache_key = None
+    if CACHE is None:
+        cache_result = "disabled"
+    elif (x_transcription_cache or "").lower() == "bypass":
+        CACHE.bypass()
+        cache_result = "bypass"
+    else:
+        cache_key = TranscriptionCache.key(samples, MODEL_KEY, TRANSCRIBE_OPTIONS)
+        cached = CACHE.get(cache_key)
+        cache_result = "miss" if cached is None else "hit"
+    CACHE_REQUESTS.inc(result=cache_result)
+    http_response.headers[CACHE_HEADER] = cache_result
+
+    if cache_result == "hit":
+        transcription = cached["message"]
+        response = CommandListResponse(**cached["response"])
+        logger_info("Cached transcription: " + transcription)
+    else:
+        # Perform transcription
+        # Inference runs on a worker thread, the event loop keeps accepting uploads meanwhile
+        try:
+            transcription = await transcribe_samples(samples, timings, received)
+        except OverloadedError as e:
+            logger_info(str(e))
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)},
+            ) from e
+        logger_info("Raw transcription: " + transcription)
+
+        # Generate commands from transcription
+        with stage("match", timings):
+            response = commands(transcription)
+
+        if cache_key is not None:
+            CACHE.put(cache_key, {"message": transcription, "response": response.model_dump()})
+
+    set_server_timing(http_response, timings)
 
-    # Convert samples to float32 in range [-1,1]
-    samples = np.array(audio_segment.get_array_of_samples(), dtype=np.float32) / 32768
+    # Return the final response containing transcription and commands
+    logger_info("Sending final response.")
+    return FinalResponse(response=response, message=transcription, request_id=current_request_id())
 
-    # Perform transcription
-    result = MODEL.transcribe(
-        samples,
-        temperature=0,
-        condition_on_previous_text=False,
-        word_timestamps=True,
-    )
-    transcription = result["text"]
-    logger_info("Raw transcription: " + transcription)
 
-    # Generate commands from transcription
-    response = commands(transcription)
+@APP.get("/kws/stats")
+def kws_stats() -> dict:
+    """Report how much audio the keyword-spotting gate accepts and rejects, to tune it."""
+    if KWS is None:
+        return {"enabled": False}
+    return {"enabled": True, **KWS.snapshot()}
 
-    # Return the final response containing transcription and commands
-    logger_info("Sending final response.")
-    return FinalResponse(response=response, message=transcription)
+
+@APP.get("/inference/status")
+def inference_status() -> dict:
+    """Report inference workers in use and requests waiting for one."""
+    return POOL.snapshot()
+
+
+@APP.get("/cache/stats")
+def cache_stats() -> dict:
+    """Report transcription cache hits, misses, evictions and size."""
+    if CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **CACHE.snapshot()}
 
 
 if __name__ == "__main__":
-    uvicorn.run("__main__:APP", host="0.0.0.0", port=8005, reload=True)
+    parser = argparse.ArgumentParser(description="Transcriber service")
+    parser.add_argument(
+        "--standby",
+        action="store_true",
+        help="load the model, then wait for a line on stdin before serving (warm standby for the orchestrator)",
+    )
+    args = parser.parse_args()
+
+    if args.standby:
+        # The model is already loaded at this point, warm it up and block until the orchestrator
+        # promotes us. Reloading would re-import this module in a new process and load the model again.
+        asyncio.run(warm_up_or_exit())
+        logger_info("Transcriber standby is warm.")
+        if not sys.stdin.readline():
+            sys.exit(0)  # Orchestrator went away without promoting us
+        logger_info("Transcriber standby promoted.")
+        serve(APP, host="0.0.0.0", port=8005, **uvicorn_options(workers=1, reload=False))
+    else:
+        # Single process: the inference pool already spreads decoding over the cores, and
+        # every extra worker process would load its own copy of the models
+        serve("__main__:APP", host="0.0.0.0", port=8005, **uvicorn_options(workers=1))